@@ -2,9 +2,11 @@ from flask import Flask, jsonify, Request
 from flask_cors import CORS
 from dotenv import load_dotenv
 from src.common.utils.notifications import send_email_notification
+from src.common.utils.token_counter import preload_encoder
 from src.views.whatsapp_webhook import *
 
 load_dotenv()
+preload_encoder()
 
 app = Flask(__name__)
 CORS(app)
@@ -41,6 +43,12 @@ def main(request: Request):
         elif request.path == "/ping" and request.method == "GET":
             return jsonify({"message": "pong"}), 200
 
+        elif request.path == "/metrics" and request.method == "GET":
+            return get_metrics()
+
+        elif request.path == "/tenants/invalidate" and request.method == "POST":
+            return invalidate_tenant_metadata()
+
         elif request.path == "/send-message" and request.method == "POST":
             return send_message()
 
@@ -50,6 +58,17 @@ def main(request: Request):
         elif request.path == "/send-message/massive" and request.method == "POST":
             return send_massive_message()
 
+        elif (
+            request.path == "/send-message/massive/status" and request.method == "GET"
+        ):
+            return get_campaign_status()
+
+        elif (
+            request.path == "/send-message/massive/resume"
+            and request.method == "POST"
+        ):
+            return resume_campaign()
+
         else:
             print("Ruta no encontrada + " + request.path)
             return "Ruta no encontrada", 404
@@ -0,0 +1,18 @@
+from src.common.utils.vector_store_creator import VectorStoreCreator
+
+if __name__ == "__main__":
+    import glob
+    import sys
+
+    from langchain_community.embeddings import OpenAIEmbeddings
+    from langchain_community.vectorstores import FAISS
+
+    # Sin argumentos se convierten todos los índices de ./vectorstores
+    paths = sys.argv[1:] or sorted(glob.glob("./vectorstores/*/"))
+
+    for path in paths:
+        vectorstore = FAISS.load_local(
+            path, OpenAIEmbeddings(), allow_dangerous_deserialization=True
+        )
+        count = VectorStoreCreator.write_docstore_file(vectorstore, path)
+        print(f"{path}: {count} documentos escritos en docstore.bin")
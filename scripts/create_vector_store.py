@@ -1,18 +1,43 @@
+import argparse
+import json
+import os
+
+from src.common.config import VECTORSTORE_EMBED_BATCH_SIZE, VECTORSTORE_EMBED_WORKERS
 from src.common.utils.vector_store_creator import VectorStoreCreator
 
 if __name__ == "__main__":
-    import sys
-
-    if len(sys.argv) != 4:
-        print(
-            "Uso: python create_vector_store.py <pdf_url> <save_path> <openai_api_key>"
-        )
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Crea o actualiza de forma incremental el índice de un chatbot"
+    )
+    parser.add_argument("save_path", help="Directorio del índice, p. ej. ./vectorstores/johan_zalee")
+    parser.add_argument(
+        "--source",
+        dest="sources",
+        action="append",
+        required=True,
+        help="URL o ruta de un PDF o archivo de texto; se puede repetir",
+    )
+    parser.add_argument(
+        "--openai-api-key",
+        default=os.getenv("OPENAI_API_KEY"),
+        help="Por defecto se usa OPENAI_API_KEY",
+    )
+    parser.add_argument("--batch-size", type=int, default=VECTORSTORE_EMBED_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=VECTORSTORE_EMBED_WORKERS)
+    parser.add_argument(
+        "--full", action="store_true", help="Embebe todos los fragmentos de nuevo"
+    )
+    args = parser.parse_args()
 
-    pdf_url = sys.argv[1]
-    save_path = sys.argv[2]
-    openai_api_key = sys.argv[3]
+    if not args.openai_api_key:
+        parser.error("Falta --openai-api-key o la variable OPENAI_API_KEY")
 
-    VectorStoreCreator.create_from_pdf(
-        pdf_url=pdf_url, save_path=save_path, openai_api_key=openai_api_key
+    report = VectorStoreCreator.index_sources(
+        args.sources,
+        args.save_path,
+        args.openai_api_key,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        full=args.full,
     )
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,114 @@
+import argparse
+import glob
+import json
+import statistics
+import time
+
+from src.common.utils.embeddings import (
+    EMBEDDING_BACKENDS,
+    get_embeddings,
+    index_path_for_backend,
+)
+from src.common.utils.vector_store_creator import VectorStoreCreator
+from src.managers.vector_store_manager import RETRIEVAL_K, VectorStoreManager
+
+# Consultas típicas de los clientes para comparar latencias
+DEFAULT_QUERIES = [
+    "precio",
+    "cuánto cuesta el envío",
+    "qué beneficios tiene",
+    "cómo se toma",
+    "horario de atención",
+    "métodos de pago",
+    "tienen promociones",
+    "dónde están ubicados",
+    "cuánto demora la entrega",
+    "tienen garantía",
+]
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def measure(vectorstore_path, backend, queries, k):
+    """Carga el índice del backend y mide cada consulta (embedding + búsqueda)."""
+    manager = VectorStoreManager(vectorstore_path, embedding_backend=backend)
+    timings = []
+    results = {}
+    for query in queries:
+        started = time.perf_counter()
+        results[query] = manager.retrieve_relevant_sections(query, k=k)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "backend": backend,
+        "load_seconds": manager.load_stats["seconds"],
+        "mean_ms": round(statistics.mean(timings), 2),
+        "p50_ms": round(_percentile(timings, 0.5), 2),
+        "p95_ms": round(_percentile(timings, 0.95), 2),
+    }, results
+
+
+def overlap(results_a, results_b, k):
+    """Fracción promedio de secciones en común entre dos backends."""
+    return round(
+        statistics.mean(
+            len(set(results_a[query]) & set(results_b[query])) / k for query in results_a
+        ),
+        3,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reindexa vectorstores con otro backend de embeddings y compara latencias"
+    )
+    parser.add_argument(
+        "paths", nargs="*", help="Vectorstores a reindexar; por defecto ./vectorstores/*"
+    )
+    parser.add_argument("--backend", required=True, choices=EMBEDDING_BACKENDS)
+    parser.add_argument(
+        "--baseline",
+        default="openai",
+        choices=EMBEDDING_BACKENDS,
+        help="Backend del índice del que se leen los fragmentos y con el que se compara",
+    )
+    parser.add_argument(
+        "--queries", help="Archivo con una consulta por línea para la comparación"
+    )
+    parser.add_argument("--k", type=int, default=RETRIEVAL_K)
+    parser.add_argument(
+        "--no-compare", action="store_true", help="Solo reindexa, sin medir latencias"
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="Embebe todos los fragmentos de nuevo"
+    )
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob("./vectorstores/*/"))
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as file:
+            queries = [line.strip() for line in file if line.strip()]
+
+    for path in paths:
+        chunks = VectorStoreCreator.read_chunks(index_path_for_backend(path, args.baseline))
+        report = {
+            "path": path,
+            "index": VectorStoreCreator.index_chunks(
+                chunks,
+                index_path_for_backend(path, args.backend),
+                get_embeddings(args.backend),
+                full=args.full,
+            ),
+        }
+
+        if not args.no_compare and args.backend != args.baseline:
+            baseline, baseline_results = measure(path, args.baseline, queries, args.k)
+            candidate, candidate_results = measure(path, args.backend, queries, args.k)
+            report["latency"] = [baseline, candidate]
+            report["overlap_at_k"] = overlap(baseline_results, candidate_results, args.k)
+
+        print(json.dumps(report, indent=2, ensure_ascii=False))
@@ -1,16 +1,16 @@
-from src.data.models.chatbot import ChatbotModel
 from src.data.sources.firebase.utils import get_whatsapp_token
+from src.managers.chatbot_registry import ChatbotRegistry
 from src.managers.conversation_manager import ConversationManager
 import logging
 from src.data.sources.firebase.chat_configs import chatbot_configs
-from src.services.chat_service import ChatbotService
+
+chatbot_registry = ChatbotRegistry(chatbot_configs)
 
 
 def get_chatbot_from_number(from_id: str):
     if from_id in chatbot_configs:
         try:
-            chatbot_model = ChatbotModel(**chatbot_configs[from_id])
-            chat_service = ChatbotService(chatbot_model)
+            chat_service = chatbot_registry.get(from_id)
             conversation_manager = ConversationManager(
                 chatbot=chat_service,
                 from_whatsapp_id=from_id,
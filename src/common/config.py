@@ -1,3 +1,5 @@
+import os
+
 MODEL = "gpt-4o-mini"
 MAX_TOKENS = 800
 
@@ -6,3 +8,160 @@ CORS_HEADERS = {
     "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
     "Access-Control-Allow-Headers": "Content-Type",
 }
+
+# Registro de chatbots: presupuesto de memoria para los índices FAISS cargados
+# y cada cuánto se revisa si el índice cambió en disco.
+CHATBOT_REGISTRY_MEMORY_BUDGET_MB = int(
+    os.getenv("CHATBOT_REGISTRY_MEMORY_BUDGET_MB", "512")
+)
+CHATBOT_REGISTRY_RELOAD_CHECK_SECONDS = float(
+    os.getenv("CHATBOT_REGISTRY_RELOAD_CHECK_SECONDS", "10")
+)
+# Recargar el índice cambiado en un hilo aparte. En Cloud Functions el hilo no
+# tiene CPU después de responder, así que por defecto recarga la solicitud que
+# detecta el cambio (las demás siguen usando el índice anterior). Actívelo solo
+# en un servidor de larga duración.
+CHATBOT_REGISTRY_BACKGROUND_RELOAD = (
+    os.getenv("CHATBOT_REGISTRY_BACKGROUND_RELOAD", "false").lower() == "true"
+)
+
+# Máximo de rondas de herramientas que el modelo puede pedir en un mismo turno
+MAX_TOOL_ITERATIONS = int(os.getenv("MAX_TOOL_ITERATIONS", "3"))
+
+# Modo asíncrono del webhook: se responde a Meta de inmediato y los mensajes se
+# procesan en un pool de hilos con una cola acotada (InProcessWorkQueue).
+# NO es seguro en Cloud Functions: después de responder la instancia se queda
+# sin CPU o se apaga, y los mensajes en cola o a medio procesar se pierden sin
+# que Meta los reenvíe. Actívelo solo en un servidor de larga duración (Cloud
+# Run con CPU siempre asignada, una VM); en Cloud Functions déjelo en "false".
+WEBHOOK_ASYNC_MODE = os.getenv("WEBHOOK_ASYNC_MODE", "false").lower() == "true"
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_QUEUE_MAX_SIZE = int(os.getenv("WEBHOOK_QUEUE_MAX_SIZE", "200"))
+WEBHOOK_DRAIN_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT_SECONDS", "25"))
+
+# Deduplicación de mensajes reenviados por Meta
+DEDUPE_MAX_SIZE = int(os.getenv("DEDUPE_MAX_SIZE", "10000"))
+DEDUPE_TTL_SECONDS = float(os.getenv("DEDUPE_TTL_SECONDS", "86400"))
+DEDUPE_PERSISTENT_STORE = (
+    os.getenv("DEDUPE_PERSISTENT_STORE", "false").lower() == "true"
+)
+
+# Caché de contactos y conversaciones resueltas por (ws_id, phone_number)
+CONTACT_CACHE_MAX_SIZE = int(os.getenv("CONTACT_CACHE_MAX_SIZE", "5000"))
+CONTACT_CACHE_TTL_SECONDS = float(os.getenv("CONTACT_CACHE_TTL_SECONDS", "600"))
+
+# Caché de los datos de cada negocio (ref, ws_token) por ws_id
+TENANT_CACHE_MAX_SIZE = int(os.getenv("TENANT_CACHE_MAX_SIZE", "1000"))
+TENANT_CACHE_TTL_SECONDS = float(os.getenv("TENANT_CACHE_TTL_SECONDS", "300"))
+# Secreto para POST /tenants/invalidate (encabezado X-Invalidation-Secret).
+# Sin él el endpoint responde 403. La invalidación solo limpia la caché de la
+# instancia que recibe la solicitud; las demás se ponen al día al vencer
+# TENANT_CACHE_TTL_SECONDS, así que no conviene subirlo mucho.
+TENANT_INVALIDATION_SECRET = os.getenv("TENANT_INVALIDATION_SECRET")
+
+# Historia de la conversación: mensajes que se envían al modelo y cola en memoria
+# de los últimos mensajes de cada conversación
+HISTORY_WINDOW_SIZE = int(os.getenv("HISTORY_WINDOW_SIZE", "10"))
+HISTORY_TAIL_SIZE = int(os.getenv("HISTORY_TAIL_SIZE", "50"))
+HISTORY_TAIL_CACHE_SIZE = int(os.getenv("HISTORY_TAIL_CACHE_SIZE", "2000"))
+HISTORY_TAIL_TTL_SECONDS = float(os.getenv("HISTORY_TAIL_TTL_SECONDS", "900"))
+
+# Presupuesto de tokens del prompt (sistema, contexto e historia) por turno
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+
+# Conteo de tokens de los mensajes guardados. Diferido: se calcula en lote en
+# un hilo en segundo plano y se escribe después del mensaje (una escritura más
+# por mensaje). NO es seguro en Cloud Functions: el hilo no tiene CPU después
+# de responder y los conteos llegan tarde o se pierden. Actívelo solo en un
+# servidor de larga duración. Los mensajes de campaña se cuentan siempre al
+# escribirlos.
+TOKEN_COUNT_DEFERRED = os.getenv("TOKEN_COUNT_DEFERRED", "false").lower() == "true"
+TOKEN_COUNT_BATCH_SIZE = int(os.getenv("TOKEN_COUNT_BATCH_SIZE", "200"))
+TOKEN_COUNT_FLUSH_SECONDS = float(os.getenv("TOKEN_COUNT_FLUSH_SECONDS", "1"))
+TOKEN_COUNT_MAX_PENDING = int(os.getenv("TOKEN_COUNT_MAX_PENDING", "10000"))
+
+# Cliente de la Graph API de WhatsApp: pool de conexiones, timeouts (segundos)
+# y reintentos con backoff ante 429 y 5xx
+GRAPH_API_VERSION = os.getenv("GRAPH_API_VERSION", "v21.0")
+GRAPH_API_POOL_SIZE = int(os.getenv("GRAPH_API_POOL_SIZE", "20"))
+GRAPH_API_CONNECT_TIMEOUT_SECONDS = float(
+    os.getenv("GRAPH_API_CONNECT_TIMEOUT_SECONDS", "3")
+)
+GRAPH_API_READ_TIMEOUT_SECONDS = float(os.getenv("GRAPH_API_READ_TIMEOUT_SECONDS", "15"))
+GRAPH_API_MAX_RETRIES = int(os.getenv("GRAPH_API_MAX_RETRIES", "3"))
+GRAPH_API_BACKOFF_SECONDS = float(os.getenv("GRAPH_API_BACKOFF_SECONDS", "0.5"))
+
+# Envío masivo (campañas): límite de mensajes por segundo por número, envíos
+# en curso (se ajustan solos entre el mínimo y el máximo) y reintentos
+CAMPAIGN_RATE_PER_SECOND = float(os.getenv("CAMPAIGN_RATE_PER_SECOND", "70"))
+CAMPAIGN_RATE_BURST = int(os.getenv("CAMPAIGN_RATE_BURST", "20"))
+CAMPAIGN_INITIAL_CONCURRENCY = int(os.getenv("CAMPAIGN_INITIAL_CONCURRENCY", "20"))
+CAMPAIGN_MIN_CONCURRENCY = int(os.getenv("CAMPAIGN_MIN_CONCURRENCY", "2"))
+CAMPAIGN_MAX_CONCURRENCY = int(os.getenv("CAMPAIGN_MAX_CONCURRENCY", "100"))
+CAMPAIGN_MAX_RETRIES = int(os.getenv("CAMPAIGN_MAX_RETRIES", "3"))
+
+# Campañas persistentes: destinatarios por parte (punto de control) y segundos
+# del lease de la instancia que la procesa. Cada parte se procesa en una
+# tarea de Cloud Tasks contra el endpoint de reanudación, en la cola indicada.
+CAMPAIGN_CHUNK_SIZE = int(os.getenv("CAMPAIGN_CHUNK_SIZE", "200"))
+CAMPAIGN_LEASE_SECONDS = int(os.getenv("CAMPAIGN_LEASE_SECONDS", "300"))
+CAMPAIGN_TASK_URL = os.getenv(
+    "CAMPAIGN_TASK_URL",
+    "https://us-central1-innate-tempo-448214-e5.cloudfunctions.net/main/send-message/massive/resume",
+)
+CAMPAIGN_TASK_QUEUE = os.getenv("CAMPAIGN_TASK_QUEUE", "continueConversation")
+
+# Intentos por escritura en las escrituras agrupadas (BulkWriter)
+BULK_WRITE_MAX_ATTEMPTS = int(os.getenv("BULK_WRITE_MAX_ATTEMPTS", "5"))
+
+# Contadores repartidos en shards (campañas): cantidad de shards por documento
+COUNTER_SHARDS = int(os.getenv("COUNTER_SHARDS", "10"))
+
+# Catálogo de plantillas por negocio (business/{id}/templates)
+TEMPLATE_CACHE_MAX_SIZE = int(os.getenv("TEMPLATE_CACHE_MAX_SIZE", "1000"))
+TEMPLATE_CACHE_TTL_SECONDS = int(os.getenv("TEMPLATE_CACHE_TTL_SECONDS", "300"))
+
+# Código de país que se agrega a los números locales de las campañas
+DEFAULT_COUNTRY_CODE = os.getenv("DEFAULT_COUNTRY_CODE", "57")
+
+# Filas que se leen a la vez de los archivos de destinatarios
+RECIPIENT_READ_CHUNK_SIZE = int(os.getenv("RECIPIENT_READ_CHUNK_SIZE", "5000"))
+
+# Caché de consultas al índice de cada chatbot (embedding y resultados)
+RETRIEVAL_CACHE_MAX_SIZE = int(os.getenv("RETRIEVAL_CACHE_MAX_SIZE", "1000"))
+RETRIEVAL_CACHE_TTL_SECONDS = int(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "3600"))
+
+# Cómo se cargan los índices FAISS: "memory" (copia en cada proceso) o "mmap"
+# (mapeados en solo lectura y compartidos entre workers, ver VectorStoreManager).
+# "mmap" requiere faiss-cpu >= 1.11.0 (IO_FLAG_MMAP_IFC); con una versión
+# anterior se registra un error y se carga en memoria.
+VECTORSTORE_LOAD_MODE = os.getenv("VECTORSTORE_LOAD_MODE", "memory").lower()
+
+# Indexación incremental (VectorStoreCreator.index_sources): fragmentos por
+# llamada de embeddings, llamadas en paralelo y generaciones que se conservan
+VECTORSTORE_EMBED_BATCH_SIZE = int(os.getenv("VECTORSTORE_EMBED_BATCH_SIZE", "100"))
+VECTORSTORE_EMBED_WORKERS = int(os.getenv("VECTORSTORE_EMBED_WORKERS", "4"))
+VECTORSTORE_KEEP_GENERATIONS = int(os.getenv("VECTORSTORE_KEEP_GENERATIONS", "2"))
+
+# Backend de embeddings por defecto: "openai", "hashing" (determinista, sin red)
+# o "local" (sentence-transformers en CPU). Cada chatbot puede elegir el suyo
+# con "embedding_backend" en chatbot_configs.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+EMBEDDING_HASHING_DIMENSION = int(os.getenv("EMBEDDING_HASHING_DIMENSION", "512"))
+EMBEDDING_LOCAL_MODEL = os.getenv(
+    "EMBEDDING_LOCAL_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
+)
+
+# Recuperación de contexto por turno (VectorStoreManager.retrieve_context):
+# "hybrid" combina FAISS y BM25 con umbral, sin repetidos y con tope de tokens;
+# "vector" usa solo las RETRIEVAL_K secciones de FAISS, como antes.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Puntaje mínimo (0 a 1, relativo a los candidatos de cada consulta) y peso de
+# la similitud vectorial frente a BM25
+RETRIEVAL_SCORE_THRESHOLD = float(os.getenv("RETRIEVAL_SCORE_THRESHOLD", "0.35"))
+RETRIEVAL_HYBRID_ALPHA = float(os.getenv("RETRIEVAL_HYBRID_ALPHA", "0.6"))
+# Selección estilo MMR: peso de la relevancia frente a la diversidad, y
+# parecido (Jaccard de palabras) a partir del cual una sección se descarta
+RETRIEVAL_MMR_LAMBDA = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.7"))
+RETRIEVAL_DEDUPE_JACCARD = float(os.getenv("RETRIEVAL_DEDUPE_JACCARD", "0.6"))
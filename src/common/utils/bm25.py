@@ -0,0 +1,74 @@
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Palabras demasiado comunes en español para distinguir un fragmento de otro
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los",
+    "me", "mi", "para", "por", "que", "se", "su", "sus", "te", "tu", "un",
+    "una", "y", "o", "como", "mas", "muy", "pero", "si", "no", "le", "les",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Palabras sin tildes ni mayúsculas, sin stopwords ni letras sueltas."""
+    text = unicodedata.normalize("NFKD", text or "").casefold()
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [
+        word for word in re.findall(r"\w+", text) if len(word) > 1 and word not in STOPWORDS
+    ]
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class BM25Index:
+    """
+    Índice léxico BM25 (Okapi) en memoria sobre los fragmentos de un chatbot.
+
+    Guarda un índice invertido de término a (posición, frecuencia), así que
+    una búsqueda solo recorre los fragmentos que comparten algún término con
+    la consulta. Las posiciones son las mismas del índice FAISS.
+    """
+
+    def __init__(self, documents: Iterable[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._lengths: List[int] = []
+
+        for position, text in enumerate(documents):
+            counts = Counter(tokenize(text))
+            self._lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                self._postings[term].append((position, frequency))
+
+        size = len(self._lengths)
+        self._average_length = (sum(self._lengths) / size) if size else 1.0
+        self._idf = {
+            term: math.log(1 + (size - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Las `k` posiciones con mayor puntaje, de mayor a menor."""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if not idf:
+                continue
+            for position, frequency in self._postings[term]:
+                length_norm = 1 - self.b + self.b * self._lengths[position] / self._average_length
+                scores[position] += idf * frequency * (self.k1 + 1) / (
+                    frequency + self.k1 * length_norm
+                )
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,90 @@
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, Iterable, Iterator
+
+# Nombre del archivo de documentos junto a index.faiss
+DOCSTORE_FILENAME = "docstore.bin"
+
+_MAGIC = b"WBDOCS01"
+_COUNT = struct.Struct("<Q")
+_OFFSET = struct.Struct("<Q")
+
+
+def write_docstore(path: str, records: Iterable[Dict[str, Any]]) -> int:
+    """
+    Escribe los documentos de un índice en un archivo indexado por offsets.
+
+    `records` va en el orden de las posiciones del índice FAISS; cada uno es
+    un dict con "id", "page_content" y "metadata". El archivo tiene una
+    cabecera (magic y cantidad), la tabla de offsets y los documentos en
+    JSON, así que se lee sin pickle y sin cargar todo en memoria. Se escribe
+    a un temporal y se reemplaza de forma atómica. Retorna la cantidad de
+    documentos escritos.
+    """
+    encoded = [
+        json.dumps(record, ensure_ascii=False).encode("utf-8") for record in records
+    ]
+
+    data_start = len(_MAGIC) + _COUNT.size + _OFFSET.size * (len(encoded) + 1)
+    offsets = [data_start]
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(_MAGIC)
+        file.write(_COUNT.pack(len(encoded)))
+        file.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        for item in encoded:
+            file.write(item)
+    os.replace(tmp_path, path)
+    return len(encoded)
+
+
+class DocstoreFile:
+    """
+    Lector de un archivo escrito con `write_docstore`.
+
+    El archivo se mapea en memoria en modo solo lectura: los procesos que lo
+    abren comparten sus páginas y cada documento se decodifica solo cuando se
+    pide por su posición.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Archivo vacío: mmap no acepta tamaño cero
+            self._file.close()
+            raise ValueError(f"Archivo de documentos vacío: {path}")
+
+        if self._map[: len(_MAGIC)] != _MAGIC:
+            self.close()
+            raise ValueError(f"Formato de documentos no reconocido: {path}")
+
+        (self._count,) = _COUNT.unpack_from(self._map, len(_MAGIC))
+        self._offsets_start = len(_MAGIC) + _COUNT.size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get(self, position: int) -> Dict[str, Any]:
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+
+        start, end = struct.unpack_from(
+            "<2Q", self._map, self._offsets_start + _OFFSET.size * position
+        )
+        return json.loads(self._map[start:end].decode("utf-8"))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for position in range(self._count):
+            yield self.get(position)
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
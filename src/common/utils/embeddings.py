@@ -0,0 +1,121 @@
+import hashlib
+import math
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List, Optional
+
+from langchain_community.embeddings import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from src.common.config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_HASHING_DIMENSION,
+    EMBEDDING_LOCAL_MODEL,
+)
+
+EMBEDDING_BACKENDS = ("openai", "hashing", "local")
+
+# Subdirectorio del vectorstore donde van los índices de otros backends
+BACKENDS_DIRNAME = "backends"
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Embeddings deterministas por feature hashing, sin red ni modelo.
+
+    Cada palabra (sin tildes ni mayúsculas) y cada trigrama de caracteres
+    suma ±1 en la posición que le da su hash, y el vector se normaliza. No
+    entiende sinónimos, pero es instantáneo y reproducible, así que sirve
+    para pruebas y benchmarks sin conexión.
+    """
+
+    def __init__(self, dimension: int = EMBEDDING_HASHING_DIMENSION):
+        self.dimension = dimension
+        self.model = f"hashing-{dimension}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        for feature in _features(text):
+            value = int.from_bytes(
+                hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little"
+            )
+            vector[value % self.dimension] += 1.0 if value >> 63 else -1.0
+
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+
+def _features(text: str):
+    text = unicodedata.normalize("NFKD", text or "").casefold()
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    for word in re.findall(r"\w+", text):
+        yield word
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            yield f"3:{padded[i:i + 3]}"
+
+
+class LocalEmbeddings(Embeddings):
+    """Modelo de sentence-transformers ejecutado en CPU dentro del proceso."""
+
+    def __init__(self, model_name: str = EMBEDDING_LOCAL_MODEL):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "El backend de embeddings 'local' requiere sentence-transformers "
+                "(pip install sentence-transformers)"
+            ) from e
+
+        self._model = SentenceTransformer(model_name, device="cpu")
+        self.model = f"local:{model_name}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._model.encode(list(texts), normalize_embeddings=True).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+@lru_cache(maxsize=None)
+def get_embeddings(
+    backend: str = EMBEDDING_BACKEND, openai_api_key: Optional[str] = None
+) -> Embeddings:
+    """
+    Proveedor de embeddings de un backend, compartido por todo el proceso.
+
+    Todos exponen la interfaz Embeddings de LangChain (embed_documents y
+    embed_query) y un atributo `model` que queda en el manifest del índice.
+    """
+    if backend == "openai":
+        if openai_api_key:
+            return OpenAIEmbeddings(openai_api_key=openai_api_key)
+        return OpenAIEmbeddings()
+    if backend == "hashing":
+        return HashingEmbeddings()
+    if backend == "local":
+        return LocalEmbeddings()
+    raise ValueError(
+        f"Backend de embeddings no soportado: {backend}. Use {', '.join(EMBEDDING_BACKENDS)}"
+    )
+
+
+def index_path_for_backend(vectorstore_path: str, backend: str = EMBEDDING_BACKEND) -> str:
+    """
+    Directorio del índice de un vectorstore para un backend.
+
+    El de OpenAI es el propio vectorstore; los demás viven en
+    backends/<backend> dentro de él, así que cambiar el backend de un
+    chatbot no pisa el índice que ya usa.
+    """
+    if backend == "openai":
+        return vectorstore_path
+    return os.path.join(vectorstore_path, BACKENDS_DIRNAME, backend)
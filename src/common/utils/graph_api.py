@@ -0,0 +1,190 @@
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from src.common.config import (
+    GRAPH_API_BACKOFF_SECONDS,
+    GRAPH_API_CONNECT_TIMEOUT_SECONDS,
+    GRAPH_API_MAX_RETRIES,
+    GRAPH_API_POOL_SIZE,
+    GRAPH_API_READ_TIMEOUT_SECONDS,
+    GRAPH_API_VERSION,
+)
+from src.data.sources.firebase.utils import get_whatsapp_token
+
+GRAPH_API_URL = "https://graph.facebook.com"
+
+# Códigos de respuesta que se reintentan; los demás se devuelven tal cual
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Métodos que se pueden repetir sin efectos. Un POST (como enviar un mensaje)
+# que falló por timeout de lectura o 5xx pudo haber llegado a Meta, así que
+# solo se reintenta con 429 o si la solicitud nunca salió.
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+NON_IDEMPOTENT_RETRY_STATUS_CODES = {429}
+
+
+def request_not_sent(error: requests.RequestException) -> bool:
+    """True si la solicitud falló antes de enviarse (timeout o rechazo al conectar)."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class GraphApiClient:
+    """
+    Cliente compartido para la Graph API de Meta.
+
+    Usa una sola sesión de requests con un pool de conexiones keep-alive, así
+    que las llamadas de un mismo turno (marcar como leído, descargar media,
+    enviar la respuesta) reutilizan la conexión TLS en lugar de abrir una
+    nueva cada vez. En las lecturas (GET) los errores 429 y 5xx, y los fallos
+    de conexión, se reintentan con backoff exponencial con jitter. Los POST
+    solo se reintentan con 429 o si no se llegaron a enviar, para no mandar
+    un mensaje dos veces.
+
+    El token de cada llamada es el del número (phone_number_id) que la hace;
+    si no se pasa, se obtiene de los datos del negocio en caché.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        pool_size: int,
+        connect_timeout: float,
+        read_timeout: float,
+        max_retries: int,
+        backoff_seconds: float,
+    ):
+        self.base_url = f"{GRAPH_API_URL}/{version}"
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._session: Optional[requests.Session] = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session:
+            return self._session
+
+        with self._lock:
+            if not self._session:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_size, pool_maxsize=self.pool_size
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+        return self._session
+
+    def auth_headers(
+        self, phone_number_id: Optional[str] = None, token: Optional[str] = None
+    ) -> Dict[str, str]:
+        if not token and phone_number_id:
+            token = get_whatsapp_token(phone_number_id)
+        if not token:
+            raise Exception(
+                f"No hay token de WhatsApp para el número {phone_number_id}"
+            )
+        return {"Authorization": f"Bearer {token}"}
+
+    def request(
+        self,
+        method: str,
+        path_or_url: str,
+        phone_number_id: Optional[str] = None,
+        token: Optional[str] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Hace una llamada a la Graph API con reintentos.
+
+        `path_or_url` puede ser una ruta relativa a la versión de la API
+        (por ejemplo "{phone_number_id}/messages") o una URL completa, como
+        las URLs de descarga de media.
+
+        Returns:
+            requests.Response: La última respuesta, aunque no sea exitosa.
+        """
+        url = (
+            path_or_url
+            if path_or_url.startswith("http")
+            else f"{self.base_url}/{path_or_url.lstrip('/')}"
+        )
+        headers = {
+            **self.auth_headers(phone_number_id, token),
+            **kwargs.pop("headers", {}),
+        }
+        kwargs.setdefault("timeout", self.timeout)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_status_codes = (
+            RETRY_STATUS_CODES if idempotent else NON_IDEMPOTENT_RETRY_STATUS_CODES
+        )
+
+        attempt = 0
+        while True:
+            self.requests += 1
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+                if response.status_code not in retry_status_codes:
+                    return response
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    return response
+                delay = self._retry_after(response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries or not (idempotent or request_not_sent(e)):
+                    self.failures += 1
+                    raise
+                logging.warning(f"Error de conexión con la Graph API: {e}")
+                delay = None
+
+            attempt += 1
+            self.retries += 1
+            if delay is None:
+                delay = random.uniform(0, self.backoff_seconds * 2**attempt)
+            time.sleep(delay)
+
+    def get(self, path_or_url: str, **kwargs) -> requests.Response:
+        return self.request("GET", path_or_url, **kwargs)
+
+    def post(self, path_or_url: str, **kwargs) -> requests.Response:
+        return self.request("POST", path_or_url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "pool_size": self.pool_size,
+        }
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> Optional[float]:
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            return None
+
+
+graph_api_client = GraphApiClient(
+    version=GRAPH_API_VERSION,
+    pool_size=GRAPH_API_POOL_SIZE,
+    connect_timeout=GRAPH_API_CONNECT_TIMEOUT_SECONDS,
+    read_timeout=GRAPH_API_READ_TIMEOUT_SECONDS,
+    max_retries=GRAPH_API_MAX_RETRIES,
+    backoff_seconds=GRAPH_API_BACKOFF_SECONDS,
+)
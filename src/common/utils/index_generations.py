@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional
+
+# Archivo que apunta a la generación vigente de un índice
+CURRENT_FILENAME = "CURRENT"
+GENERATION_PREFIX = "gen-"
+# Hash de cada fragmento, en el orden de sus posiciones en el índice, y el
+# modelo de embeddings con que se creó
+MANIFEST_FILENAME = "manifest.json"
+
+
+def resolve_index_path(vectorstore_path: str) -> str:
+    """
+    Directorio con los archivos del índice vigente.
+
+    Los índices creados por generaciones tienen un archivo CURRENT con el
+    nombre de la generación publicada; los anteriores guardan index.faiss
+    directamente en `vectorstore_path`.
+    """
+    try:
+        with open(os.path.join(vectorstore_path, CURRENT_FILENAME)) as current:
+            generation = current.read().strip()
+    except FileNotFoundError:
+        return vectorstore_path
+    return os.path.join(vectorstore_path, generation) if generation else vectorstore_path
+
+
+def read_manifest(index_path: str) -> Optional[Dict[str, Any]]:
+    """Manifest de una generación; None en índices creados antes de ellos."""
+    try:
+        with open(os.path.join(index_path, MANIFEST_FILENAME)) as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return None
+
+
+def new_generation_dir(vectorstore_path: str) -> str:
+    """Crea el directorio de una generación nueva, aún sin publicar."""
+    name = f"{GENERATION_PREFIX}{time.time_ns()}"
+    path = os.path.join(vectorstore_path, name)
+    os.makedirs(path)
+    return path
+
+
+def list_generations(vectorstore_path: str) -> List[str]:
+    try:
+        names = os.listdir(vectorstore_path)
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names if name.startswith(GENERATION_PREFIX))
+
+
+def publish_generation(vectorstore_path: str, generation_dir: str, keep: int = 2) -> None:
+    """
+    Apunta CURRENT a `generation_dir` con un reemplazo atómico y borra las
+    generaciones viejas, dejando las `keep` más recientes.
+
+    Quien lea CURRENT ve la generación anterior o la nueva, nunca una a
+    medio escribir. Las generaciones borradas que un proceso tenga mapeadas
+    siguen siendo legibles hasta que las cierre.
+    """
+    generation = os.path.basename(os.path.normpath(generation_dir))
+    tmp_path = os.path.join(vectorstore_path, f"{CURRENT_FILENAME}.tmp")
+    with open(tmp_path, "w") as current:
+        current.write(generation)
+    os.replace(tmp_path, os.path.join(vectorstore_path, CURRENT_FILENAME))
+
+    for old in list_generations(vectorstore_path)[: -max(keep, 1)]:
+        if old != generation:
+            shutil.rmtree(os.path.join(vectorstore_path, old), ignore_errors=True)
@@ -0,0 +1,86 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+from src.common.utils.cache import TTLCache
+
+
+class ProcessedMessageStore(ABC):
+    """Almacenamiento persistente de los ids de mensajes ya procesados."""
+
+    @abstractmethod
+    def claim(self, message_id: str) -> bool:
+        """Marca el mensaje como procesado. Retorna False si ya lo estaba."""
+        pass
+
+    @abstractmethod
+    def release(self, message_id: str) -> None:
+        """Libera el mensaje para que un reintento pueda procesarlo."""
+        pass
+
+
+class MessageDeduplicator:
+    """
+    Descarta los mensajes de WhatsApp que Meta vuelve a enviar.
+
+    Los ids vistos recientemente se guardan en una caché acotada con TTL. Si
+    hay un almacenamiento persistente, también se consulta para detectar
+    reintentos que llegan a otra instancia o después de un reinicio.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl_seconds: float,
+        store: Optional[ProcessedMessageStore] = None,
+    ):
+        self._seen = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.store = store
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.duplicates_dropped = 0
+
+    def is_duplicate(self, message_id: Optional[str]) -> bool:
+        """Retorna True si el mensaje ya se procesó; si no, lo marca como visto."""
+        if not message_id:
+            return False
+
+        duplicate = not self._seen.add(message_id)
+        if not duplicate and self.store:
+            try:
+                duplicate = not self.store.claim(message_id)
+            except Exception as e:
+                # Si el almacenamiento falla se procesa el mensaje: es mejor
+                # responder dos veces que no responder.
+                logging.error(f"Error al registrar el mensaje {message_id}: {e}")
+
+        with self._lock:
+            if duplicate:
+                self.duplicates_dropped += 1
+            else:
+                self.accepted += 1
+
+        if duplicate:
+            logging.info(f"Mensaje duplicado {message_id} descartado")
+        return duplicate
+
+    def release(self, message_id: Optional[str]) -> None:
+        """Olvida un mensaje cuyo procesamiento falló para aceptar el reintento."""
+        if not message_id:
+            return
+
+        self._seen.pop(message_id)
+        if self.store:
+            try:
+                self.store.release(message_id)
+            except Exception as e:
+                logging.error(f"Error al liberar el mensaje {message_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "accepted": self.accepted,
+            "duplicates_dropped": self.duplicates_dropped,
+            "cached_ids": len(self._seen),
+            "persistent_store": self.store is not None,
+        }
@@ -8,11 +8,12 @@ def add_context_to_chatbot(system_prompt, context, user_data) -> str:
 import json
 import logging
 import os
+import tempfile
 from typing import Any, Dict
 
-from openai import OpenAI
-import requests
+from openai import NOT_GIVEN, OpenAI
 from src.common.config import MAX_TOKENS, MODEL
+from src.common.utils.graph_api import graph_api_client
 from src.data.sources.firebase.utils import (
     upload_audio_to_storage,
     upload_media_to_storage,
@@ -30,18 +31,23 @@ def get_text_from_audio(media_id: str, token: str) -> str:
         str: The extracted text from the audio.
     """
 
-    audio_media_response = get_media_from_id(media_id, token)
+    audio_url = get_media_url(media_id, token)
+    audio_media_response = graph_api_client.get(audio_url, token=token)
+    audio_media_response.raise_for_status()
 
     # Upload to firestore
     file_name = f"audios/{media_id}.ogg"
     audio_path = upload_audio_to_storage(audio_media_response, file_name)
 
-    downloaded_audio_path = download_audio_in_local(audio_media_response.json()["url"])
-    print(f"Audio descargado: {audio_path}")
-    transcription = transcribe_audio(downloaded_audio_path)
-    print(f"Transcripción: {transcription}")
-
-    if os.path.exists(downloaded_audio_path):
+    # Se reutiliza la descarga en lugar de pedir el archivo otra vez. Cada
+    # audio va a su propio archivo en /tmp (lo único escribible en Cloud
+    # Functions) para que dos mensajes a la vez no se pisen.
+    downloaded_audio_path = _write_temp_audio([audio_media_response.content])
+    try:
+        print(f"Audio descargado: {audio_path}")
+        transcription = transcribe_audio(downloaded_audio_path)
+        print(f"Transcripción: {transcription}")
+    finally:
         os.remove(downloaded_audio_path)
 
     return transcription
@@ -51,57 +57,65 @@ def transcribe_audio(file_path):
     """Enviar el archivo de audio a OpenAI y obtener la transcripción."""
     client = OpenAI()
 
-    response = client.audio.transcriptions.create(
-        file=open(file_path, "rb"),
-        model="whisper-1",
-        response_format="text",
-    )
+    with open(file_path, "rb") as audio_file:
+        response = client.audio.transcriptions.create(
+            file=audio_file,
+            model="whisper-1",
+            response_format="text",
+        )
     return response
 
 
 def download_audio_in_local(url: str, token) -> str:
-    """Descargar el archivo de audio."""
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
-    }
-
-    response = requests.get(url, headers=headers)
+    """
+    Descargar el archivo de audio a un archivo temporal propio en /tmp.
+    Quien llama debe borrarlo cuando termine.
+    """
+    response = graph_api_client.get(url, token=token, stream=True)
     response.raise_for_status()
 
-    file_path = "audio.ogg"
-    with open(file_path, "wb") as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+    return _write_temp_audio(response.iter_content(chunk_size=8192))
 
-    return file_path
 
+def _write_temp_audio(chunks) -> str:
+    """Escribe el audio en un archivo temporal con nombre único y retorna su ruta."""
+    with tempfile.NamedTemporaryFile(suffix=".ogg", dir="/tmp", delete=False) as f:
+        try:
+            for chunk in chunks:
+                f.write(chunk)
+        except Exception:
+            f.close()
+            os.remove(f.name)
+            raise
+    return f.name
 
-def get_media_from_id(id: str, token):
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
-    }
-    answer = requests.get(f"https://graph.facebook.com/v21.0/{id}/", headers=headers)
-    if answer.status_code == 200:
-        answer = answer.json()
-        print("answer: ", answer)
-        url = answer["url"]
-
-        image = requests.get(url, headers=headers)
-
-        return upload_media_to_storage(image, id)
-    else:
+
+def get_media_url(id: str, token) -> str:
+    """Obtiene la URL de descarga de un archivo multimedia de WhatsApp."""
+    answer = graph_api_client.get(f"{id}/", token=token)
+    if answer.status_code != 200:
         raise Exception(f"Error getting media: {answer.status_code}, {answer.text}")
 
+    answer = answer.json()
+    print("answer: ", answer)
+    return answer["url"]
+
+
+def get_media_from_id(id: str, token):
+    image = graph_api_client.get(get_media_url(id, token), token=token)
+    image.raise_for_status()
+
+    return upload_media_to_storage(image, id)
+
 
-def generate_answer(messages, tools):
+def generate_answer(messages, tools, tool_choice=NOT_GIVEN):
     client = OpenAI()
     try:
         response = client.chat.completions.create(
             model=MODEL,
             messages=messages,
-            tools=tools,
+            tools=tools or NOT_GIVEN,
+            tool_choice=tool_choice if tools else NOT_GIVEN,
             max_tokens=MAX_TOKENS,
             temperature=0.1,
         )
@@ -0,0 +1,103 @@
+import json
+import logging
+from typing import Any, Callable, Dict, List
+
+from src.common.utils.openai_utils import add_context_to_chatbot
+from src.data.models.message import ChatMessage
+
+# Tokens que agrega el formato de chat por cada mensaje
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class AssembledPrompt:
+    """Mensajes listos para el modelo y cuántos tokens ocupan."""
+
+    def __init__(
+        self,
+        messages: List[Dict[str, Any]],
+        total_tokens: int,
+        context_sections: int,
+        history_messages: int,
+    ):
+        self.messages = messages
+        self.total_tokens = total_tokens
+        self.context_sections = context_sections
+        self.history_messages = history_messages
+
+
+class PromptAssembler:
+    """
+    Arma el prompt de un turno dentro de un presupuesto de tokens.
+
+    Siempre incluye el prompt del sistema, los datos del usuario y el último
+    mensaje. Con lo que queda agrega el contexto recuperado, en orden de
+    relevancia, y luego la historia del más nuevo al más antiguo. Para la
+    historia usa el conteo de tokens guardado en cada mensaje y solo cuenta
+    los que no lo tienen.
+    """
+
+    def __init__(self, token_budget: int, count_tokens: Callable[[str], int]):
+        self.token_budget = token_budget
+        self.count_tokens = count_tokens
+
+    def assemble(
+        self,
+        system_prompt: str,
+        context_sections: List[str],
+        user_data: Dict[str, Any],
+        history: List[ChatMessage],
+    ) -> AssembledPrompt:
+        history = list(history)
+        latest = history[-1:]
+        older = history[:-1]
+
+        used = self.count_tokens(add_context_to_chatbot(system_prompt, "", user_data))
+        used += sum(self._message_tokens(message) for message in latest)
+        used += MESSAGE_OVERHEAD_TOKENS
+
+        context = []
+        for section in context_sections:
+            tokens = self.count_tokens(section) + 1
+            if used + tokens > self.token_budget:
+                break
+            context.append(section)
+            used += tokens
+
+        selected = []
+        for message in reversed(older):
+            tokens = self._message_tokens(message)
+            if used + tokens > self.token_budget:
+                break
+            selected.append(message)
+            used += tokens
+        selected.reverse()
+
+        # Un resultado de herramienta sin la llamada que lo originó es rechazado
+        # por la API, así que se descartan si quedaron al inicio de la ventana.
+        while selected and selected[0].role == "tool":
+            used -= self._message_tokens(selected.pop(0))
+
+        window = selected + latest
+        messages = [
+            {
+                "role": "system",
+                "content": add_context_to_chatbot(
+                    system_prompt, " ".join(context), user_data
+                ),
+            },
+            *[message.to_dict() for message in window],
+        ]
+
+        logging.info(
+            f"Prompt del turno: {used} tokens de {self.token_budget} "
+            f"({len(context)} secciones de contexto, {len(window)} mensajes de historia)"
+        )
+        return AssembledPrompt(messages, used, len(context), len(window))
+
+    def _message_tokens(self, message: ChatMessage) -> int:
+        tokens = message.tokens
+        if tokens is None:
+            tokens = self.count_tokens(message.content or "")
+        if message.tool_calls:
+            tokens += self.count_tokens(json.dumps(message.tool_calls))
+        return tokens + MESSAGE_OVERHEAD_TOKENS
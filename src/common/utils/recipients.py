@@ -0,0 +1,146 @@
+import os
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Tuple
+
+import openpyxl
+import pandas as pd
+
+from src.common.config import DEFAULT_COUNTRY_CODE, RECIPIENT_READ_CHUNK_SIZE
+
+# Longitud de un número con código de país (ver validate_phone_number)
+PHONE_NUMBER_LENGTH = 12
+# Longitud de un número local, al que se le agrega DEFAULT_COUNTRY_CODE
+LOCAL_PHONE_NUMBER_LENGTH = PHONE_NUMBER_LENGTH - len(DEFAULT_COUNTRY_CODE)
+
+RECIPIENT_FILE_EXTENSIONS = {".csv", ".xlsx", ".xls"}
+
+
+def read_recipient_column(file: Any, filename: str) -> pd.Series:
+    """Lee la primera columna de un archivo CSV o Excel como texto."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in RECIPIENT_FILE_EXTENSIONS:
+        raise ValueError(
+            f"Formato de archivo no soportado: {extension or filename}. Use CSV o XLSX"
+        )
+
+    if extension == ".csv":
+        data = pd.read_csv(file, header=None, usecols=[0], dtype=str)
+    else:
+        data = pd.read_excel(file, header=None, usecols=[0], dtype=str)
+    return data[0]
+
+
+def clean_phone_numbers(numbers: pd.Series) -> Tuple[List[str], int, int]:
+    """
+    Normaliza, valida y quita duplicados de una columna de números.
+
+    Todo se hace con operaciones vectorizadas de pandas: se quitan los
+    caracteres que no son dígitos (espacios, "+", guiones y el ".0" de las
+    celdas numéricas de Excel), se agrega el código de país a los números
+    locales y se descartan los que no quedan con PHONE_NUMBER_LENGTH dígitos.
+
+    Returns:
+        Tuple[List[str], int, int]: Los números válidos sin repetir, y cuántos
+        se rechazaron y cuántos estaban repetidos.
+    """
+    digits = (
+        numbers.dropna()
+        .astype(str)
+        .str.strip()
+        .str.replace(r"\.0+$", "", regex=True)
+        .str.replace(r"\D", "", regex=True)
+    )
+    digits = digits.mask(
+        digits.str.len() == LOCAL_PHONE_NUMBER_LENGTH, DEFAULT_COUNTRY_CODE + digits
+    )
+
+    valid = digits[digits.str.len() == PHONE_NUMBER_LENGTH]
+    unique = valid.drop_duplicates()
+    return unique.tolist(), len(numbers) - len(valid), len(valid) - len(unique)
+
+
+def iter_recipient_column(
+    file: Any, filename: str, chunk_size: int = RECIPIENT_READ_CHUNK_SIZE
+) -> Iterator[pd.Series]:
+    """
+    Lee la primera columna de un CSV o XLSX por partes de `chunk_size` filas.
+
+    Los CSV se leen con el `chunksize` de pandas y los XLSX con openpyxl en
+    modo solo lectura, que recorre las filas sin cargar el libro completo.
+    Los .xls (formato antiguo) no se pueden leer por partes y se leen enteros.
+    Un CSV vacío no produce ninguna parte.
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".csv":
+        try:
+            reader = pd.read_csv(
+                file, header=None, usecols=[0], dtype=str, chunksize=chunk_size
+            )
+        except pd.errors.EmptyDataError:
+            # Un CSV vacío no tiene filas: el llamador lo trata como un archivo
+            # sin números válidos
+            return
+        for chunk in reader:
+            yield chunk[0]
+
+    elif extension == ".xlsx":
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(max_col=1, values_only=True)
+            while True:
+                chunk = [row[0] for row in islice(rows, chunk_size)]
+                if not chunk:
+                    break
+                yield pd.Series(chunk, dtype=object)
+        finally:
+            workbook.close()
+
+    else:
+        yield read_recipient_column(file, filename)
+
+
+class RecipientStream:
+    """
+    Números limpios de un archivo, leídos y validados por partes.
+
+    Al recorrerla solo hay en memoria una parte del archivo y el conjunto de
+    números ya vistos (para quitar duplicados entre partes). Los totales
+    están completos cuando termina el recorrido.
+    """
+
+    def __init__(
+        self, file: Any, filename: str, chunk_size: int = RECIPIENT_READ_CHUNK_SIZE
+    ):
+        extension = os.path.splitext(filename or "")[1].lower()
+        if extension not in RECIPIENT_FILE_EXTENSIONS:
+            raise ValueError(
+                f"Formato de archivo no soportado: {extension or filename}. Use CSV o XLSX"
+            )
+
+        self.file = file
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.accepted = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self._seen = set()
+
+    def __iter__(self) -> Iterator[str]:
+        for column in iter_recipient_column(self.file, self.filename, self.chunk_size):
+            phone_numbers, rejected, duplicates = clean_phone_numbers(column)
+            self.rejected += rejected
+            self.duplicates += duplicates
+            for phone_number in phone_numbers:
+                if phone_number in self._seen:
+                    self.duplicates += 1
+                    continue
+                self._seen.add(phone_number)
+                self.accepted += 1
+                yield phone_number
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "duplicates": self.duplicates,
+        }
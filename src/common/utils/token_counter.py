@@ -0,0 +1,133 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Tuple
+
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model: str = "gpt-4o") -> tiktoken.Encoding:
+    """Retorna el codificador del modelo; se carga una sola vez por proceso."""
+    return tiktoken.encoding_for_model(model)
+
+
+def preload_encoder(background: bool = True) -> None:
+    """
+    Carga el codificador (y sus rangos BPE) antes del primer mensaje.
+
+    En segundo plano no retrasa el arranque; si llega un mensaje antes de
+    terminar, espera la misma carga en lugar de hacer otra.
+    """
+    if background:
+        threading.Thread(target=get_encoder, name="tiktoken-preload", daemon=True).start()
+    else:
+        get_encoder()
+
+
+def count_tokens(text: str) -> int:
+    """Cuenta los tokens de un texto con el codificador compartido."""
+    if not text:
+        return 0
+    return len(get_encoder().encode(text))
+
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """Cuenta los tokens de varios textos en una sola llamada al codificador."""
+    if not texts:
+        return []
+    encoded = get_encoder().encode_batch([text or "" for text in texts])
+    return [len(tokens) for tokens in encoded]
+
+
+class TokenAccountant:
+    """
+    Cuenta tokens en segundo plano para que guardar un mensaje no espere.
+
+    Los textos se acumulan hasta batch_size o flush_seconds, se cuentan en
+    lote y los resultados se entregan al writer como pares (referencia,
+    tokens). Si la cola se llena, el conteo se hace en el mismo hilo.
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[List[Tuple[Any, int]]], None],
+        batch_size: int,
+        flush_seconds: float,
+        max_pending: int,
+    ):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopping = False
+        self.counted = 0
+
+    def submit(
+        self, ref: Any, text: str, on_counted: Optional[Callable[[int], None]] = None
+    ) -> None:
+        item = (ref, text, on_counted)
+        if self._stopping:
+            self._flush([item])
+            return
+
+        self._start()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._flush([item])
+
+    def drain(self, timeout: float = 10) -> None:
+        """Cuenta y escribe lo pendiente; se llama al terminar el proceso."""
+        self._stopping = True
+        if self._thread:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {"pending": self._queue.qsize(), "counted": self.counted}
+
+    def _start(self) -> None:
+        if self._thread:
+            return
+
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="token-accountant", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.drain)
+
+    def _run(self) -> None:
+        while not (self._stopping and self._queue.empty()):
+            items = []
+            deadline = time.monotonic() + self.flush_seconds
+            while len(items) < self.batch_size:
+                try:
+                    items.append(
+                        self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    )
+                except queue.Empty:
+                    break
+
+            if items:
+                self._flush(items)
+
+    def _flush(self, items: List[Tuple[Any, str, Optional[Callable[[int], None]]]]):
+        try:
+            counts = count_tokens_batch([text for _, text, _ in items])
+            for (_, _, on_counted), count in zip(items, counts):
+                if on_counted:
+                    on_counted(count)
+
+            self.writer([(ref, count) for (ref, _, _), count in zip(items, counts)])
+            with self._lock:
+                self.counted += len(items)
+        except Exception as e:
+            logging.error(f"Error al contar los tokens de {len(items)} mensajes: {e}")
@@ -1,63 +1,312 @@
+import hashlib
 import io
-from typing import Optional
+import json
+import os
+import pickle
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+import faiss
+import numpy as np
 import PyPDF2
 import requests
 import logging
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import OpenAIEmbeddings
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.common.config import (
+    EMBEDDING_BACKEND,
+    VECTORSTORE_EMBED_BATCH_SIZE,
+    VECTORSTORE_EMBED_WORKERS,
+    VECTORSTORE_KEEP_GENERATIONS,
+)
+from src.common.utils.docstore_file import DOCSTORE_FILENAME, DocstoreFile, write_docstore
+from src.common.utils.embeddings import get_embeddings, index_path_for_backend
+from src.common.utils.index_generations import (
+    MANIFEST_FILENAME,
+    new_generation_dir,
+    publish_generation,
+    read_manifest,
+    resolve_index_path,
+)
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
 
 class VectorStoreCreator:
     @staticmethod
     def create_from_pdf(pdf_url: str, save_path: str, openai_api_key: str) -> None:
+        VectorStoreCreator.index_sources([pdf_url], save_path, openai_api_key)
+
+    @staticmethod
+    def index_sources(
+        sources: List[str],
+        save_path: str,
+        openai_api_key: Optional[str] = None,
+        batch_size: int = VECTORSTORE_EMBED_BATCH_SIZE,
+        workers: int = VECTORSTORE_EMBED_WORKERS,
+        full: bool = False,
+        embedding_backend: str = EMBEDDING_BACKEND,
+    ) -> Dict[str, Any]:
+        """
+        Indexa las fuentes (PDF o texto, por URL o ruta local) de un chatbot.
+
+        Los fragmentos se identifican por el hash de su texto. Los que ya
+        estaban en la generación vigente reutilizan su vector
+        (index.reconstruct), solo los nuevos se embeben, en lotes de
+        `batch_size` con `workers` hilos, y los que ya no aparecen en las
+        fuentes se descartan. El índice se escribe en una generación nueva y
+        se publica reemplazando CURRENT, así que un VectorStoreManager que
+        esté leyendo la anterior no se interrumpe. Con `full` se embebe todo.
+        """
         try:
-            # Extraer contenido del PDF
-            content = VectorStoreCreator._extract_pdf_content(pdf_url)
-            
-            # Crear y guardar la base de datos vectorial
-            vectorstore = VectorStoreCreator._create_vectorstore(content, openai_api_key)
-            vectorstore.save_local(save_path)
-            
-            logging.info("Vector database created")
+            chunks = VectorStoreCreator._split_sources(sources)
+            return VectorStoreCreator.index_chunks(
+                chunks,
+                index_path_for_backend(save_path, embedding_backend),
+                get_embeddings(embedding_backend, openai_api_key),
+                batch_size=batch_size,
+                workers=workers,
+                full=full,
+            )
         except Exception as e:
             logging.error(f"Error creating vector store: {str(e)}")
             raise
 
     @staticmethod
-    def _extract_pdf_content(pdf_url: str) -> str:
-        # El mismo método que tenías antes
+    def index_chunks(
+        chunks: List[Dict[str, str]],
+        save_path: str,
+        embeddings: Embeddings,
+        batch_size: int = VECTORSTORE_EMBED_BATCH_SIZE,
+        workers: int = VECTORSTORE_EMBED_WORKERS,
+        full: bool = False,
+    ) -> Dict[str, Any]:
+        """Indexa fragmentos ya separados ({"hash", "text", "source"})."""
+        started = time.perf_counter()
+        if not chunks:
+            raise ValueError("The sources have no text to index")
+
+        previous = {} if full else VectorStoreCreator._load_previous(
+            save_path, embeddings.model
+        )
+
+        new_chunks = [chunk for chunk in chunks if chunk["hash"] not in previous]
+        new_vectors = VectorStoreCreator._embed_concurrently(
+            embeddings, [chunk["text"] for chunk in new_chunks], batch_size, workers
+        )
+        vectors_by_hash = dict(previous)
+        vectors_by_hash.update(
+            (chunk["hash"], vector) for chunk, vector in zip(new_chunks, new_vectors)
+        )
+
+        vectorstore = VectorStoreCreator._build_vectorstore(
+            chunks, vectors_by_hash, embeddings
+        )
+        generation = VectorStoreCreator._write_generation(
+            vectorstore, chunks, save_path, embeddings.model
+        )
+
+        current_hashes = {chunk["hash"] for chunk in chunks}
+        report = {
+            "generation": generation,
+            "embedding_model": embeddings.model,
+            "chunks": len(chunks),
+            "reused": len(chunks) - len(new_chunks),
+            "embedded": len(new_chunks),
+            "removed": len(set(previous) - current_hashes),
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+        logging.info(f"Vector database updated: {report}")
+        return report
+
+    @staticmethod
+    def read_chunks(vectorstore_path: str) -> List[Dict[str, str]]:
+        """Fragmentos del índice vigente, para volver a indexarlos."""
+        index_path = resolve_index_path(vectorstore_path)
+        chunks = []
+        for record in VectorStoreCreator._stored_documents(index_path):
+            source = (record.get("metadata") or {}).get("source") or vectorstore_path
+            chunks.append(
+                {
+                    "hash": chunk_hash(record["page_content"]),
+                    "text": record["page_content"],
+                    "source": source,
+                }
+            )
+        return chunks
+
+    @staticmethod
+    def write_docstore_file(vectorstore: FAISS, save_path: str) -> int:
+        """
+        Escribe los documentos del índice en docstore.bin, en el orden de sus
+        posiciones, para cargarlo sin pickle (VECTORSTORE_LOAD_MODE="mmap").
+        """
+        records = []
+        for position in range(vectorstore.index.ntotal):
+            doc_id = vectorstore.index_to_docstore_id[position]
+            doc = vectorstore.docstore.search(doc_id)
+            records.append(
+                {"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata}
+            )
+        return write_docstore(os.path.join(save_path, DOCSTORE_FILENAME), records)
+
+    @staticmethod
+    def _split_sources(sources: Iterable[str]) -> List[Dict[str, str]]:
+        """Fragmentos de todas las fuentes, sin repetidos, en orden."""
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200,
+            length_function=len
+        )
+
+        chunks = []
+        seen = set()
+        for source in sources:
+            for text in text_splitter.split_text(VectorStoreCreator._extract_content(source)):
+                digest = chunk_hash(text)
+                if digest not in seen:
+                    seen.add(digest)
+                    chunks.append({"hash": digest, "text": text, "source": source})
+        return chunks
+
+    @staticmethod
+    def _extract_content(source: str) -> str:
         try:
-            response = requests.get(pdf_url)
-            if response.status_code != 200:
-                raise Exception(f"Failed to download PDF. Status code: {response.status_code}")
-            
-            pdf_file = io.BytesIO(response.content)
-            reader = PyPDF2.PdfReader(pdf_file)
-            return ' '.join(page.extract_text() for page in reader.pages)
+            if source.startswith(("http://", "https://")):
+                response = requests.get(source)
+                if response.status_code != 200:
+                    raise Exception(f"Failed to download {source}. Status code: {response.status_code}")
+                data = response.content
+            else:
+                with open(source, "rb") as file:
+                    data = file.read()
+
+            if data.startswith(b"%PDF"):
+                reader = PyPDF2.PdfReader(io.BytesIO(data))
+                return ' '.join(page.extract_text() for page in reader.pages)
+            return data.decode("utf-8")
         except requests.RequestException as e:
-            logging.error(f"Error downloading PDF from {pdf_url}: {str(e)}")
+            logging.error(f"Error downloading source from {source}: {str(e)}")
             raise
         except PyPDF2.PdfReadError as e:
             logging.error(f"Error reading PDF content: {str(e)}")
             raise
         except Exception as e:
-            logging.error(f"Unexpected error extracting PDF content: {str(e)}")
+            logging.error(f"Unexpected error extracting content from {source}: {str(e)}")
             raise
 
     @staticmethod
-    def _create_vectorstore(content: str, openai_api_key: str) -> FAISS:
+    def _load_previous(save_path: str, model: str) -> Dict[str, np.ndarray]:
+        """Vectores de la generación vigente por hash de fragmento."""
+        index_path = resolve_index_path(save_path)
+        index_file = os.path.join(index_path, "index.faiss")
+        if not os.path.exists(index_file):
+            return {}
+
+        manifest = read_manifest(index_path)
+        if manifest:
+            if manifest.get("embedding_model") != model:
+                logging.info("Embedding model changed, every chunk will be embedded")
+                return {}
+            hashes = manifest["chunks"]
+        else:
+            # Índice creado antes de los manifiestos: se hashea su texto. Solo
+            # existen en la ruta de OpenAI (ver index_path_for_backend).
+            hashes = [
+                chunk_hash(record["page_content"])
+                for record in VectorStoreCreator._stored_documents(index_path)
+            ]
+
+        index = faiss.read_index(index_file)
+        return {
+            digest: index.reconstruct(position)
+            for position, digest in enumerate(hashes[: index.ntotal])
+        }
+
+    @staticmethod
+    def _stored_documents(index_path: str) -> List[Dict[str, Any]]:
+        docstore_file = os.path.join(index_path, DOCSTORE_FILENAME)
+        if os.path.exists(docstore_file):
+            docstore = DocstoreFile(docstore_file)
+            try:
+                return list(docstore)
+            finally:
+                docstore.close()
+
+        with open(os.path.join(index_path, "index.pkl"), "rb") as file:
+            docstore, index_to_docstore_id = pickle.load(file)
+        documents = []
+        for position in range(len(index_to_docstore_id)):
+            doc = docstore.search(index_to_docstore_id[position])
+            documents.append({"page_content": doc.page_content, "metadata": doc.metadata})
+        return documents
+
+    @staticmethod
+    def _embed_concurrently(
+        embeddings: Embeddings, texts: List[str], batch_size: int, workers: int
+    ) -> List[List[float]]:
+        batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+        if not batches:
+            return []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as executor:
+            return [
+                vector
+                for batch in executor.map(embeddings.embed_documents, batches)
+                for vector in batch
+            ]
+
+    @staticmethod
+    def _build_vectorstore(
+        chunks: List[Dict[str, str]],
+        vectors_by_hash: Dict[str, Any],
+        embeddings: Embeddings,
+    ) -> FAISS:
+        vectors = np.array(
+            [vectors_by_hash[chunk["hash"]] for chunk in chunks], dtype="float32"
+        )
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+
+        docstore = InMemoryDocstore(
+            {
+                chunk["hash"]: Document(
+                    page_content=chunk["text"], metadata={"source": chunk["source"]}
+                )
+                for chunk in chunks
+            }
+        )
+        index_to_docstore_id = {position: chunk["hash"] for position, chunk in enumerate(chunks)}
+        return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+    @staticmethod
+    def _write_generation(
+        vectorstore: FAISS, chunks: List[Dict[str, str]], save_path: str, model: str
+    ) -> str:
+        os.makedirs(save_path, exist_ok=True)
+        generation_dir = new_generation_dir(save_path)
         try:
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len
-            )
-            chunks = text_splitter.split_text(content)
-            
-            embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
-            return FAISS.from_texts(chunks, embeddings)
-        except Exception as e:
-            logging.error(f"Error creating vectorstore: {str(e)}")
+            vectorstore.save_local(generation_dir)
+            VectorStoreCreator.write_docstore_file(vectorstore, generation_dir)
+            with open(os.path.join(generation_dir, MANIFEST_FILENAME), "w") as file:
+                json.dump(
+                    {
+                        "embedding_model": model,
+                        "sources": sorted({chunk["source"] for chunk in chunks}),
+                        "chunks": [chunk["hash"] for chunk in chunks],
+                    },
+                    file,
+                )
+        except Exception:
+            shutil.rmtree(generation_dir, ignore_errors=True)
             raise
 
-
+        publish_generation(save_path, generation_dir, keep=VECTORSTORE_KEEP_GENERATIONS)
+        return os.path.basename(generation_dir)
@@ -1,23 +1,18 @@
 import logging
 from typing import Any, Dict
 
-import requests
+from src.common.utils.graph_api import graph_api_client
 from src.common.utils.openai_utils import get_text_from_audio
 from src.common.whatsapp.models.models import WhatsAppMessage
+from src.common.whatsapp.models.webhook_models import WebhookPayload
 
 
 def is_valid_whatsapp_message(body):
     """
-    Check if the incoming webhook event has a valid WhatsApp message structure.
+    Check if the incoming webhook event has at least one WhatsApp message in
+    any of its entries or changes.
     """
-    return (
-        body.get("object")
-        and body.get("entry")
-        and body["entry"][0].get("changes")
-        and body["entry"][0]["changes"][0].get("value")
-        and body["entry"][0]["changes"][0]["value"].get("messages")
-        and body["entry"][0]["changes"][0]["value"]["messages"][0]
-    )
+    return bool(WebhookPayload.from_dict(body).messages)
 
 
 def is_reaction_whatsapp_message(message):
@@ -66,21 +61,31 @@ def send_whatsapp_message(
         data (str): The JSON-formatted message data.
     """
 
-    api_url = f"https://graph.facebook.com/v21.0/{from_whatsapp_id}/messages"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
-    }
-    
+    response = None
     try:
         data = message.create_message()
-        print("DATA:", data)
-        response = requests.post(api_url, headers=headers, data=data)
+        response = graph_api_client.post(
+            f"{from_whatsapp_id}/messages",
+            phone_number_id=from_whatsapp_id,
+            token=token,
+            headers={"Content-Type": "application/json"},
+            data=data,
+        )
         if response.status_code != 200:
             # TODO: Print only in productions
             logging.info(f"Status code: {response.status_code}.")
-            raise Exception(f"Failed to send message. Status code: {response.status_code}. Repsonse:{response.json()}")
+            raise Exception(f"Failed to send message. Status code: {response.status_code}. Repsonse:{_response_body(response)}")
         return {"status": "success", "number": message.to_number, "body": response.json()}
     except Exception as e:
         logging.error(f"Error sending message: {str(e)}")
-        return {"status": "error", "number": message.to_number, "message": str(e), "body": response.json() }
+        return {"status": "error", "number": message.to_number, "message": str(e), "body": _response_body(response)}
+
+
+def _response_body(response) -> Any:
+    """Cuerpo de la respuesta, aunque no sea JSON o no haya respuesta."""
+    if response is None:
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
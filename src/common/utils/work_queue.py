@@ -0,0 +1,154 @@
+import atexit
+import logging
+import queue
+import signal
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict
+
+
+class WorkQueue(ABC):
+    """Cola de trabajo donde los webhooks dejan el procesamiento pesado."""
+
+    @abstractmethod
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> bool:
+        """Encola un trabajo. Retorna False si la cola no lo acepta."""
+        pass
+
+    @abstractmethod
+    def drain(self, timeout: float) -> bool:
+        """Deja de aceptar trabajos y espera a que terminen los pendientes."""
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InProcessWorkQueue(WorkQueue):
+    """
+    Cola en memoria atendida por un número fijo de hilos.
+
+    La cola tiene un tamaño máximo: cuando está llena `submit` retorna False
+    para que el webhook responda con error y Meta reintente más tarde.
+
+    Solo sirve en procesos de larga duración: en Cloud Functions los hilos no
+    tienen CPU después de responder y lo encolado se pierde (ver
+    WEBHOOK_ASYNC_MODE).
+    """
+
+    _STOP = object()
+
+    def __init__(self, workers: int, max_size: int, name: str = "work-queue"):
+        self.workers = workers
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._accepting = True
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> bool:
+        if not self._accepting:
+            self._count("_rejected")
+            return False
+
+        self._start_workers()
+        try:
+            self._queue.put_nowait((fn, args, kwargs))
+            return True
+        except queue.Full:
+            self._count("_rejected")
+            logging.warning(f"Cola {self.name} llena, trabajo rechazado")
+            return False
+
+    def drain(self, timeout: float) -> bool:
+        self._accepting = False
+        with self._lock:
+            threads = [thread for thread in self._threads if thread.is_alive()]
+
+        deadline = time.monotonic() + timeout
+        try:
+            for _ in threads:
+                # Los hilos terminan al encontrar el marcador, después de los
+                # trabajos que ya estaban en la cola.
+                self._queue.put(self._STOP, timeout=max(deadline - time.monotonic(), 0))
+
+            for thread in threads:
+                thread.join(max(deadline - time.monotonic(), 0))
+                if thread.is_alive():
+                    raise queue.Full()
+        except queue.Full:
+            logging.error(
+                f"La cola {self.name} no terminó de vaciarse en {timeout}s, "
+                f"quedan {self._queue.qsize()} trabajos"
+            )
+            return False
+
+        logging.info(f"Cola {self.name} vaciada")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self._queue.qsize(),
+            "max_size": self._queue.maxsize,
+            "workers": self.workers,
+            "processed": self._processed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+        }
+
+    def install_shutdown_hooks(self, timeout: float) -> None:
+        """Vacía la cola al terminar el proceso (atexit y SIGTERM)."""
+        atexit.register(self.drain, timeout)
+
+        try:
+            previous = signal.getsignal(signal.SIGTERM)
+
+            def handle_sigterm(signum, frame):
+                self.drain(timeout)
+                if callable(previous):
+                    previous(signum, frame)
+                else:
+                    raise SystemExit(0)
+
+            signal.signal(signal.SIGTERM, handle_sigterm)
+        except ValueError:
+            # Solo el hilo principal puede instalar manejadores de señales
+            logging.info(f"No se instaló el manejador de SIGTERM para {self.name}")
+
+    def _start_workers(self) -> None:
+        if self._threads:
+            return
+
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work, name=f"{self.name}-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is self._STOP:
+                    return
+
+                fn, args, kwargs = item
+                fn(*args, **kwargs)
+                self._count("_processed")
+            except Exception as e:
+                self._count("_failed")
+                logging.exception(f"Error procesando trabajo en {self.name}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 import json
-from typing import Dict, Any, List
+import re
+from typing import Dict, Any, List, Optional
 
 
 class WhatsAppMessage(ABC):
@@ -20,6 +21,9 @@ class TemplateMessage(WhatsAppMessage):
         self.parameters = parameters
 
     def create_message(self):
+        return json.dumps(self.build_payload())
+
+    def build_payload(self, components=None) -> Dict[str, Any]:
         template_object = {
             "name": self.template,
             "language": {"code": self.code},
@@ -41,14 +45,101 @@ class TemplateMessage(WhatsAppMessage):
             template_object["components"] = [
                 {"type": "body", "parameters": self.parameters},
             ]
-        return json.dumps(
-            {
-                "messaging_product": "whatsapp",
-                "to": self.to_number,
-                "type": "template",
-                "template": template_object,
-            }
+        if components is not None:
+            template_object["components"] = components
+        return {
+            "messaging_product": "whatsapp",
+            "to": self.to_number,
+            "type": "template",
+            "template": template_object,
+        }
+
+
+class PreparedTemplate:
+    """
+    Plantilla serializada una sola vez para enviarla a muchos destinatarios.
+
+    El JSON se genera con marcadores en `to` y en los parámetros del cuerpo;
+    por destinatario solo se unen las partes con esos dos valores, en lugar
+    de armar el diccionario y llamar a json.dumps cada vez.
+    """
+
+    TO_PLACEHOLDER = "{{__to__}}"
+    BODY_PARAMETERS_PLACEHOLDER = "{{__body_parameters__}}"
+
+    def __init__(
+        self,
+        template: str,
+        code: str = "es",
+        components: Optional[List[Dict[str, Any]]] = None,
+        body_parameters: bool = False,
+        content: Optional[str] = None,
+    ):
+        self.template = template
+        self.code = code
+        self.content = content
+
+        message = TemplateMessage(
+            to_number=self.TO_PLACEHOLDER,
+            template=template,
+            code=code,
+            parameters=self.BODY_PARAMETERS_PLACEHOLDER if body_parameters else None,
+        )
+        if components is not None and body_parameters:
+            components = [
+                component
+                for component in components
+                if component.get("type") != "body"
+            ] + [{"type": "body", "parameters": self.BODY_PARAMETERS_PLACEHOLDER}]
+
+        placeholders = [
+            json.dumps(self.TO_PLACEHOLDER),
+            json.dumps(self.BODY_PARAMETERS_PLACEHOLDER),
+        ]
+        self._parts = re.split(
+            "(" + "|".join(re.escape(p) for p in placeholders) + ")",
+            json.dumps(message.build_payload(components)),
         )
+        self._to, self._body_parameters = placeholders
+
+    def render(self, to_number: str, parameters: Optional[List[Any]] = None) -> str:
+        """Retorna el JSON del mensaje para un destinatario."""
+        values = {
+            self._to: json.dumps(to_number),
+            self._body_parameters: json.dumps(
+                [
+                    {"type": "text", "text": str(p)} if not isinstance(p, dict) else p
+                    for p in parameters or []
+                ]
+            ),
+        }
+        return "".join(values.get(part, part) for part in self._parts)
+
+    def message(
+        self, to_number: str, parameters: Optional[List[Any]] = None
+    ) -> "PreparedTemplateMessage":
+        return PreparedTemplateMessage(self, to_number, parameters)
+
+
+class PreparedTemplateMessage(WhatsAppMessage):
+    """Mensaje de un destinatario a partir de un PreparedTemplate."""
+
+    def __init__(
+        self,
+        prepared: PreparedTemplate,
+        to_number: str,
+        parameters: Optional[List[Any]] = None,
+    ):
+        self.to_number = to_number
+        self.prepared = prepared
+        self.parameters = parameters
+
+    @property
+    def template(self) -> str:
+        return self.prepared.template
+
+    def create_message(self) -> str:
+        return self.prepared.render(self.to_number, self.parameters)
 
 
 class TextMessage(WhatsAppMessage):
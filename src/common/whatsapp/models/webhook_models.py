@@ -0,0 +1,79 @@
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class IncomingMessage:
+    """Mensaje entrante de un webhook, con el número del negocio que lo recibió."""
+
+    __slots__ = ("phone_number_id", "id", "from_number", "type", "timestamp", "raw")
+
+    def __init__(self, phone_number_id: str, raw: Dict[str, Any]):
+        self.phone_number_id = phone_number_id
+        self.id = raw.get("id")
+        self.from_number = raw.get("from")
+        self.type = raw.get("type")
+        self.timestamp = raw.get("timestamp")
+        self.raw = raw
+
+    @property
+    def is_reaction(self) -> bool:
+        return self.type == "reaction"
+
+
+class StatusUpdate:
+    """Actualización de estado (sent, delivered, read, failed) de un mensaje enviado."""
+
+    __slots__ = ("phone_number_id", "id", "status", "recipient_id", "timestamp", "errors")
+
+    def __init__(self, phone_number_id: str, raw: Dict[str, Any]):
+        self.phone_number_id = phone_number_id
+        self.id = raw.get("id")
+        self.status = raw.get("status")
+        self.recipient_id = raw.get("recipient_id")
+        self.timestamp = raw.get("timestamp")
+        self.errors = raw.get("errors")
+
+
+class WebhookPayload:
+    """
+    Todos los eventos de un cuerpo de webhook.
+
+    Meta agrupa varias entradas, cambios, mensajes y estados en un mismo POST,
+    así que se recorren todos en lugar de solo el primero.
+    """
+
+    def __init__(self, messages: List[IncomingMessage], statuses: List[StatusUpdate]):
+        self.messages = messages
+        self.statuses = statuses
+
+    @classmethod
+    def from_dict(cls, body: Optional[Dict[str, Any]]) -> "WebhookPayload":
+        messages = []
+        statuses = []
+        if not isinstance(body, dict) or not body.get("object"):
+            return cls(messages, statuses)
+
+        for entry in body.get("entry") or []:
+            for change in entry.get("changes") or []:
+                value = change.get("value") or {}
+                phone_number_id = (value.get("metadata") or {}).get("phone_number_id")
+
+                for message in value.get("messages") or []:
+                    messages.append(IncomingMessage(phone_number_id, message))
+                for status in value.get("statuses") or []:
+                    statuses.append(StatusUpdate(phone_number_id, status))
+
+        return cls(messages, statuses)
+
+    def is_empty(self) -> bool:
+        return not self.messages and not self.statuses
+
+    def group_messages(self) -> Dict[Tuple[str, str], List[IncomingMessage]]:
+        """Agrupa los mensajes por (phone_number_id, número del contacto)."""
+        groups = defaultdict(list)
+        for message in self.messages:
+            groups[(message.phone_number_id, message.from_number)].append(message)
+
+        for messages in groups.values():
+            messages.sort(key=lambda message: int(message.timestamp or 0))
+        return dict(groups)
@@ -1,4 +1,5 @@
 from typing import List
+from src.common.config import EMBEDDING_BACKEND
 from src.managers.vector_store_manager import VectorStoreManager
 
 
@@ -14,7 +15,8 @@ class ChatbotModel:
         vectorstore_path: str,
         specific_prompt: str = "",
         tools = {},
-        tool_calls = {}
+        tool_calls = {},
+        embedding_backend: str = EMBEDDING_BACKEND,
     ):
         self.name = name
         self.company = company
@@ -23,7 +25,9 @@ class ChatbotModel:
         self.personality = personality
         self.expressions = expressions
         self.specific_prompt = specific_prompt
-        self.vectorstore = VectorStoreManager(vectorstore_path)
+        self.vectorstore = VectorStoreManager(
+            vectorstore_path, embedding_backend=embedding_backend
+        )
         self.tools = tools
         self.tool_calls = tool_calls
 
@@ -1,11 +1,12 @@
 class ChatMessage:
-    def __init__(self, role, content, tool_calls=None, tool_call_id=None, function_name=None, function_response=None, **kwargs):
+    def __init__(self, role, content, tool_calls=None, tool_call_id=None, function_name=None, function_response=None, tokens=None, **kwargs):
         self.role = role
         self.content = content
         self.tool_calls = tool_calls
         self.tool_call_id = tool_call_id
         self.function_name = function_name
         self.function_response = function_response
+        self.tokens = tokens
         #self.seen = False
 
     def to_dict(self):
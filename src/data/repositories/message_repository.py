@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Any, Dict, List
 
 
 class MessageRepository(ABC):
@@ -16,10 +16,20 @@ class MessageRepository(ABC):
     ):
         pass
 
+    @abstractmethod
+    def create_messages(self, messages: List[Dict[str, Any]]):
+        """Añade varios mensajes; cada uno con los argumentos de create_message."""
+        pass
+
     @abstractmethod
     def get_message(self, msj_id):
         pass
 
+    @abstractmethod
+    def update_statuses(self, statuses: Dict[str, str]) -> int:
+        """Actualiza el estado de varios mensajes a partir de su wa_id."""
+        pass
+
     @abstractmethod
     def update_message(self, user_id, phone_number, message, role, **kwargs):
         pass
@@ -32,6 +42,10 @@ class MessageRepository(ABC):
     def get_messages(self, user_id, phone_number) -> List:
         pass
 
+    @abstractmethod
+    def get_recent_messages(self, user_id, phone_number, limit, max_tokens=None) -> List:
+        pass
+
     def create_contact_message(
         self,
         conversation_ref,
@@ -53,6 +67,31 @@ class MessageRepository(ABC):
             **kargs,
         )
 
+    def create_contact_messages(
+        self,
+        conversation_ref,
+        contact_ref,
+        ws_id,
+        phone_number,
+        messages: List[Dict[str, str]],
+        **kargs,
+    ):
+        """Añade varios mensajes del contacto; cada uno con wa_id y message."""
+        self.create_messages(
+            [
+                {
+                    "conversation_ref": conversation_ref,
+                    "contact_ref": contact_ref,
+                    "ws_id": ws_id,
+                    "phone_number": phone_number,
+                    "role": "user",
+                    **message,
+                    **kargs,
+                }
+                for message in messages
+            ]
+        )
+
     def create_chat_message(
         self,
         conversation_ref,
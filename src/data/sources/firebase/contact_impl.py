@@ -1,7 +1,7 @@
 import logging
 from src.data.repositories.contact_repository import ContactRepository
-from src.data.sources.firebase.utils import get_contact_ref
-from src.data.sources.firebase.config import db
+from src.data.sources.firebase.contact_resolver import contact_resolver
+from src.data.sources.firebase.tenant_metadata import tenant_metadata
 
 
 class ContactFirebaseRepository(ContactRepository):
@@ -22,22 +22,8 @@ class ContactFirebaseRepository(ContactRepository):
                     "Los números a consultar deben tener su respectivo codigo de país"
                 )
 
-            contact_query = (
-                db.collection_group("contacts")
-                .where("ws_id", "==", ws_id)
-                .where("phone_number", "==", phone_number)
-                .limit(1)
-            )
-
-            contact_snapshots = contact_query.get()
-
-            if not contact_snapshots:
-                logging.info(
-                    f"No se encontró ningún contacto con el número {phone_number} para el usuario con ws_id {ws_id}. Se creará uno nuevo"
-                )
-                return self.create_contact(ws_id, phone_number)
-
-            return contact_snapshots[0].to_dict()
+            # El contacto se resuelve una vez por turno y se reutiliza de la caché
+            return contact_resolver.resolve(ws_id, phone_number).contact_data
 
         except Exception as e:
             print(f"Error al obtener datos del usuario {ws_id}: {str(e)}")
@@ -62,17 +48,7 @@ class ContactFirebaseRepository(ContactRepository):
                     "Los números a consultar deben tener su respectivo codigo de país"
                 )
 
-            contact_query = (
-                db.collection_group("contacts")
-                .where("ws_id", "==", ws_id)
-                .where("phone_number", "==", phone_number)
-                .limit(1)
-            )
-
-            contact_snapshots = contact_query.get()
-            contact_snapshots[0].reference.update(data)
-            
-            return contact_snapshots[0].get()
+            return contact_resolver.update_contact(ws_id, phone_number, data)
 
         except Exception as e:
             logging.error(
@@ -82,13 +58,7 @@ class ContactFirebaseRepository(ContactRepository):
 
 
     def create_contact(self, ws_id: str, phone_number: str): # TODO: Add ws_token
-        business_query = db.collection("business").where("ws_id", "==", ws_id)
-        business_snapshots = business_query.get()
-
-        if not business_snapshots:
-            raise Exception(f"No se encontró ningún business con ws_id {ws_id}")
-        
-        business_ref = business_snapshots[0].reference
+        business_ref = tenant_metadata.get_business_ref(ws_id)
         contact_ref = business_ref.collection("contacts").document()
         contact_ref.set({"ws_id": ws_id, "phone_number": phone_number})
 
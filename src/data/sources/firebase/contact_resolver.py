@@ -0,0 +1,209 @@
+import datetime
+import logging
+import threading
+from typing import Any, Dict, List
+
+from firebase_admin.firestore import firestore
+
+from src.common.config import CONTACT_CACHE_MAX_SIZE, CONTACT_CACHE_TTL_SECONDS
+from src.common.utils.cache import TTLCache
+from src.data.sources.firebase.config import db
+from src.data.sources.firebase.tenant_metadata import tenant_metadata
+from src.data.sources.firebase.utils import (
+    FIRESTORE_BATCH_LIMIT,
+    FIRESTORE_IN_QUERY_LIMIT,
+    chunked,
+    get_or_create_contact,
+    get_or_create_conversation,
+    new_conversation_data,
+)
+
+
+class ContactResolution:
+    """Referencias del contacto y su conversación activa, con los datos del contacto."""
+
+    def __init__(self, contact_ref, conversation_ref, contact_data: Dict[str, Any]):
+        self.contact_ref = contact_ref
+        self.conversation_ref = conversation_ref
+        self.contact_data = contact_data
+
+
+class ContactResolver:
+    """
+    Resuelve (ws_id, phone_number) a su contacto y conversación una sola vez.
+
+    Las resoluciones se guardan en una caché con TTL y desalojo LRU. Las
+    actualizaciones del contacto pasan por aquí para escribirse en Firestore
+    y en la copia en caché al mismo tiempo. La copia no se modifica en su
+    lugar: se reemplaza bajo un lock, así que quien ya tiene `contact_data`
+    nunca la ve a medio actualizar.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._cache = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+
+    def resolve(self, ws_id: str, phone_number: str) -> ContactResolution:
+        key = (ws_id, phone_number)
+        resolution = self._cache.get(key)
+        if resolution:
+            return resolution
+
+        contact_snapshots = (
+            db.collection_group("contacts")
+            .where("phone_number", "==", phone_number)
+            .where("ws_id", "==", ws_id)
+            .limit(1)
+            .get()
+        )
+
+        if contact_snapshots:
+            contact_ref = contact_snapshots[0].reference
+            contact_data = contact_snapshots[0].to_dict()
+        else:
+            logging.info(
+                f"No se encontró ningún contacto con el número {phone_number} para el usuario con ws_id {ws_id}. Se creará uno nuevo"
+            )
+            contact_ref = get_or_create_contact(
+                phone_number, ws_id, contacts_snapshots=contact_snapshots
+            )
+            contact_data = {"phone_number": phone_number, "ws_id": ws_id}
+
+        resolution = ContactResolution(
+            contact_ref, get_or_create_conversation(contact_ref), contact_data
+        )
+        self._cache.set(key, resolution)
+        return resolution
+
+    def resolve_many(
+        self, ws_id: str, phone_numbers: List[str]
+    ) -> Dict[str, ContactResolution]:
+        """
+        Resuelve de una vez los contactos y conversaciones de una audiencia.
+
+        Los que no están en caché se buscan con consultas `in` de hasta 30
+        números (contactos) y 30 referencias (conversaciones en curso); los
+        que faltan se crean con escrituras en lote. Todas las resoluciones
+        quedan en caché para los envíos siguientes.
+
+        Returns:
+            Dict[str, ContactResolution]: número -> contacto y conversación.
+        """
+        resolutions = {}
+        unresolved = []
+        for phone_number in dict.fromkeys(phone_numbers):
+            resolution = self._cache.get((ws_id, phone_number))
+            if resolution:
+                resolutions[phone_number] = resolution
+            else:
+                unresolved.append(phone_number)
+        if not unresolved:
+            return resolutions
+
+        contacts = {}
+        for chunk in chunked(unresolved, FIRESTORE_IN_QUERY_LIMIT):
+            snapshots = (
+                db.collection_group("contacts")
+                .where("ws_id", "==", ws_id)
+                .where("phone_number", "in", chunk)
+                .get()
+            )
+            for snapshot in snapshots:
+                contacts.setdefault(
+                    snapshot.get("phone_number"),
+                    (snapshot.reference, snapshot.to_dict()),
+                )
+
+        conversations = {}
+        contact_refs = [contact_ref for contact_ref, _ in contacts.values()]
+        for chunk in chunked(contact_refs, FIRESTORE_IN_QUERY_LIMIT):
+            snapshots = (
+                db.collection("conversations")
+                .where("status", "==", "ongoing")
+                .where("contact_ref", "in", chunk)
+                .get()
+            )
+            for snapshot in snapshots:
+                conversations.setdefault(
+                    snapshot.get("contact_ref").path, snapshot.reference
+                )
+
+        new_documents = []
+        new_contacts = [phone for phone in unresolved if phone not in contacts]
+        if new_contacts:
+            logging.info(f"Se crearán {len(new_contacts)} contactos para {ws_id}")
+            business_ref = tenant_metadata.get_business_ref(ws_id)
+            for phone_number in new_contacts:
+                contact_data = {"phone_number": phone_number, "ws_id": ws_id}
+                contact_ref = business_ref.collection("contacts").document()
+                contacts[phone_number] = (contact_ref, dict(contact_data))
+                new_documents.append((contact_ref, contact_data))
+
+        for contact_ref, _ in contacts.values():
+            if contact_ref.path in conversations:
+                continue
+            conversation_ref = db.collection("conversations").document()
+            conversations[contact_ref.path] = conversation_ref
+            new_documents.append(
+                (conversation_ref, new_conversation_data(contact_ref))
+            )
+
+        for chunk in chunked(new_documents, FIRESTORE_BATCH_LIMIT):
+            batch = db.batch()
+            for reference, data in chunk:
+                batch.set(reference, data)
+            batch.commit()
+
+        for phone_number, (contact_ref, contact_data) in contacts.items():
+            resolution = ContactResolution(
+                contact_ref, conversations[contact_ref.path], contact_data
+            )
+            self._cache.set((ws_id, phone_number), resolution)
+            resolutions[phone_number] = resolution
+        return resolutions
+
+    def update_contact(
+        self, ws_id: str, phone_number: str, data: Dict[str, Any], batch=None
+    ) -> Dict[str, Any]:
+        """
+        Actualiza el contacto en Firestore y en la caché. Retorna sus datos.
+
+        Si se pasa `batch` (un WriteBatch o un BulkWriteSession), la escritura
+        se agrega ahí en lugar de hacerse en el momento.
+        """
+        resolution = self.resolve(ws_id, phone_number)
+        if batch:
+            batch.update(resolution.contact_ref, data)
+        else:
+            resolution.contact_ref.update(data)
+
+        # La copia en caché no puede guardar el centinela del servidor
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            resolution.contact_data = {
+                **resolution.contact_data,
+                **_replace_server_timestamps(data, now),
+            }
+            return resolution.contact_data
+
+    def invalidate(self, ws_id: str, phone_number: str) -> None:
+        self._cache.pop((ws_id, phone_number))
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+def _replace_server_timestamps(data: Dict[str, Any], now: datetime.datetime):
+    replaced = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            value = _replace_server_timestamps(value, now)
+        elif value is firestore.SERVER_TIMESTAMP:
+            value = now
+        replaced[key] = value
+    return replaced
+
+
+contact_resolver = ContactResolver(
+    max_size=CONTACT_CACHE_MAX_SIZE, ttl_seconds=CONTACT_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,58 @@
+import random
+from typing import Any, Dict
+
+from firebase_admin.firestore import firestore
+
+from src.common.config import COUNTER_SHARDS
+
+# Subcolección donde cada documento contador guarda sus shards
+COUNTER_SHARDS_COLLECTION = "counter_shards"
+
+
+class ShardedCounters:
+    """
+    Contadores sin contención para documentos muy escritos (como una campaña).
+
+    Los incrementos no se escriben en el documento sino en uno de
+    `num_shards` documentos de su subcolección `counter_shards`, elegido al
+    azar, así que ningún documento recibe todas las escrituras. Se agregan
+    al mismo lote o transacción que la escritura que cuentan, así que nada
+    queda en memoria cuando la instancia se apaga. `get_total` suma los
+    shards.
+    """
+
+    def __init__(self, num_shards: int):
+        self.num_shards = max(num_shards, 1)
+
+    def add_to_batch(self, batch, doc_ref, increments: Dict[str, int]) -> None:
+        """Agrega los incrementos a un lote o transacción, en un shard al azar."""
+        increments = {field: amount for field, amount in increments.items() if amount}
+        if increments:
+            batch.set(
+                self._shard_ref(doc_ref),
+                {field: firestore.Increment(n) for field, n in increments.items()},
+                merge=True,
+            )
+
+    def get_total(self, doc_ref, field: str) -> int:
+        return self.get_totals(doc_ref, [field])[field]
+
+    def get_totals(self, doc_ref, fields) -> Dict[str, int]:
+        """Suma los shards de varios campos con una sola consulta."""
+        totals = {field: 0 for field in fields}
+        for snapshot in doc_ref.collection(COUNTER_SHARDS_COLLECTION).get():
+            data = snapshot.to_dict() or {}
+            for field in fields:
+                totals[field] += data.get(field) or 0
+        return totals
+
+    def stats(self) -> Dict[str, Any]:
+        return {"shards": self.num_shards}
+
+    def _shard_ref(self, doc_ref):
+        return doc_ref.collection(COUNTER_SHARDS_COLLECTION).document(
+            str(random.randrange(self.num_shards))
+        )
+
+
+counters = ShardedCounters(num_shards=COUNTER_SHARDS)
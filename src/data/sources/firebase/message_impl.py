@@ -1,11 +1,96 @@
 import logging
-import tiktoken
-from typing import List, Optional
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+from src.common.config import (
+    HISTORY_TAIL_CACHE_SIZE,
+    HISTORY_TAIL_SIZE,
+    HISTORY_TAIL_TTL_SECONDS,
+    HISTORY_WINDOW_SIZE,
+    TOKEN_COUNT_BATCH_SIZE,
+    TOKEN_COUNT_DEFERRED,
+    TOKEN_COUNT_FLUSH_SECONDS,
+    TOKEN_COUNT_MAX_PENDING,
+)
+from src.common.utils.cache import TTLCache
+from src.common.utils.token_counter import TokenAccountant, count_tokens_batch
 from src.data.sources.firebase.config import db
+from src.data.sources.firebase.counters import counters
+from src.data.sources.firebase.utils import (
+    FIRESTORE_BATCH_LIMIT,
+    FIRESTORE_IN_QUERY_LIMIT,
+    BulkWriteSession,
+    chunked,
+)
 from src.data.models.message import ChatMessage
 from src.data.repositories.message_repository import MessageRepository
 from firebase_admin.firestore import firestore
 
+class ConversationTail:
+    """
+    Últimos mensajes de una conversación en memoria.
+
+    `ids` son los documentos que ya están en la cola (leídos de Firestore o
+    escritos por este proceso) y `synced_at` el timestamp más reciente leído
+    de Firestore, desde el que se buscan los mensajes de otras instancias.
+    """
+
+    def __init__(self, snapshots, maxlen: int):
+        self.messages: deque = deque(maxlen=maxlen)
+        self.ids = set()
+        self.synced_at = None
+        for snapshot in snapshots:
+            data = snapshot.to_dict()
+            self.append(snapshot.id, ChatMessage(**data))
+            self.advance(data.get("timestamp"))
+
+    def append(self, message_id: str, chat_message: ChatMessage) -> None:
+        self.messages.append(chat_message)
+        self.ids.add(message_id)
+
+    def advance(self, timestamp) -> None:
+        if timestamp and (self.synced_at is None or timestamp > self.synced_at):
+            self.synced_at = timestamp
+
+
+# Últimos mensajes de cada conversación (ws_id, phone_number) en memoria
+conversation_tails = TTLCache(
+    max_size=HISTORY_TAIL_CACHE_SIZE, ttl_seconds=HISTORY_TAIL_TTL_SECONDS
+)
+
+
+def write_token_counts(counts: List[Tuple[firestore.DocumentReference, int]]) -> None:
+    """Guarda en lote el conteo de tokens de mensajes ya escritos."""
+    for chunk in chunked(counts, FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for message_ref, tokens in chunk:
+            batch.update(message_ref, {"tokens": tokens})
+        batch.commit()
+
+
+token_accountant = TokenAccountant(
+    write_token_counts,
+    batch_size=TOKEN_COUNT_BATCH_SIZE,
+    flush_seconds=TOKEN_COUNT_FLUSH_SECONDS,
+    max_pending=TOKEN_COUNT_MAX_PENDING,
+)
+
+# Orden de los estados de un mensaje enviado; un estado solo avanza
+MESSAGE_STATUS_RANK = {"sent": 1, "delivered": 2, "seen": 3, "failed": 4}
+
+# Contadores de la campaña que se incrementan cuando un mensaje llega a un estado.
+# Un "failed" del webhook es de un mensaje que la Graph API aceptó y que ya está
+# en sent_messages, así que va en su propio contador y no en failed_messages
+# (los rechazados al enviar).
+CAMPAIGN_STATUS_COUNTERS = {
+    "delivered": "delivered_messages",
+    "seen": "read_messages",
+    "failed": "undelivered_messages",
+}
+
+# Estados por transacción: cada uno escribe el mensaje, su entrada del índice
+# y, como mucho, un shard de contador
+STATUS_TRANSACTION_SIZE = FIRESTORE_BATCH_LIMIT // 3
+
 
 class MessageFirebaseRepository(MessageRepository):
     def validate_phone_number(self, phone_number):
@@ -28,28 +113,14 @@ class MessageFirebaseRepository(MessageRepository):
     ):
         """Añade un mensaje a la conversación."""
         try:
-            # Validar el número de teléfono
-            self.validate_phone_number(phone_number)
-            # Puede que esto demore
-            enc = tiktoken.encoding_for_model("gpt-4o")
-            tokens = enc.encode(message)
-            # Medir tiempo
-
-            message_ref = conversation_ref.collection("messages").document()
-            message_ref.set(
-                {
-                    "contact_ref": contact_ref,
-                    "content": message,
-                    "role": role,
-                    "ws_id": ws_id,
-                    "wa_id": wa_id,
-                    "tokens": len(tokens),
-                    "phone_number": phone_number,
-                    "platform": "whatsapp",
-                    "timestamp": firestore.SERVER_TIMESTAMP,
-                    **kwargs,
-                }
+            data = self._build_message_data(
+                contact_ref, ws_id, wa_id, phone_number, message, role, **kwargs
             )
+            self._set_token_counts([data])
+            batch = db.batch()
+            message_ref = self._add_to_batch(batch, conversation_ref, data)
+            batch.commit()
+            self._after_write([(message_ref, data)])
             logging.info(
                 f"Mensaje {'del usuario' if role else 'del bot'} añadido para {phone_number} "
                 f"del usuario con ws_id {ws_id}, id mensaje: {wa_id}."
@@ -62,8 +133,177 @@ class MessageFirebaseRepository(MessageRepository):
             logging.error(f"Error al añadir mensaje para usuario {ws_id}: {e}")
             raise
 
+    def create_messages(self, messages: List[Dict[str, Any]]):
+        """Añade varios mensajes con escrituras en lote."""
+        try:
+            prepared = []
+            for data in messages:
+                data = dict(data)
+                conversation_ref = data.pop("conversation_ref")
+                prepared.append((conversation_ref, self._build_message_data(**data)))
+            self._set_token_counts([data for _, data in prepared])
+
+            batch = db.batch()
+            operations = 0
+            written = []
+            for conversation_ref, data in prepared:
+                written.append((self._add_to_batch(batch, conversation_ref, data), data))
+                operations += 2 if data.get("wa_id") else 1
+                if operations >= FIRESTORE_BATCH_LIMIT - 1:
+                    batch.commit()
+                    batch = db.batch()
+                    operations = 0
+            batch.commit()
+
+            self._after_write(written)
+
+            logging.info(f"{len(messages)} mensajes añadidos en lote")
+
+        except ValueError as ve:
+            logging.error(f"Error de validación: {ve}")
+            raise
+        except Exception as e:
+            logging.error(f"Error al añadir mensajes en lote: {e}")
+            raise
+
+    def bulk_create_messages(
+        self, messages: List[Dict[str, Any]], session: BulkWriteSession
+    ) -> List[firestore.DocumentReference]:
+        """
+        Agrega varios mensajes, y sus entradas del índice, a un BulkWriteSession.
+
+        Los tokens se cuentan siempre antes de escribir, aunque el conteo sea
+        diferido: los mensajes de una campaña comparten el contenido, así que
+        se cuenta una vez por parte y no hace falta otra escritura por mensaje.
+        La cola en memoria se actualiza al cerrar la sesión, solo con los
+        mensajes que se escribieron.
+
+        Returns:
+            List[firestore.DocumentReference]: Las referencias de los mensajes,
+            en el mismo orden.
+        """
+        prepared = []
+        for data in messages:
+            data = dict(data)
+            conversation_ref = data.pop("conversation_ref")
+            campaign_path = data.pop("campaign_path", None)
+            prepared.append(
+                (conversation_ref, campaign_path, self._build_message_data(**data))
+            )
+        self._set_token_counts([data for _, _, data in prepared], deferred=False)
+
+        written = [
+            (self._add_to_batch(session, conversation_ref, data, campaign_path), data)
+            for conversation_ref, campaign_path, data in prepared
+        ]
+        session.after_close(
+            lambda failed: self._after_write(
+                [(ref, data) for ref, data in written if ref.path not in failed]
+            )
+        )
+        return [ref for ref, _ in written]
+
+    def _add_to_batch(
+        self,
+        batch,
+        conversation_ref,
+        data: Dict[str, Any],
+        campaign_path: Optional[str] = None,
+    ) -> firestore.DocumentReference:
+        """
+        Agrega el mensaje y su entrada en el índice de wa_id al lote (un
+        WriteBatch o un BulkWriteSession).
+
+        El índice (colección message_index) guarda la ruta del documento para
+        que los webhooks de estado lo actualicen sin consultar collection_group,
+        y la de su campaña, si tiene, para contar entregados y leídos.
+
+        Returns:
+            firestore.DocumentReference: La referencia del mensaje.
+        """
+        message_ref = conversation_ref.collection("messages").document()
+        batch.set(message_ref, data)
+        if data.get("wa_id"):
+            index_entry = {"path": message_ref.path, "ws_id": data["ws_id"]}
+            if campaign_path:
+                index_entry["campaign_path"] = campaign_path
+            batch.set(self._index_ref(data["wa_id"]), index_entry)
+        return message_ref
+
+    @staticmethod
+    def _set_token_counts(
+        messages: List[Dict[str, Any]], deferred: bool = TOKEN_COUNT_DEFERRED
+    ) -> None:
+        """
+        Cuenta los tokens en el momento, salvo que el conteo sea diferido.
+        Cada contenido distinto se cuenta una sola vez.
+        """
+        if deferred:
+            return
+
+        contents = list(dict.fromkeys(data["content"] for data in messages))
+        counts = dict(zip(contents, count_tokens_batch(contents)))
+        for data in messages:
+            data["tokens"] = counts[data["content"]]
+
+    def _after_write(self, written: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        for message_ref, data in written:
+            chat_message = self._append_to_tail(message_ref, data)
+            if "tokens" in data:
+                continue
+
+            # El conteo diferido se escribe después en el mensaje y en la cola
+            token_accountant.submit(
+                message_ref,
+                data["content"],
+                on_counted=(
+                    (lambda count, m=chat_message: setattr(m, "tokens", count))
+                    if chat_message
+                    else None
+                ),
+            )
+
+    @staticmethod
+    def _append_to_tail(message_ref, data: Dict[str, Any]) -> Optional[ChatMessage]:
+        """Agrega el mensaje a la cola en memoria de su conversación, si está cargada."""
+        tail = conversation_tails.get((data["ws_id"], data["phone_number"]))
+        if tail is None:
+            return None
+
+        chat_message = ChatMessage(**data)
+        tail.append(message_ref.id, chat_message)
+        return chat_message
+
+    @staticmethod
+    def _index_ref(wa_id: str) -> firestore.DocumentReference:
+        # Los wa_id están en base64 y pueden tener "/", que no es válido en un id
+        return db.collection("message_index").document(wa_id.replace("/", "_"))
+
+    def _build_message_data(
+        self, contact_ref, ws_id, wa_id, phone_number, message, role, **kwargs
+    ) -> Dict[str, Any]:
+        # Validar el número de teléfono
+        self.validate_phone_number(phone_number)
+
+        return {
+            "contact_ref": contact_ref,
+            "content": message,
+            "role": role,
+            "ws_id": ws_id,
+            "wa_id": wa_id,
+            "phone_number": phone_number,
+            "platform": "whatsapp",
+            "timestamp": firestore.SERVER_TIMESTAMP,
+            **kwargs,
+        }
+
     def get_message(self, msj_id) -> Optional[firestore.DocumentReference]:
         try:
+            index_snapshot = self._index_ref(msj_id).get()
+            if index_snapshot.exists:
+                return db.document(index_snapshot.get("path"))
+
+            # Mensajes guardados antes de existir el índice
             messages_snapshots = (
                 db.collection_group("messages").where("wa_id", "==", msj_id).get()
             )
@@ -77,12 +317,216 @@ class MessageFirebaseRepository(MessageRepository):
             print(f"Error al obtener mensaje con el id {msj_id}: {str(e)}")
             raise
 
+    def update_statuses(self, statuses: Dict[str, str]) -> int:
+        """
+        Actualiza el estado de varios mensajes.
+
+        Las entradas del índice de wa_id se leen y se actualizan en una
+        transacción por grupo, junto con los mensajes y los contadores de sus
+        campañas, así que un estado nunca retrocede (por ejemplo de "seen" a
+        "delivered") ni se cuenta dos veces aunque los webhooks lleguen
+        desordenados o a la vez a varias instancias. Los mensajes que no están
+        en el índice se buscan con consultas `in` sobre collection_group, con
+        la misma regla de estados, y se agregan al índice.
+
+        Returns:
+            int: La cantidad de mensajes actualizados.
+        """
+        try:
+            updated = 0
+            operations = 0
+            missing = []
+            batch = db.batch()
+
+            for wa_ids in chunked(list(statuses), STATUS_TRANSACTION_SIZE):
+                chunk_updated, chunk_missing = self._update_indexed_statuses(
+                    db.transaction(), {wa_id: statuses[wa_id] for wa_id in wa_ids}
+                )
+                updated += chunk_updated
+                missing.extend(chunk_missing)
+
+            for wa_ids in chunked(missing, FIRESTORE_IN_QUERY_LIMIT):
+                messages_snapshots = (
+                    db.collection_group("messages").where("wa_id", "in", wa_ids).get()
+                )
+                for snapshot in messages_snapshots:
+                    data = snapshot.to_dict()
+                    status = statuses[data["wa_id"]]
+                    if not _status_advances(data.get("status"), status):
+                        continue
+
+                    batch.update(snapshot.reference, {"status": status})
+                    # Con la entrada en el índice el siguiente estado ya no
+                    # necesita consultar collection_group
+                    batch.set(
+                        self._index_ref(data["wa_id"]),
+                        {
+                            "path": snapshot.reference.path,
+                            "ws_id": data.get("ws_id"),
+                            "status": status,
+                        },
+                        merge=True,
+                    )
+                    updated += 1
+                    operations += 2
+                    if operations >= FIRESTORE_BATCH_LIMIT - 1:
+                        batch.commit()
+                        batch = db.batch()
+                        operations = 0
+            batch.commit()
+
+            logging.info(
+                f"{updated} de {len(statuses)} estados de mensajes actualizados"
+            )
+            return updated
+        except Exception as e:
+            print(f"Error al actualizar el estado de los mensajes: {str(e)}")
+            raise
+
+    def _update_indexed_statuses(
+        self, transaction, statuses: Dict[str, str]
+    ) -> Tuple[int, List[str]]:
+        """
+        Actualiza en una transacción los mensajes que están en el índice.
+
+        Returns:
+            Tuple[int, List[str]]: Los mensajes actualizados y los wa_id que
+            no están en el índice.
+        """
+
+        @firestore.transactional
+        def update(transaction):
+            index_snapshots = {
+                snapshot.id: snapshot
+                for snapshot in db.get_all(
+                    [self._index_ref(wa_id) for wa_id in statuses],
+                    transaction=transaction,
+                )
+            }
+
+            updated = 0
+            missing = []
+            campaign_increments = {}
+            for wa_id, status in statuses.items():
+                snapshot = index_snapshots.get(self._index_ref(wa_id).id)
+                if not snapshot or not snapshot.exists:
+                    missing.append(wa_id)
+                    continue
+
+                index_entry = snapshot.to_dict()
+                current = index_entry.get("status")
+                if not _status_advances(current, status):
+                    continue
+                if index_entry.get("campaign_path"):
+                    increments = campaign_increments.setdefault(
+                        index_entry["campaign_path"], {}
+                    )
+                    for field in _campaign_counter_fields(current, status):
+                        increments[field] = increments.get(field, 0) + 1
+
+                transaction.update(db.document(index_entry["path"]), {"status": status})
+                transaction.update(snapshot.reference, {"status": status})
+                updated += 1
+
+            for campaign_path, increments in campaign_increments.items():
+                counters.add_to_batch(transaction, db.document(campaign_path), increments)
+            return updated, missing
+
+        return update(transaction)
+
     def update_message(self, user_id, phone_number, message, role, **kwargs):
         pass
 
     def delete_message(self, user_id, phone_number, message, role, **kwargs):
         pass
 
+    def get_recent_messages(
+        self,
+        ws_id,
+        phone_number,
+        limit: int = HISTORY_WINDOW_SIZE,
+        max_tokens: Optional[int] = None,
+    ) -> List[ChatMessage]:
+        """
+        Obtiene los últimos mensajes de la conversación, del más antiguo al más nuevo.
+
+        Los últimos HISTORY_TAIL_SIZE mensajes se leen de Firestore la primera
+        vez y después se sirven de una cola en memoria que create_message
+        mantiene al día. Antes de usarla se consultan los mensajes posteriores
+        a su última lectura: si alguno lo escribió otra instancia (la tarea de
+        /send-message, una campaña), la cola se vuelve a leer completa.
+
+        Args:
+            limit (int): Cantidad máxima de mensajes.
+            max_tokens (int, optional): Si se indica, se devuelven solo los
+                mensajes más recientes cuya suma de tokens guardados cabe.
+        """
+        try:
+            key = (ws_id, phone_number)
+            tail = conversation_tails.get(key)
+            if tail is not None and not self._catch_up(tail, ws_id, phone_number):
+                tail = None
+
+            if tail is None:
+                size = max(limit, HISTORY_TAIL_SIZE)
+                snapshots = (
+                    self._conversation_query(ws_id, phone_number).limit(size).get()
+                )
+                tail = ConversationTail(reversed(snapshots), maxlen=size)
+                conversation_tails.set(key, tail)
+
+            messages = list(tail.messages)[-limit:]
+            if max_tokens is None:
+                return messages
+
+            window = []
+            used_tokens = 0
+            for message in reversed(messages):
+                used_tokens += message.tokens or 0
+                if window and used_tokens > max_tokens:
+                    break
+                window.append(message)
+            return window[::-1]
+
+        except Exception as e:
+            print(
+                f"Error al obtener conversación para usuario {phone_number}: {str(e)}"
+            )
+            raise
+
+    def _catch_up(self, tail: ConversationTail, ws_id, phone_number) -> bool:
+        """
+        Lee los mensajes posteriores a la última lectura de la cola.
+
+        Returns:
+            bool: False si otra instancia escribió mensajes que la cola no
+            tiene y hay que volver a leerla.
+        """
+        if tail.synced_at is None:
+            return False
+
+        snapshots = (
+            self._conversation_query(ws_id, phone_number)
+            .where("timestamp", ">", tail.synced_at)
+            .get()
+        )
+        up_to_date = True
+        for snapshot in snapshots:
+            tail.advance(snapshot.to_dict().get("timestamp"))
+            if snapshot.id not in tail.ids:
+                up_to_date = False
+        return up_to_date
+
+    @staticmethod
+    def _conversation_query(ws_id, phone_number):
+        """Mensajes de la conversación, del más nuevo al más antiguo."""
+        return (
+            db.collection_group("messages")
+            .where("phone_number", "==", phone_number)
+            .where("ws_id", "==", ws_id)
+            .order_by("timestamp", direction=firestore.Query.DESCENDING)
+        )
+
     def get_messages(self, ws_id, phone_number) -> List:
         """Obtiene la conversación de un usuario con un contacto específico."""
         try:
@@ -132,3 +576,24 @@ class MessageFirebaseRepository(MessageRepository):
             wa_id="",
             tool_calls=tool_call_responses,
         )
+
+        return tool_call_responses
+
+
+def _status_advances(current: Optional[str], status: str) -> bool:
+    return MESSAGE_STATUS_RANK.get(status, 0) > MESSAGE_STATUS_RANK.get(current, 0)
+
+
+def _campaign_counter_fields(previous: Optional[str], status: str) -> List[str]:
+    """Contadores de campaña que suman cuando un mensaje pasa de `previous` a `status`."""
+    if status == "failed":
+        # "failed" tiene el rango más alto pero no implica entrega
+        return [CAMPAIGN_STATUS_COUNTERS["failed"]]
+
+    previous_rank = MESSAGE_STATUS_RANK.get(previous, 0)
+    return [
+        field
+        for counted_status, field in CAMPAIGN_STATUS_COUNTERS.items()
+        if counted_status != "failed"
+        and previous_rank < MESSAGE_STATUS_RANK[counted_status] <= MESSAGE_STATUS_RANK[status]
+    ]
@@ -0,0 +1,42 @@
+import datetime
+
+from google.api_core.exceptions import AlreadyExists, Conflict, NotFound
+
+from src.common.utils.message_dedupe import ProcessedMessageStore
+from src.data.sources.firebase.config import db
+from firebase_admin.firestore import firestore
+
+
+class ProcessedMessageFirebaseStore(ProcessedMessageStore):
+    """
+    Registra los ids de mensajes procesados en la colección processed_messages.
+
+    `create` falla si el documento ya existe, así que el registro es atómico
+    entre instancias. El campo expires_at permite configurar una política de
+    TTL en Firestore para limpiar la colección.
+    """
+
+    def __init__(self, ttl_seconds: float, collection: str = "processed_messages"):
+        self.ttl_seconds = ttl_seconds
+        self.collection = collection
+
+    def claim(self, message_id: str) -> bool:
+        expires_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+            seconds=self.ttl_seconds
+        )
+        try:
+            db.collection(self.collection).document(message_id).create(
+                {
+                    "created_at": firestore.SERVER_TIMESTAMP,
+                    "expires_at": expires_at,
+                }
+            )
+            return True
+        except (AlreadyExists, Conflict):
+            return False
+
+    def release(self, message_id: str) -> None:
+        try:
+            db.collection(self.collection).document(message_id).delete()
+        except NotFound:
+            pass
@@ -0,0 +1,121 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from src.common.config import TEMPLATE_CACHE_MAX_SIZE, TEMPLATE_CACHE_TTL_SECONDS
+from src.common.utils.cache import TTLCache
+from src.common.whatsapp.models.models import PreparedTemplate
+from src.data.sources.firebase.tenant_metadata import tenant_metadata
+
+# Contenido de las plantillas que aún no están en el catálogo de Firestore
+DEFAULT_TEMPLATE_CONTENTS = {
+    "gano_excel_1": """🌟 ¡Gran Lanzamiento de la Línea Fit JM! 🌟
+¡Hola! 😊 Hoy queremos compartir contigo una excelente noticia: estrenamos una nueva línea diseñada especialmente para facilitar tu proceso de compra y ofrecerte los mejores productos saludables.
+
+🎉 Además, ¡tenemos promociones exclusivas por lanzamiento!
+Escríbele a Jorge, nuestro asesor, y descubre cómo puedes aprovechar estas ofertas hoy mismo.
+
+📲 ¡Estamos aquí para ayudarte a dar el siguiente paso hacia un estilo de vida más saludable!""",
+    "gano_excel_2": """¡Este año sí vas a cumplir las promesas de año nuevo! ¿Cierto? 🧐
+
+Si pediste por salud y vida, aquí llegó la señal divina 🙏 Que no te falte el café en cada mañana para iniciar con energía, fusionado con Ganoderma para una vida larga y prospera. ☕ Si diciembre te dejó apretado, relájate. 😌 Porque si llevas 2 o más cajas de nuestro café 3 en 1 o clásico, vas a tener tremendo descuento en tú compra. 😱 ¡Estamos botados! 
+La promo es hasta el 15 de enero. 🛒""",
+    "ano_nuevo": """☕✨ ¡Feliz Año Nuevo! ✨☕
+
+        Si llevas 2 o más cajas de nuestro café 3 en 1 o clásico, te damos un precio especial. 
+        La promo es hasta el 15 de enero. 🏃‍♀""",
+    "hola": """Hola""",
+}
+
+
+class TemplateEntry:
+    """Plantilla del catálogo de un negocio (business/{id}/templates/{name})."""
+
+    def __init__(self, name: str, data: Dict[str, Any]):
+        self.name = name
+        self.content = data.get("content")
+        self.language_code = data.get("language_code") or "es"
+        self.components: Optional[List[Dict[str, Any]]] = data.get("components")
+        self.body_parameters = bool(data.get("body_parameters"))
+        self._prepared: Dict[str, PreparedTemplate] = {}
+
+    def prepare(self, code: Optional[str] = None) -> PreparedTemplate:
+        code = code or self.language_code
+        prepared = self._prepared.get(code)
+        if not prepared:
+            prepared = PreparedTemplate(
+                self.name,
+                code,
+                components=self.components,
+                body_parameters=self.body_parameters,
+                content=self.content,
+            )
+            self._prepared[code] = prepared
+        return prepared
+
+
+class TemplateCatalog:
+    """
+    Catálogo de plantillas de WhatsApp de cada negocio, cargado una vez y
+    guardado con TTL.
+
+    Cada plantilla se serializa una sola vez por idioma (ver
+    PreparedTemplate) y su contenido para guardar en la conversación se lee
+    de un diccionario. Las plantillas que no están en Firestore usan el
+    contenido de DEFAULT_TEMPLATE_CONTENTS.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._cache = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self._defaults = {
+            name: TemplateEntry(name, {"content": content})
+            for name, content in DEFAULT_TEMPLATE_CONTENTS.items()
+        }
+
+    def get_templates(self, ws_id: Optional[str]) -> Dict[str, TemplateEntry]:
+        if not ws_id:
+            return self._defaults
+
+        templates = self._cache.get(ws_id)
+        if templates is not None:
+            return templates
+
+        templates = dict(self._defaults)
+        metadata = tenant_metadata.get(ws_id)
+        if metadata:
+            for snapshot in metadata.business_ref.collection("templates").get():
+                data = snapshot.to_dict()
+                name = data.get("name") or snapshot.id
+                templates[name] = TemplateEntry(name, data)
+
+        self._cache.set(ws_id, templates)
+        return templates
+
+    def get(self, ws_id: Optional[str], name: str) -> TemplateEntry:
+        entry = self.get_templates(ws_id).get(name)
+        if not entry:
+            logging.warning(f"La plantilla {name} no está en el catálogo de {ws_id}")
+            entry = TemplateEntry(name, {})
+        return entry
+
+    def get_content(self, ws_id: Optional[str], name: str) -> str:
+        """Contenido para guardar en la conversación; nunca falla."""
+        return self.get(ws_id, name).content or f"Plantilla {name}"
+
+    def prepare(
+        self, ws_id: Optional[str], name: str, code: Optional[str] = None
+    ) -> PreparedTemplate:
+        return self.get(ws_id, name).prepare(code)
+
+    def invalidate(self, ws_id: Optional[str] = None) -> None:
+        if ws_id:
+            self._cache.pop(ws_id)
+        else:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+template_catalog = TemplateCatalog(
+    max_size=TEMPLATE_CACHE_MAX_SIZE, ttl_seconds=TEMPLATE_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,75 @@
+import logging
+from typing import Any, Dict, Optional
+
+from src.common.config import TENANT_CACHE_MAX_SIZE, TENANT_CACHE_TTL_SECONDS
+from src.common.utils.cache import TTLCache
+from src.data.sources.firebase.config import db
+
+
+class TenantMetadata:
+    """Datos del negocio (business) dueño de un número de WhatsApp."""
+
+    def __init__(self, ws_id: str, business_ref, data: Dict[str, Any]):
+        self.ws_id = ws_id
+        self.business_ref = business_ref
+        self.data = data
+
+    @property
+    def ws_token(self) -> Optional[str]:
+        return self.data.get("ws_token")
+
+    @property
+    def campaigns_ref(self):
+        return self.business_ref.collection("campaigns")
+
+
+class TenantMetadataService:
+    """
+    Carga el documento business de cada ws_id una sola vez y lo guarda con TTL.
+
+    Cuando se rota el token de un negocio se debe llamar a `invalidate` para
+    que la siguiente consulta lea el documento actualizado.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._cache = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+
+    def get(self, ws_id: str) -> Optional[TenantMetadata]:
+        metadata = self._cache.get(ws_id)
+        if metadata:
+            return metadata
+
+        business_snapshots = (
+            db.collection("business").where("ws_id", "==", ws_id).limit(1).get()
+        )
+        if not business_snapshots:
+            return None
+
+        metadata = TenantMetadata(
+            ws_id, business_snapshots[0].reference, business_snapshots[0].to_dict()
+        )
+        self._cache.set(ws_id, metadata)
+        return metadata
+
+    def get_business_ref(self, ws_id: str):
+        """Retorna la referencia del negocio o lanza una excepción si no existe."""
+        metadata = self.get(ws_id)
+        if not metadata:
+            raise Exception(f"No se encontró ningún business con ws_id {ws_id}")
+        return metadata.business_ref
+
+    def invalidate(self, ws_id: Optional[str] = None) -> None:
+        """Descarta los datos de un negocio, o de todos si no se indica ws_id."""
+        if ws_id:
+            self._cache.pop(ws_id)
+        else:
+            self._cache.clear()
+        logging.info(f"Datos del negocio {ws_id or '(todos)'} invalidados")
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+tenant_metadata = TenantMetadataService(
+    max_size=TENANT_CACHE_MAX_SIZE, ttl_seconds=TENANT_CACHE_TTL_SECONDS
+)
@@ -1,9 +1,73 @@
 import io
 import logging
+from typing import Any, Callable, Dict, Iterator, List
 import firebase_admin
 from firebase_admin import storage
 import firebase_admin.firestore
+from src.common.config import BULK_WRITE_MAX_ATTEMPTS
 from src.data.sources.firebase.config import db
+from src.data.sources.firebase.tenant_metadata import tenant_metadata
+
+
+# Límites de Firestore: operaciones por escritura en lote y valores por consulta `in`
+FIRESTORE_BATCH_LIMIT = 500
+FIRESTORE_IN_QUERY_LIMIT = 30
+
+
+def chunked(items: List, size: int) -> Iterator[List]:
+    """Divide una lista en sublistas de tamaño size."""
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+class BulkWriteSession:
+    """
+    Escrituras agrupadas con el BulkWriter de Firestore.
+
+    El BulkWriter envía las escrituras en lotes en paralelo y cada una se
+    confirma por separado, así que un documento que falla no arrastra al
+    resto del lote. Las que fallan se reintentan hasta `max_attempts` veces y
+    después quedan en `failed` (ruta del documento -> error).
+    """
+
+    def __init__(self, max_attempts: int = BULK_WRITE_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self.failed: Dict[str, str] = {}
+        self.operations = 0
+        self._writer = db.bulk_writer()
+        self._writer.on_write_error(self._on_write_error)
+        self._on_close: List[Callable[[Dict[str, str]], None]] = []
+
+    def set(self, reference, data: Dict[str, Any]) -> None:
+        self.operations += 1
+        self._writer.set(reference, data)
+
+    def update(self, reference, data: Dict[str, Any]) -> None:
+        self.operations += 1
+        self._writer.update(reference, data)
+
+    def after_close(self, callback: Callable[[Dict[str, str]], None]) -> None:
+        """Registra una función que recibe las escrituras fallidas al cerrar."""
+        self._on_close.append(callback)
+
+    def close(self) -> Dict[str, str]:
+        """Espera todas las escrituras. Retorna las que fallaron."""
+        self._writer.close()
+        for callback in self._on_close:
+            callback(self.failed)
+
+        if self.failed:
+            logging.error(
+                f"{len(self.failed)} de {self.operations} escrituras en lote fallaron"
+            )
+        return self.failed
+
+    def _on_write_error(self, failure, _writer) -> bool:
+        if failure.attempts < self.max_attempts:
+            return True
+
+        self.failed[failure.operation.reference.path] = failure.message
+        return False
 
 
 def upload_media_to_storage(image, path):
@@ -79,16 +143,13 @@ def get_contact_ref(ws_id, phone_number: str):
 
 def get_whatsapp_token(ws_id: str) -> str:
     try:
-        business_snapshots = (
-            db.collection("business").where("ws_id", "==", ws_id).limit(1).get()
-        )
-        if not business_snapshots:
+        metadata = tenant_metadata.get(ws_id)
+        if not metadata:
             print(
                 f"No se encontró ningún negocio al obtener token de WhatsApp para {ws_id}"
             )
             return
-        token = business_snapshots[0].get("ws_token")
-        return token
+        return metadata.ws_token
 
     except Exception as e:
         logging.exception("Error al obtener token de WhatsApp: %s", str(e))
@@ -97,36 +158,36 @@ def get_whatsapp_token(ws_id: str) -> str:
 
 # COSOS QUE TOCA CAMBIAR DE LADO
 def get_or_create_contact(
-    phone_number: str, from_whatsapp_id: str
+    phone_number: str, from_whatsapp_id: str, contacts_snapshots=None
 ) -> firebase_admin.firestore.firestore.DocumentReference:
     """
     Obtiene o crea un contacto en la base de datos.
 
     Args:
         phone_number (str): El número de teléfono del contacto.
+        contacts_snapshots (list, optional): El resultado de una búsqueda del
+            contacto ya hecha; si se pasa no se vuelve a consultar.
 
     Returns:
         firebase_admin.firestore.DocumentReference: La referencia del contacto.
     """
-    contacts_query = (
-        db.collection_group("contacts")
-        .where("phone_number", "==", phone_number)
-        .where("ws_id", "==", from_whatsapp_id)
-    )
-    contacts_snapshots = contacts_query.get()
+    if contacts_snapshots is None:
+        contacts_query = (
+            db.collection_group("contacts")
+            .where("phone_number", "==", phone_number)
+            .where("ws_id", "==", from_whatsapp_id)
+        )
+        contacts_snapshots = contacts_query.get()
 
     if not contacts_snapshots:
-        business_query = db.collection("business").where(
-            "ws_id", "==", from_whatsapp_id
-        )
-        business_snapshots = business_query.get()
+        metadata = tenant_metadata.get(from_whatsapp_id)
 
-        if not business_snapshots:
+        if not metadata:
             raise Exception(
                 f"No hay ningún negocio en Venya vinculado a este número {from_whatsapp_id}"
             )
 
-        business_ref = business_snapshots[0].reference
+        business_ref = metadata.business_ref
         contact_ref = business_ref.collection("contacts").document()
 
         contact_ref.set({"phone_number": phone_number, "ws_id": from_whatsapp_id})
@@ -158,15 +219,7 @@ def get_or_create_conversation(
 
     if not conversations_snapshots:
         conversation_ref = db.collection("conversations").document()
-        conversation_ref.set(
-            {
-                "contact_ref": contact_ref,
-                "start_time": firebase_admin.firestore.firestore.SERVER_TIMESTAMP,
-                "platform": "whatsapp",
-                "status": "ongoing",
-                "intention": "comertial",  # TODO: Replace with gpt interpretation
-            }
-        )
+        conversation_ref.set(new_conversation_data(contact_ref))
 
     else:
         conversation_ref = conversations_snapshots[0].reference
@@ -174,6 +227,19 @@ def get_or_create_conversation(
     return conversation_ref
 
 
+def new_conversation_data(
+    contact_ref: firebase_admin.firestore.firestore.DocumentReference,
+) -> Dict[str, Any]:
+    """Datos de una conversación nueva en curso con el contacto."""
+    return {
+        "contact_ref": contact_ref,
+        "start_time": firebase_admin.firestore.firestore.SERVER_TIMESTAMP,
+        "platform": "whatsapp",
+        "status": "ongoing",
+        "intention": "comertial",  # TODO: Replace with gpt interpretation
+    }
+
+
 import json
 from google.cloud import tasks_v2
 from google.protobuf import timestamp_pb2
@@ -181,7 +247,7 @@ import datetime
 from google.oauth2 import service_account
 
 
-def create_task(url, payload=None):
+def create_task(url, payload=None, delay_seconds=3600, queue="continueConversation"):
     # Ruta a tu archivo JSON de credenciales
     credentials_path = "./key.json"
 
@@ -194,7 +260,7 @@ def create_task(url, payload=None):
     client = tasks_v2.CloudTasksClient(credentials=credentials)
 
     parent = client.queue_path(
-        "innate-tempo-448214-e5", "northamerica-northeast1", "continueConversation"
+        "innate-tempo-448214-e5", "northamerica-northeast1", queue
     )
 
     # Configurar la solicitud HTTP
@@ -209,7 +275,9 @@ def create_task(url, payload=None):
     if payload:
         task["http_request"]["body"] = payload.encode("utf-8")
 
-    d = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    d = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        seconds=delay_seconds
+    )
     timestamp = timestamp_pb2.Timestamp()
     timestamp.FromDatetime(d)
     task["schedule_time"] = timestamp
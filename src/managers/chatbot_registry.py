@@ -0,0 +1,209 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from src.common.config import (
+    CHATBOT_REGISTRY_BACKGROUND_RELOAD,
+    CHATBOT_REGISTRY_MEMORY_BUDGET_MB,
+    CHATBOT_REGISTRY_RELOAD_CHECK_SECONDS,
+    EMBEDDING_BACKEND,
+)
+from src.common.utils.embeddings import index_path_for_backend
+from src.common.utils.index_generations import resolve_index_path
+from src.data.models.chatbot import ChatbotModel
+from src.services.chat_service import ChatbotService
+
+
+def _index_signature(vectorstore_path: str) -> Tuple:
+    """
+    Firma del índice vigente en disco: ruta, mtime y tamaño de cada archivo.
+
+    Se toma del directorio al que apunta CURRENT, así que publicar una
+    generación nueva cambia la firma.
+    """
+    try:
+        return tuple(
+            sorted(
+                (entry.path, entry.stat().st_mtime_ns, entry.stat().st_size)
+                for entry in os.scandir(resolve_index_path(vectorstore_path))
+                if entry.is_file()
+            )
+        )
+    except FileNotFoundError:
+        return ()
+
+
+def _index_size(signature: Tuple) -> int:
+    """Tamaño aproximado en bytes que ocupa el índice una vez cargado."""
+    return sum(size for _, _, size in signature)
+
+
+class _RegistryEntry:
+    def __init__(self, chat_service: ChatbotService, vectorstore_path: str, signature):
+        self.chat_service = chat_service
+        self.vectorstore_path = vectorstore_path
+        self.signature = signature
+        self.size = _index_size(signature)
+        self.last_used = time.monotonic()
+        self.last_checked = time.monotonic()
+
+
+class ChatbotRegistry:
+    """
+    Mantiene un ChatbotService por phone_number_id durante la vida del proceso.
+
+    Cada chatbot (y su índice FAISS) se construye una sola vez y se comparte
+    entre hilos. Si el índice cambia en disco se recarga (ver
+    CHATBOT_REGISTRY_BACKGROUND_RELOAD) y mientras tanto las demás solicitudes
+    siguen respondiendo con el anterior, y cuando el total de
+    índices cargados supera el presupuesto de memoria se descargan los
+    chatbots que llevan más tiempo sin usarse.
+    """
+
+    def __init__(
+        self,
+        configs: Dict[str, dict],
+        memory_budget_bytes: int = CHATBOT_REGISTRY_MEMORY_BUDGET_MB * 1024 * 1024,
+        reload_check_seconds: float = CHATBOT_REGISTRY_RELOAD_CHECK_SECONDS,
+        background_reload: bool = CHATBOT_REGISTRY_BACKGROUND_RELOAD,
+    ):
+        self.configs = configs
+        self.memory_budget_bytes = memory_budget_bytes
+        self.reload_check_seconds = reload_check_seconds
+        self.background_reload = background_reload
+        self._entries: "OrderedDict[str, _RegistryEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, phone_number_id: str) -> ChatbotService:
+        """Retorna el ChatbotService del número, construyéndolo si hace falta."""
+        if phone_number_id not in self.configs:
+            raise ValueError("ID de WhatsApp no reconocido")
+
+        entry = self._get_fresh_entry(phone_number_id)
+        if entry:
+            return entry.chat_service
+
+        with self._build_lock(phone_number_id):
+            entry = self._get_fresh_entry(phone_number_id)
+            if entry:
+                return entry.chat_service
+
+            entry = self._build_entry(phone_number_id)
+            with self._lock:
+                self._entries[phone_number_id] = entry
+                self._entries.move_to_end(phone_number_id)
+                self._evict_over_budget(keep=phone_number_id)
+
+            return entry.chat_service
+
+    def invalidate(self, phone_number_id: str) -> None:
+        """Descarta el chatbot del número; se reconstruye en el siguiente uso."""
+        with self._lock:
+            self._entries.pop(phone_number_id, None)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "loaded": list(self._entries.keys()),
+                "loaded_bytes": sum(e.size for e in self._entries.values()),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "retrieval": {
+                    phone_number_id: entry.chat_service.chatbot_model.vectorstore.stats()
+                    for phone_number_id, entry in self._entries.items()
+                },
+            }
+
+    def _get_fresh_entry(self, phone_number_id: str) -> Optional[_RegistryEntry]:
+        with self._lock:
+            entry = self._entries.get(phone_number_id)
+            if not entry:
+                return None
+
+            now = time.monotonic()
+            entry.last_used = now
+            self._entries.move_to_end(phone_number_id)
+
+            if now - entry.last_checked < self.reload_check_seconds:
+                return entry
+            entry.last_checked = now
+
+        signature = _index_signature(entry.vectorstore_path)
+        if signature != entry.signature:
+            self._reload(phone_number_id, entry, signature)
+        return entry
+
+    def _reload(self, phone_number_id: str, entry: _RegistryEntry, signature) -> None:
+        """
+        Recarga el índice del chatbot, en esta solicitud o en un hilo aparte
+        (`background_reload`).
+
+        VectorStoreManager.reload reemplaza el índice solo cuando el nuevo ya
+        está cargado, así que las demás consultas no esperan la carga. Si ya
+        hay una carga en curso para el número no se inicia otra; si la recarga
+        falla se sigue usando el índice anterior y se reintenta en la
+        siguiente revisión.
+        """
+        build_lock = self._build_lock(phone_number_id)
+        if not build_lock.acquire(blocking=False):
+            return
+
+        def reload():
+            try:
+                entry.chat_service.chatbot_model.vectorstore.reload()
+                with self._lock:
+                    entry.signature = signature
+                    entry.size = _index_size(signature)
+                    self._evict_over_budget(keep=phone_number_id)
+                logging.info(f"Índice de {phone_number_id} recargado")
+            except Exception as e:
+                logging.error(
+                    f"No se pudo recargar el índice de {phone_number_id}, "
+                    f"se sigue usando el anterior: {e}"
+                )
+            finally:
+                build_lock.release()
+
+        logging.info(f"El índice de {phone_number_id} cambió en disco, se recargará")
+        if self.background_reload:
+            threading.Thread(
+                target=reload, name=f"reload-{phone_number_id}", daemon=True
+            ).start()
+        else:
+            reload()
+
+    def _build_lock(self, phone_number_id: str) -> threading.Lock:
+        """
+        Un lock por número evita que dos hilos carguen el mismo índice a la
+        vez sin bloquear a los demás números.
+        """
+        with self._lock:
+            return self._build_locks.setdefault(phone_number_id, threading.Lock())
+
+    def _build_entry(self, phone_number_id: str) -> _RegistryEntry:
+        config = self.configs[phone_number_id]
+        vectorstore_path = index_path_for_backend(
+            config["vectorstore_path"], config.get("embedding_backend", EMBEDDING_BACKEND)
+        )
+
+        # La firma se toma antes de cargar para que un cambio durante la carga
+        # provoque otra recarga en la siguiente revisión.
+        signature = _index_signature(vectorstore_path)
+        chatbot_model = ChatbotModel(**config)
+        logging.info(f"Chatbot de {phone_number_id} cargado en el registro")
+
+        return _RegistryEntry(ChatbotService(chatbot_model), vectorstore_path, signature)
+
+    def _evict_over_budget(self, keep: str) -> None:
+        """Descarga los chatbots menos usados hasta respetar el presupuesto."""
+        total = sum(e.size for e in self._entries.values())
+        for phone_number_id in list(self._entries.keys()):
+            if total <= self.memory_budget_bytes:
+                break
+            if phone_number_id == keep:
+                continue
+            total -= self._entries.pop(phone_number_id).size
+            logging.info(f"Chatbot de {phone_number_id} descargado por presupuesto de memoria")
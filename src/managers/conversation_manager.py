@@ -1,6 +1,6 @@
 import json
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 import firebase_admin
 import firebase_admin.firestore
 from google.api_core.exceptions import NotFound
@@ -12,12 +12,8 @@ from src.common.utils.whatsapp_utils import get_whatsapp_message, send_whatsapp_
 from src.common.whatsapp.models.models import MarkReadMessage, TextMessage
 
 from src.data.sources.firebase.message_impl import MessageFirebaseRepository
-from src.data.sources.firebase.utils import (
-    create_task,
-    delete_task,
-    get_or_create_contact,
-    get_or_create_conversation,
-)
+from src.data.sources.firebase.contact_resolver import contact_resolver
+from src.data.sources.firebase.utils import create_task, delete_task
 from src.services.chat_service import ChatbotService
 
 
@@ -35,25 +31,38 @@ class ConversationManager:
         Args:
             message (Dict[str, Any]): El mensaje entrante con toda su información
         """
+        self.manage_incoming_messages([message])
+
+    def manage_incoming_messages(self, messages: List[Dict[str, Any]]):
+        """
+        Procesa los mensajes que un mismo contacto envió en un webhook.
+
+        El contacto y la conversación se resuelven una vez, los mensajes se
+        guardan en una sola escritura en lote y se genera una sola respuesta.
+
+        Args:
+            messages (List[Dict[str, Any]]): Los mensajes del contacto, en orden
+        """
         try:
-            print(f"Mensaje recibido {message}")
+            print(f"Mensajes recibidos {messages}")
+            phone_number = messages[-1]["from"]
 
-            self.contact_ref = get_or_create_contact(
-                message["from"], self.from_whatsapp_id
-            )
-            self.conversation_ref = get_or_create_conversation(self.contact_ref)
+            resolution = contact_resolver.resolve(self.from_whatsapp_id, phone_number)
+            self.contact_ref = resolution.contact_ref
+            self.conversation_ref = resolution.conversation_ref
 
-            self.message_repository.create_contact_message(
+            self.message_repository.create_contact_messages(
                 conversation_ref=self.conversation_ref,
                 contact_ref=self.contact_ref,
-                phone_number=message["from"],
-                message=get_whatsapp_message(message),
+                phone_number=phone_number,
                 ws_id=self.from_whatsapp_id,
-                wa_id=message["id"],
+                messages=[
+                    {"message": get_whatsapp_message(message), "wa_id": message["id"]}
+                    for message in messages
+                ],
             )
 
-            contact_snapshot = self.contact_ref.get()
-            current_task = contact_snapshot.to_dict().get("task", None)
+            current_task = resolution.contact_data.get("task", None)
 
             if current_task:
                 try:
@@ -66,7 +75,7 @@ class ConversationManager:
                 "https://us-central1-innate-tempo-448214-e5.cloudfunctions.net/main/send-message",
                 json.dumps(
                     {
-                        "to_number": message["from"],
+                        "to_number": phone_number,
                         "from_id": self.from_whatsapp_id,
                         "token": self.token,
                         # TODO: Replace with agent inteligent response
@@ -75,16 +84,26 @@ class ConversationManager:
                 ),
             )
 
-            self.contact_ref.update({"task": answer_later_task})
+            contact_resolver.update_contact(
+                self.from_whatsapp_id, phone_number, {"task": answer_later_task}
+            )
 
-            self.mark_read_message(message.get("id", None))
-            self.handle_message_type(message)
+            # Marcar el último mensaje como leído marca también los anteriores
+            self.mark_read_message(messages[-1].get("id", None))
+            for message in messages:
+                self.handle_message_type(message)
 
+            # Un solo pase por turno: las herramientas se ejecutan dentro del
+            # mismo pase y la respuesta final es la que se envía.
             response = self.chatbot.answer_conversation(
-                self.from_whatsapp_id, message["from"]
+                self.from_whatsapp_id,
+                phone_number,
+                tool_handler=lambda response: self.handle_tool_calls(
+                    response, phone_number
+                ),
             )
 
-            text_message = TextMessage(message["from"], response.content)
+            text_message = TextMessage(phone_number, response.content)
             api_response = send_whatsapp_message(
                 self.from_whatsapp_id, self.token, text_message
             )
@@ -92,19 +111,21 @@ class ConversationManager:
             self.message_repository.create_chat_message(
                 conversation_ref=self.conversation_ref,
                 contact_ref=self.contact_ref,
-                phone_number=message["from"],
+                phone_number=phone_number,
                 message=response.content,
                 ws_id=self.from_whatsapp_id,
                 wa_id=api_response["body"]["messages"][0]["id"],
             )
 
-            self.contact_ref.update(
+            contact_resolver.update_contact(
+                self.from_whatsapp_id,
+                phone_number,
                 {
                     "last_message": {
                         "content": response.content,
                         "created_at": firebase_admin.firestore.firestore.SERVER_TIMESTAMP,
                     }
-                }
+                },
             )
 
         except Exception as e:
@@ -123,27 +144,17 @@ class ConversationManager:
             )
 
     def handle_message_type(self, message):
-        """Procesa el mensaje según su tipo y genera una respuesta"""
+        """Procesa el contenido multimedia del mensaje según su tipo"""
 
         if message["type"] == "image":
-            image_url = get_media_from_id(message["image"]["id"], self.token)
-            # TODO: Get text from message
-            question = ""  # message[]
-            response = self.chatbot.generate_answer_from_image(question, image_url)
+            # TODO: Usar la imagen en la respuesta
+            get_media_from_id(message["image"]["id"], self.token)
 
         elif message["type"] == "audio":
             media_id = message["audio"]["id"]
-            question = get_text_from_audio(media_id, self.token)
+            get_text_from_audio(media_id, self.token)
 
-        else:  # Question is just text
-            question = get_whatsapp_message(message)
-            response = self.chatbot.answer_conversation(
-                self.from_whatsapp_id, message["from"]
-            )
-
-        self.handle_tool_calls(response, message["from"])
-
-    def execute_tool(self, tool_call, options, number):
+    def execute_tool(self, tool_call, options, number) -> Dict[str, Any]:
         function_name = tool_call.function.name
         args = json.loads(tool_call.function.arguments)
         logging.info(f"Argumens: {args}")
@@ -160,13 +171,25 @@ class ConversationManager:
             contact_ref=self.contact_ref,
         )
 
-    def handle_tool_calls(self, response, number):
-        """Maneja y registra las llamadas a funciones"""
+        return {
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "content": str(response),
+        }
+
+    def handle_tool_calls(self, response, number) -> List[Dict[str, Any]]:
+        """
+        Maneja y registra las llamadas a funciones.
+
+        Returns:
+            List[Dict[str, Any]]: Los mensajes (llamadas y resultados) que se
+            agregan al prompt para que el modelo continúe el turno.
+        """
         print("----- RESPONSE ------", response)
         if isinstance(response, str) or not response.tool_calls:
-            return
+            return []
 
-        self.message_repository.store_tool_call_responses(
+        tool_call_responses = self.message_repository.store_tool_call_responses(
             from_id=self.from_whatsapp_id,
             response=response,
             number=number,
@@ -174,6 +197,19 @@ class ConversationManager:
             contact_ref=self.contact_ref,
         )
 
+        tool_messages = [
+            {
+                "role": "assistant",
+                "content": response.content,
+                "tool_calls": tool_call_responses,
+            }
+        ]
         for tool_call in response.tool_calls:
             logging.error(f"storing... {tool_call}")
-            self.execute_tool(tool_call, self.chatbot.chatbot_model.tool_calls, number)
+            tool_messages.append(
+                self.execute_tool(
+                    tool_call, self.chatbot.chatbot_model.tool_calls, number
+                )
+            )
+
+        return tool_messages
@@ -1,23 +1,469 @@
-from typing import List
+import os
+import pickle
+import re
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+import faiss
+from langchain_community.docstore.base import Docstore
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import OpenAIEmbeddings
-from openai import OpenAI
+from langchain_core.embeddings import Embeddings
+from langchain_core.documents import Document
 import logging
 
+from src.common.config import (
+    CONTEXT_TOKEN_BUDGET,
+    EMBEDDING_BACKEND,
+    RETRIEVAL_CACHE_MAX_SIZE,
+    RETRIEVAL_CACHE_TTL_SECONDS,
+    RETRIEVAL_DEDUPE_JACCARD,
+    RETRIEVAL_HYBRID_ALPHA,
+    RETRIEVAL_MMR_LAMBDA,
+    RETRIEVAL_MODE,
+    RETRIEVAL_SCORE_THRESHOLD,
+    VECTORSTORE_LOAD_MODE,
+)
+from src.common.utils.bm25 import BM25Index, jaccard, tokenize
+from src.common.utils.cache import TTLCache
+from src.common.utils.docstore_file import DOCSTORE_FILENAME, DocstoreFile
+from src.common.utils.embeddings import get_embeddings, index_path_for_backend
+from src.common.utils.index_generations import read_manifest, resolve_index_path
+from src.common.utils.token_counter import count_tokens_batch
+
+# Cantidad de secciones que se recuperan por consulta
+RETRIEVAL_K = 10
+
+# Flag para leer el índice mapeado en memoria. Solo IO_FLAG_MMAP_IFC (faiss-cpu
+# >= 1.11.0) mapea los índices planos (IndexFlatL2, los que crea
+# VectorStoreCreator); IO_FLAG_MMAP los copia igual a memoria, así que sin el
+# primero no hay modo "mmap". Si la versión instalada no lo tiene, es None.
+MMAP_IO_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+
+
+def _rss_bytes() -> int:
+    """Memoria residente del proceso, o 0 si no se puede leer."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class MappedDocstore(Docstore):
+    """Docstore de LangChain sobre un DocstoreFile; los ids son posiciones."""
+
+    def __init__(self, docstore_file: DocstoreFile):
+        self.docstore_file = docstore_file
+
+    def search(self, search: Union[int, str]) -> Union[str, Document]:
+        try:
+            record = self.docstore_file.get(int(search))
+        except (IndexError, ValueError):
+            return f"ID {search} not found."
+        return Document(
+            page_content=record["page_content"], metadata=record.get("metadata") or {}
+        )
+
+
+class _PositionIds:
+    """index_to_docstore_id de un MappedDocstore: cada posición es su propio id."""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __getitem__(self, position) -> int:
+        return int(position)
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def normalize_query(query: str) -> str:
+    """Forma canónica de una consulta para la caché: "Precio? " == "precio"."""
+    query = unicodedata.normalize("NFKC", query or "").casefold()
+    query = re.sub(r"\s+", " ", query).strip()
+    return query.strip("¿?¡!.,;: ")
+
+
+class RetrievedContext:
+    """Secciones elegidas para el prompt de un turno y cuántos tokens suman."""
+
+    def __init__(
+        self, sections: Tuple[str, ...], tokens: int, candidates: int, candidate_tokens: int
+    ):
+        self.sections = sections
+        self.tokens = tokens
+        self.candidates = candidates
+        self.candidate_tokens = candidate_tokens
+
+
+def _min_max(scores: Dict[str, float]) -> Dict[str, float]:
+    """Lleva los puntajes a [0, 1]; si son todos iguales, todos valen 1."""
+    if not scores:
+        return {}
+
+    low, high = min(scores.values()), max(scores.values())
+    if high == low:
+        return {text: 1.0 for text in scores}
+    return {text: (score - low) / (high - low) for text, score in scores.items()}
+
+
 class VectorStoreManager:
-    def __init__(self, faiss_index_path: str):
+    """
+    Índice FAISS de un chatbot con una caché de consultas.
+
+    La caché guarda, por consulta normalizada, su embedding y las secciones
+    recuperadas, con desalojo LRU y TTL. Las consultas repetidas ("precio",
+    "hola") no llaman a la API de embeddings ni buscan en el índice. La caché
+    se vacía cada vez que el índice se recarga.
+
+    Con VECTORSTORE_LOAD_MODE="mmap" el índice se mapea en memoria en solo
+    lectura y los documentos se leen de docstore.bin sin pickle, así que los
+    workers que cargan el mismo índice comparten sus páginas. El tiempo de
+    carga y la memoria que sumó al proceso quedan en `stats()["load"]`.
+
+    Las consultas se embeben con el backend del chatbot (`embedding_backend`,
+    ver src/common/utils/embeddings.py), que debe ser el mismo con que se
+    creó el índice.
+
+    `retrieve_context` arma el contexto de un turno combinando la búsqueda
+    vectorial con un índice léxico BM25 de los mismos fragmentos (ver
+    RETRIEVAL_MODE).
+    """
+
+    def __init__(
+        self,
+        faiss_index_path: str,
+        load_mode: str = VECTORSTORE_LOAD_MODE,
+        embedding_backend: str = EMBEDDING_BACKEND,
+    ):
         try:
-            # Ahora cargamos una base de datos FAISS existente en lugar de crearla
-            self.vectorstore = FAISS.load_local(faiss_index_path, OpenAIEmbeddings(), allow_dangerous_deserialization=True)
-            self.client = OpenAI()
+            self.embedding_backend = embedding_backend
+            self.embeddings = get_embeddings(embedding_backend)
+            self.faiss_index_path = index_path_for_backend(faiss_index_path, embedding_backend)
+            self.load_mode = load_mode
+            self.load_stats: Dict[str, Any] = {}
+            self.vectorstore = self._load(self.faiss_index_path)
         except Exception as e:
             logging.error(f"Error initializing VectorStoreManager: {str(e)}")
             raise
 
-    def retrieve_relevant_sections(self, query: str) -> List[str]:
+        self._embeddings_cache = TTLCache(
+            max_size=RETRIEVAL_CACHE_MAX_SIZE, ttl_seconds=RETRIEVAL_CACHE_TTL_SECONDS
+        )
+        self._results_cache = TTLCache(
+            max_size=RETRIEVAL_CACHE_MAX_SIZE, ttl_seconds=RETRIEVAL_CACHE_TTL_SECONDS
+        )
+        self._lock = threading.Lock()
+        self._bm25: Optional[BM25Index] = None
+        self._bm25_lock = threading.Lock()
+        # Consultas que están leyendo el índice; reload espera a que terminen
+        # antes de reemplazarlo y cerrar el anterior
+        self._readers = 0
+        self._swapping = False
+        self._swap = threading.Condition()
+        self.embed_calls = 0
+        self.saved_embed_calls = 0
+        self.context_turns = 0
+        self.context_tokens = 0
+        self.candidate_tokens = 0
+
+    def retrieve_relevant_sections(self, query: str, k: int = RETRIEVAL_K) -> List[str]:
         try:
-            docs = self.vectorstore.similarity_search(query, k=10)
-            return [doc.page_content for doc in docs]
+            normalized = normalize_query(query)
+            sections = self._results_cache.get((normalized, k))
+            if sections is not None:
+                self._count("saved_embed_calls")
+                return list(sections)
+
+            embedding = self._embed(normalized)
+            with self._reading():
+                docs = self.vectorstore.similarity_search_by_vector(embedding, k=k)
+            sections = [doc.page_content for doc in docs]
+            self._results_cache.set((normalized, k), tuple(sections))
+            return sections
         except Exception as e:
             logging.error(f"Error retrieving relevant sections: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def retrieve_context(
+        self, query: str, token_budget: int = CONTEXT_TOKEN_BUDGET
+    ) -> RetrievedContext:
+        """
+        Contexto de un turno: búsqueda híbrida, umbral, sin repetidos y con
+        un tope de tokens.
+
+        Los candidatos son los RETRIEVAL_K de FAISS más los RETRIEVAL_K de
+        BM25. Cada uno se puntúa mezclando su similitud coseno con su puntaje
+        BM25 normalizado (RETRIEVAL_HYBRID_ALPHA) y se descartan los que no
+        llegan a RETRIEVAL_SCORE_THRESHOLD. Luego se eligen al estilo MMR:
+        primero el de mejor puntaje penalizado por su parecido (Jaccard de
+        palabras) con los ya elegidos, saltando los casi idénticos (los
+        fragmentos se solapan), hasta que el siguiente no cabe en
+        `token_budget`. Con RETRIEVAL_MODE="vector" se usa la búsqueda
+        anterior, sin filtros.
+        """
+        try:
+            if RETRIEVAL_MODE == "vector":
+                sections = tuple(self.retrieve_relevant_sections(query))
+                tokens = sum(count_tokens_batch(list(sections)))
+                context = RetrievedContext(sections, tokens, len(sections), tokens)
+                self._record(context)
+                return context
+
+            normalized = normalize_query(query)
+            key = ("context", normalized, token_budget)
+            context = self._results_cache.get(key)
+            if context is None:
+                embedding = self._embed(normalized)
+                with self._reading():
+                    candidates = self._hybrid_candidates(normalized, embedding)
+                context = self._select(candidates, token_budget)
+                self._results_cache.set(key, context)
+            else:
+                self._count("saved_embed_calls")
+
+            self._record(context)
+            return context
+        except Exception as e:
+            logging.error(f"Error retrieving context: {str(e)}")
+            raise
+
+    def reload(self) -> None:
+        """
+        Vuelve a cargar el índice desde disco y vacía la caché de consultas.
+
+        Mientras carga se sigue consultando el índice anterior. Para
+        reemplazarlo (junto con su BM25) se esperan las consultas que lo están
+        leyendo, y luego se cierra su docstore.bin si estaba mapeado.
+        """
+        vectorstore = self._load(self.faiss_index_path)
+        with self._swap:
+            self._swapping = True
+            self._swap.wait_for(lambda: self._readers == 0)
+            previous, self.vectorstore = self.vectorstore, vectorstore
+            self._bm25 = None
+            self._swapping = False
+            self._swap.notify_all()
+        self.clear_cache()
+
+        if isinstance(previous.docstore, MappedDocstore):
+            previous.docstore.docstore_file.close()
+
+    @contextmanager
+    def _reading(self):
+        """Marca una consulta que lee el índice; no se anida."""
+        with self._swap:
+            self._swap.wait_for(lambda: not self._swapping)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._swap:
+                self._readers -= 1
+                self._swap.notify_all()
+
+    def clear_cache(self) -> None:
+        self._embeddings_cache.clear()
+        self._results_cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "embeddings": self._embeddings_cache.stats(),
+            "results": self._results_cache.stats(),
+            "embed_calls": self.embed_calls,
+            "saved_embed_calls": self.saved_embed_calls,
+            "load": self.load_stats,
+            "context": {
+                "mode": RETRIEVAL_MODE,
+                "turns": self.context_turns,
+                "context_tokens": self.context_tokens,
+                "candidate_tokens": self.candidate_tokens,
+            },
+        }
+
+    def _hybrid_candidates(self, query: str, embedding: List[float]) -> List[Tuple[str, float]]:
+        """Candidatos de FAISS y BM25 con su puntaje combinado, de mayor a menor."""
+        vector_scores = {
+            # Distancia L2 al cuadrado entre vectores normalizados: 2 - 2·cos
+            doc.page_content: 1.0 - distance / 2
+            for doc, distance in self.vectorstore.similarity_search_with_score_by_vector(
+                embedding, k=RETRIEVAL_K
+            )
+        }
+        lexical_scores = {
+            self._text_at(position): score
+            for position, score in self._get_bm25().search(query, RETRIEVAL_K)
+        }
+        return self._fuse(vector_scores, lexical_scores)
+
+    @staticmethod
+    def _fuse(
+        vector_scores: Dict[str, float], lexical_scores: Dict[str, float]
+    ) -> List[Tuple[str, float]]:
+        """
+        Combina los puntajes de FAISS y BM25, de mayor a menor.
+
+        Ambos se llevan a [0, 1] dentro de los candidatos de la consulta. El
+        coseno no se usa tal cual porque depende del modelo: con ada-002 un
+        texto que no tiene nada que ver ronda 0.7, así que nunca quedaría
+        bajo RETRIEVAL_SCORE_THRESHOLD.
+        """
+        vector = _min_max(vector_scores)
+        lexical = _min_max(lexical_scores)
+        fused = [
+            (
+                text,
+                RETRIEVAL_HYBRID_ALPHA * vector.get(text, 0.0)
+                + (1 - RETRIEVAL_HYBRID_ALPHA) * lexical.get(text, 0.0),
+            )
+            for text in {**vector, **lexical}
+        ]
+        fused.sort(key=lambda item: item[1], reverse=True)
+        return fused
+
+    @staticmethod
+    def _select(candidates: List[Tuple[str, float]], token_budget: int) -> RetrievedContext:
+        token_counts = dict(
+            zip(
+                (text for text, _ in candidates),
+                count_tokens_batch([text for text, _ in candidates]),
+            )
+        )
+        remaining = [
+            (text, score, set(tokenize(text)))
+            for text, score in candidates
+            if score >= RETRIEVAL_SCORE_THRESHOLD
+        ]
+
+        selected = []
+        used = 0
+        while remaining:
+            best = max(
+                remaining,
+                key=lambda c: RETRIEVAL_MMR_LAMBDA * c[1]
+                - (1 - RETRIEVAL_MMR_LAMBDA)
+                * max((jaccard(c[2], s[2]) for s in selected), default=0.0),
+            )
+            remaining.remove(best)
+            if any(jaccard(best[2], s[2]) >= RETRIEVAL_DEDUPE_JACCARD for s in selected):
+                continue
+
+            tokens = token_counts[best[0]]
+            if used + tokens > token_budget:
+                break
+            selected.append(best)
+            used += tokens
+
+        return RetrievedContext(
+            tuple(text for text, _, _ in selected),
+            used,
+            len(candidates),
+            sum(token_counts.values()),
+        )
+
+    def _record(self, context: RetrievedContext) -> None:
+        with self._lock:
+            self.context_turns += 1
+            self.context_tokens += context.tokens
+            self.candidate_tokens += context.candidate_tokens
+
+    def _get_bm25(self) -> BM25Index:
+        """Índice BM25 de los fragmentos; se construye en la primera consulta."""
+        if self._bm25 is None:
+            with self._bm25_lock:
+                if self._bm25 is None:
+                    self._bm25 = BM25Index(self._documents())
+        return self._bm25
+
+    def _documents(self) -> Iterator[str]:
+        for position in range(self.vectorstore.index.ntotal):
+            yield self._text_at(position)
+
+    def _text_at(self, position: int) -> str:
+        docstore = self.vectorstore.docstore
+        if isinstance(docstore, MappedDocstore):
+            return docstore.docstore_file.get(position)["page_content"]
+        return docstore.search(self.vectorstore.index_to_docstore_id[position]).page_content
+
+    def _embed(self, normalized_query: str) -> List[float]:
+        embedding = self._embeddings_cache.get(normalized_query)
+        if embedding is not None:
+            self._count("saved_embed_calls")
+            return embedding
+
+        embedding = self.embeddings.embed_query(normalized_query)
+        self._count("embed_calls")
+        self._embeddings_cache.set(normalized_query, embedding)
+        return embedding
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _load(self, faiss_index_path: str) -> FAISS:
+        started = time.perf_counter()
+        rss_before = _rss_bytes()
+        # Si el índice se publica por generaciones, se carga la vigente
+        faiss_index_path = resolve_index_path(faiss_index_path)
+
+        manifest = read_manifest(faiss_index_path)
+        if manifest and manifest.get("embedding_model") != self.embeddings.model:
+            raise ValueError(
+                f"El índice {faiss_index_path} se creó con {manifest.get('embedding_model')} "
+                f"y el chatbot usa {self.embeddings.model}. "
+                "Reindéxelo con scripts/reindex_vectorstores.py"
+            )
+
+        if self.load_mode == "mmap" and MMAP_IO_FLAG is None:
+            logging.error(
+                f"faiss {faiss.__version__} no tiene IO_FLAG_MMAP_IFC y no puede "
+                f"mapear {faiss_index_path}; se carga en memoria. Actualice faiss-cpu "
+                "o use VECTORSTORE_LOAD_MODE=memory"
+            )
+            self.load_mode = "memory"
+
+        if self.load_mode == "mmap":
+            vectorstore = self._load_mmap(faiss_index_path, self.embeddings)
+        else:
+            # Ahora cargamos una base de datos FAISS existente en lugar de crearla
+            vectorstore = FAISS.load_local(
+                faiss_index_path,
+                self.embeddings,
+                allow_dangerous_deserialization=True,
+            )
+
+        self.load_stats = {
+            "mode": self.load_mode,
+            "path": faiss_index_path,
+            "embedding_model": self.embeddings.model,
+            "seconds": round(time.perf_counter() - started, 4),
+            "rss_delta_bytes": _rss_bytes() - rss_before,
+            "vectors": vectorstore.index.ntotal,
+            "docstore": type(vectorstore.docstore).__name__,
+        }
+        logging.info(f"Índice {faiss_index_path} cargado: {self.load_stats}")
+        return vectorstore
+
+    @staticmethod
+    def _load_mmap(faiss_index_path: str, embeddings: Embeddings) -> FAISS:
+        index = faiss.read_index(
+            os.path.join(faiss_index_path, "index.faiss"),
+            MMAP_IO_FLAG | faiss.IO_FLAG_READ_ONLY,
+        )
+
+        docstore_path = os.path.join(faiss_index_path, DOCSTORE_FILENAME)
+        if os.path.exists(docstore_path):
+            docstore = MappedDocstore(DocstoreFile(docstore_path))
+            index_to_docstore_id = _PositionIds(len(docstore.docstore_file))
+        else:
+            logging.warning(
+                f"{faiss_index_path} no tiene {DOCSTORE_FILENAME}, se lee index.pkl. "
+                "Conviértalo con scripts/convert_docstores.py"
+            )
+            with open(os.path.join(faiss_index_path, "index.pkl"), "rb") as file:
+                docstore, index_to_docstore_id = pickle.load(file)
+
+        return FAISS(embeddings, index, docstore, index_to_docstore_id)
@@ -0,0 +1,416 @@
+import datetime
+import logging
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from firebase_admin.firestore import firestore
+
+from src.common.config import CAMPAIGN_CHUNK_SIZE, CAMPAIGN_LEASE_SECONDS
+from src.common.whatsapp.models.models import TextMessage, WhatsAppMessage
+from src.data.sources.firebase.config import db
+from src.data.sources.firebase.contact_resolver import contact_resolver
+from src.data.sources.firebase.counters import counters
+from src.data.sources.firebase.message_impl import MessageFirebaseRepository
+from src.data.sources.firebase.template_catalog import template_catalog
+from src.data.sources.firebase.tenant_metadata import tenant_metadata
+from src.data.sources.firebase.utils import FIRESTORE_BATCH_LIMIT, BulkWriteSession
+from src.services.campaign_sender import CampaignSender
+
+# Estados de una campaña. "preparing" mientras se cargan los destinatarios y
+# "failed" si la carga falla; ni esos ni "completed" se pueden reanudar.
+# "pending" también es el estado entre una parte y la siguiente.
+CAMPAIGN_PREPARING = "preparing"
+CAMPAIGN_PENDING = "pending"
+CAMPAIGN_RUNNING = "running"
+CAMPAIGN_ERROR = "error"
+CAMPAIGN_COMPLETED = "completed"
+CAMPAIGN_FAILED = "failed"
+
+# Estados en los que la campaña ya no se procesa
+CAMPAIGN_FINAL_STATUSES = (CAMPAIGN_COMPLETED, CAMPAIGN_FAILED)
+
+# Contadores de cada campaña (ver ShardedCounters)
+CAMPAIGN_COUNTERS = [
+    "sent_messages",
+    "failed_messages",
+    "delivered_messages",
+    "read_messages",
+    "undelivered_messages",
+]
+
+# Estados de cada destinatario
+RECIPIENT_PENDING = "pending"
+RECIPIENT_SENT = "sent"
+RECIPIENT_FAILED = "failed"
+
+
+class CampaignJobService:
+    """
+    Campañas persistentes que se procesan por partes y se pueden reanudar.
+
+    La campaña vive en business/{id}/campaigns/{campaign_id} y cada
+    destinatario en su subcolección `recipients`, con su posición (`index`) y
+    su estado. Los destinatarios se envían en partes de `chunk_size`; al
+    terminar cada parte se guardan los estados y el punto de control
+    (`next_index`) en un mismo lote, así que tras una caída solo se repite,
+    como mucho, la parte en curso.
+
+    Un proceso toma la campaña con un lease que renueva en cada parte; otra
+    instancia solo puede reanudarla cuando el lease vence. El token de
+    WhatsApp no se guarda: se toma de los datos del negocio al procesar.
+
+    En Cloud Functions no hay CPU después de responder, así que no se usan
+    hilos: cada parte se procesa dentro de una solicitud (`run` con
+    `max_chunks=1`) y la siguiente se encola como tarea de Cloud Tasks.
+    """
+
+    def __init__(
+        self,
+        sender: CampaignSender,
+        chunk_size: int = CAMPAIGN_CHUNK_SIZE,
+        lease_seconds: float = CAMPAIGN_LEASE_SECONDS,
+    ):
+        self.sender = sender
+        # Cada parte se cierra con un lote: estados de los destinatarios +
+        # punto de control de la campaña + un shard de sus contadores
+        self.chunk_size = min(chunk_size, FIRESTORE_BATCH_LIMIT - 2)
+        self.lease_seconds = lease_seconds
+
+    def create(
+        self,
+        ws_id: str,
+        phone_numbers: Iterable[str],
+        content: str,
+        template: Optional[str] = None,
+        message: Optional[str] = None,
+        language_code: str = "es",
+        recipient_stats: Optional[Callable[[], Dict[str, int]]] = None,
+    ) -> Optional[str]:
+        """
+        Guarda la campaña y sus destinatarios. Retorna el id de la campaña, o
+        None si no hay destinatarios.
+
+        `phone_numbers` se recorre una sola vez y se escribe por lotes, así que
+        puede ser un generador (ver RecipientStream). `recipient_stats` se
+        llama al terminar de recorrerlo.
+
+        La campaña se guarda primero como "preparing", así que sus
+        destinatarios nunca quedan sin ella: si la carga falla a medias se
+        marca como "failed" (y no se envía), y si no hubo destinatarios se
+        borra.
+        """
+        metadata = tenant_metadata.get(ws_id)
+        if not metadata:
+            raise Exception(f"No hay business registrado para {ws_id}")
+
+        campaign_ref = metadata.campaigns_ref.document()
+        campaign_ref.set(
+            {
+                "users_count": 0,
+                "created_at": firestore.SERVER_TIMESTAMP,
+                "platform": "whatsapp",
+                "ws_id": ws_id,
+                "template": template,
+                "message": message,
+                "language_code": language_code,
+                "content": content,
+                "status": CAMPAIGN_PREPARING,
+                "next_index": 0,
+                "processed": 0,
+                "recipients": None,
+                "lease_expires_at": None,
+            }
+        )
+
+        users_count = 0
+        try:
+            numbers = iter(phone_numbers)
+            while True:
+                chunk = list(islice(numbers, FIRESTORE_BATCH_LIMIT))
+                if not chunk:
+                    break
+
+                batch = db.batch()
+                for phone_number in chunk:
+                    batch.set(
+                        campaign_ref.collection("recipients").document(phone_number),
+                        {
+                            "phone_number": phone_number,
+                            "index": users_count,
+                            "status": RECIPIENT_PENDING,
+                        },
+                    )
+                    users_count += 1
+                batch.commit()
+        except Exception as e:
+            logging.error(f"Error al cargar los destinatarios de {campaign_ref.id}: {e}")
+            campaign_ref.update(
+                {
+                    "status": CAMPAIGN_FAILED,
+                    "users_count": users_count,
+                    "error": str(e),
+                    "updated_at": firestore.SERVER_TIMESTAMP,
+                }
+            )
+            raise
+
+        if not users_count:
+            campaign_ref.delete()
+            return None
+
+        campaign_ref.update(
+            {
+                "users_count": users_count,
+                "status": CAMPAIGN_PENDING,
+                "recipients": recipient_stats() if recipient_stats else None,
+            }
+        )
+        return campaign_ref.id
+
+    def run(
+        self,
+        ws_id: str,
+        campaign_id: str,
+        max_chunks: Optional[int] = None,
+    ) -> Optional[str]:
+        """
+        Procesa la campaña desde su último punto de control.
+
+        Con `max_chunks` se detiene después de esa cantidad de partes y deja
+        la campaña en "pending", lista para la siguiente tarea. Retorna el
+        estado en que queda la campaña, o None si no se pudo tomar (no
+        existe, ya terminó u otra instancia tiene el lease).
+        """
+        campaign_ref = self._campaign_ref(ws_id, campaign_id)
+        campaign = self._claim(campaign_ref)
+        if campaign is None:
+            logging.info(f"La campaña {campaign_id} no está disponible para procesar")
+            return None
+
+        campaign["path"] = campaign_ref.path
+        token = tenant_metadata.get(ws_id).ws_token
+        status = CAMPAIGN_PENDING
+        chunks = 0
+        try:
+            while max_chunks is None or chunks < max_chunks:
+                if not self._process_chunk(campaign_ref, campaign, token):
+                    status = CAMPAIGN_COMPLETED
+                    break
+                chunks += 1
+        except Exception as e:
+            status = CAMPAIGN_ERROR
+            logging.exception(f"Error procesando la campaña {campaign_id}: {e}")
+            raise
+        finally:
+            campaign_ref.update(
+                {
+                    "status": status,
+                    "lease_expires_at": None,
+                    "updated_at": firestore.SERVER_TIMESTAMP,
+                }
+            )
+            logging.info(f"Campaña {campaign_id}: {status}")
+        return status
+
+    def get_status(self, ws_id: str, campaign_id: str) -> Optional[Dict[str, Any]]:
+        snapshot = self._campaign_ref(ws_id, campaign_id).get()
+        if not snapshot.exists:
+            return None
+
+        campaign = snapshot.to_dict()
+        users_count = campaign.get("users_count") or 0
+        processed = campaign.get("processed") or 0
+        return {
+            "campaign_id": campaign_id,
+            "status": campaign.get("status"),
+            "users_count": users_count,
+            "processed": processed,
+            **self.get_counts(snapshot.reference, campaign),
+            "progress": round(processed / users_count, 4) if users_count else 1.0,
+            "recipients": campaign.get("recipients"),
+            "stats": campaign.get("stats"),
+        }
+
+    @staticmethod
+    def get_counts(campaign_ref, campaign: Dict[str, Any]) -> Dict[str, int]:
+        """Enviados, fallidos, entregados, leídos y no entregados de la campaña."""
+        totals = counters.get_totals(campaign_ref, CAMPAIGN_COUNTERS)
+        # Las campañas anteriores a los contadores los tienen en el documento
+        return {
+            field: total + (campaign.get(field) or 0) for field, total in totals.items()
+        }
+
+    def _process_chunk(self, campaign_ref, campaign: Dict[str, Any], token: str) -> bool:
+        """Envía la siguiente parte. Retorna False cuando ya no quedan destinatarios."""
+        snapshots = (
+            campaign_ref.collection("recipients")
+            .where("index", ">=", campaign["next_index"])
+            .order_by("index")
+            .limit(self.chunk_size)
+            .get()
+        )
+        if not snapshots:
+            return False
+
+        # Los que ya tienen estado se enviaron antes de la última caída
+        pending = [s for s in snapshots if s.get("status") == RECIPIENT_PENDING]
+        build_message = self._message_builder(campaign)
+        messages = [build_message(s.get("phone_number")) for s in pending]
+        result = self.sender.send(campaign["ws_id"], token, messages)
+        persist_errors = self._persist_messages(campaign, messages, result.results)
+
+        next_index = snapshots[-1].get("index") + 1
+        batch = db.batch()
+        for snapshot, call in zip(pending, result.results):
+            update = _recipient_update(call)
+            if snapshot.get("phone_number") in persist_errors:
+                update["persist_error"] = persist_errors[snapshot.get("phone_number")]
+            batch.update(snapshot.reference, update)
+        batch.update(
+            campaign_ref,
+            {
+                "next_index": next_index,
+                "processed": firestore.Increment(len(pending)),
+                "stats": result.to_dict(),
+                "lease_expires_at": self._lease_deadline(),
+                "updated_at": firestore.SERVER_TIMESTAMP,
+            },
+        )
+        counters.add_to_batch(
+            batch,
+            campaign_ref,
+            {"sent_messages": result.sent, "failed_messages": result.failed},
+        )
+        batch.commit()
+
+        campaign["next_index"] = next_index
+        return len(snapshots) == self.chunk_size
+
+    def _persist_messages(
+        self,
+        campaign: Dict[str, Any],
+        messages: List[WhatsAppMessage],
+        calls: List[Dict[str, Any]],
+    ) -> Dict[str, str]:
+        """
+        Guarda los mensajes enviados de una parte y el último mensaje de cada
+        contacto con un BulkWriter, en lugar de varias escrituras por destinatario.
+
+        Returns:
+            Dict[str, str]: Los números cuyo mensaje no se pudo guardar y el error.
+        """
+        ws_id = campaign["ws_id"]
+        sent = [
+            (msg, call) for msg, call in zip(messages, calls) if call["status"] == "success"
+        ]
+        if not sent:
+            return {}
+
+        # Contactos y conversaciones de toda la parte en unas pocas consultas.
+        # Se resuelven aquí y no una sola vez en `create`: cada parte corre en
+        # su propia tarea, a menudo en otra instancia, así que lo resuelto al
+        # crear no estaría en su caché; además solo se resuelven los números a
+        # los que el envío llegó, y la carga del archivo no espera la audiencia.
+        resolutions = contact_resolver.resolve_many(
+            ws_id, [msg.to_number for msg, _ in sent]
+        )
+
+        session = BulkWriteSession()
+        message_data = []
+        for msg, call in sent:
+            resolution = resolutions[msg.to_number]
+            message_data.append(
+                {
+                    "conversation_ref": resolution.conversation_ref,
+                    "contact_ref": resolution.contact_ref,
+                    "ws_id": ws_id,
+                    "wa_id": call["wa_id"],
+                    "phone_number": msg.to_number,
+                    "message": campaign["content"],
+                    "role": "assistant",
+                    "campaign_path": campaign["path"],
+                }
+            )
+            contact_resolver.update_contact(
+                ws_id,
+                msg.to_number,
+                {
+                    "last_message": {
+                        "content": campaign["content"],
+                        "created_at": firestore.SERVER_TIMESTAMP,
+                    }
+                },
+                batch=session,
+            )
+
+        message_refs = MessageFirebaseRepository().bulk_create_messages(
+            message_data, session
+        )
+        failed = session.close()
+
+        return {
+            msg.to_number: failed[ref.path]
+            for (msg, _), ref in zip(sent, message_refs)
+            if ref.path in failed
+        }
+
+    @staticmethod
+    def _message_builder(
+        campaign: Dict[str, Any],
+    ) -> Callable[[str], WhatsAppMessage]:
+        """Función que arma el mensaje de cada destinatario de la campaña."""
+        if campaign.get("template"):
+            prepared = template_catalog.prepare(
+                campaign["ws_id"], campaign["template"], campaign.get("language_code")
+            )
+            return prepared.message
+        return lambda phone_number: TextMessage(
+            number=phone_number, text=campaign.get("message")
+        )
+
+    def _claim(self, campaign_ref) -> Optional[Dict[str, Any]]:
+        """Toma la campaña con un lease si nadie más la está procesando."""
+
+        @firestore.transactional
+        def claim(transaction):
+            snapshot = campaign_ref.get(transaction=transaction)
+            if not snapshot.exists or not self._is_claimable(snapshot.to_dict()):
+                return None
+
+            transaction.update(
+                campaign_ref,
+                {"status": CAMPAIGN_RUNNING, "lease_expires_at": self._lease_deadline()},
+            )
+            return snapshot.to_dict()
+
+        return claim(db.transaction())
+
+    def _is_claimable(self, campaign: Dict[str, Any]) -> bool:
+        if campaign.get("status") in (CAMPAIGN_PREPARING, *CAMPAIGN_FINAL_STATUSES):
+            return False
+
+        lease_expires_at = campaign.get("lease_expires_at")
+        return not lease_expires_at or lease_expires_at < _now()
+
+    def _lease_deadline(self) -> datetime.datetime:
+        return _now() + datetime.timedelta(seconds=self.lease_seconds)
+
+    @staticmethod
+    def _campaign_ref(ws_id: str, campaign_id: str):
+        metadata = tenant_metadata.get(ws_id)
+        if not metadata:
+            raise Exception(f"No hay business registrado para {ws_id}")
+        return metadata.campaigns_ref.document(campaign_id)
+
+
+def _recipient_update(call: Dict[str, Any]) -> Dict[str, Any]:
+    if call["status"] == "success":
+        return {
+            "status": RECIPIENT_SENT,
+            "wa_id": call["wa_id"],
+        }
+    return {"status": RECIPIENT_FAILED, "error": call.get("message")}
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
@@ -0,0 +1,302 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import aiohttp
+
+from src.common.config import (
+    CAMPAIGN_INITIAL_CONCURRENCY,
+    CAMPAIGN_MAX_CONCURRENCY,
+    CAMPAIGN_MAX_RETRIES,
+    CAMPAIGN_MIN_CONCURRENCY,
+    CAMPAIGN_RATE_BURST,
+    CAMPAIGN_RATE_PER_SECOND,
+    GRAPH_API_CONNECT_TIMEOUT_SECONDS,
+    GRAPH_API_READ_TIMEOUT_SECONDS,
+)
+from src.common.utils.graph_api import graph_api_client
+from src.common.whatsapp.models.models import WhatsAppMessage
+
+# Códigos de error de la Graph API que indican límite de envío
+# (https://developers.facebook.com/docs/whatsapp/cloud-api/support/error-codes)
+THROTTLING_ERROR_CODES = {4, 80007, 130429, 131048, 131056}
+
+# Errores en los que la solicitud no llegó a enviarse: son los únicos que se
+# reintentan además de los límites de envío. Un timeout de lectura o un 5xx
+# pudo llegar a Meta, y repetirlo le enviaría al cliente un mensaje duplicado.
+NOT_SENT_ERRORS = (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)
+
+
+class TokenBucket:
+    """
+    Limita los envíos de un número a `rate` por segundo, con ráfagas de `burst`.
+
+    Es segura entre hilos para que varias campañas del mismo from_id, cada una
+    con su propio event loop, compartan el mismo límite.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Toma un token y retorna cuántos segundos hay que esperar para usarlo."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class AdaptiveConcurrency:
+    """
+    Controla cuántos envíos hay en curso con aumento aditivo y reducción
+    multiplicativa (AIMD): cada envío exitoso sube el límite un poco y cada
+    respuesta de límite de envío lo reduce a la mitad.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.throttled = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self) -> None:
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_throttled(self) -> None:
+        self.throttled += 1
+        self.limit = max(self.minimum, self.limit / 2)
+        logging.warning(
+            f"Límite de envío de la Graph API; concurrencia reducida a {int(self.limit)}"
+        )
+
+
+class CampaignResult:
+    """
+    Resultado de un envío masivo y su throughput sostenido.
+
+    `results` tiene el resultado de cada mensaje, en el orden de envío: solo
+    el estado y el wa_id (o el error), no la respuesta de la Graph API.
+    """
+
+    def __init__(
+        self,
+        sent: int,
+        failed: int,
+        elapsed_seconds: float,
+        concurrency: int,
+        throttled: int,
+        results: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.sent = sent
+        self.failed = failed
+        self.elapsed_seconds = elapsed_seconds
+        self.concurrency = concurrency
+        self.throttled = throttled
+        self.results = results or []
+
+    @property
+    def messages_per_second(self) -> float:
+        if not self.elapsed_seconds:
+            return 0.0
+        return self.sent / self.elapsed_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "elapsed_seconds": round(self.elapsed_seconds, 2),
+            "messages_per_second": round(self.messages_per_second, 2),
+            "final_concurrency": self.concurrency,
+            "throttled": self.throttled,
+        }
+
+
+class CampaignSender:
+    """
+    Envía los mensajes de una campaña con asyncio y aiohttp.
+
+    Mantiene hasta `CAMPAIGN_MAX_CONCURRENCY` envíos en curso, limita cada
+    from_id con un token bucket compartido entre campañas del mismo proceso y
+    ajusta la concurrencia cuando Meta responde con límites de envío. Un
+    mensaje solo se reintenta si Meta lo rechazó por límite de envío o si no
+    se llegó a enviar.
+    """
+
+    _buckets: Dict[str, TokenBucket] = {}
+    _buckets_lock = threading.Lock()
+
+    def __init__(
+        self,
+        rate_per_second: float = CAMPAIGN_RATE_PER_SECOND,
+        burst: int = CAMPAIGN_RATE_BURST,
+        initial_concurrency: int = CAMPAIGN_INITIAL_CONCURRENCY,
+        min_concurrency: int = CAMPAIGN_MIN_CONCURRENCY,
+        max_concurrency: int = CAMPAIGN_MAX_CONCURRENCY,
+        max_retries: int = CAMPAIGN_MAX_RETRIES,
+    ):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.initial_concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+
+    def send(
+        self,
+        from_id: str,
+        token: str,
+        messages: Iterable[WhatsAppMessage],
+    ) -> CampaignResult:
+        """Envía los mensajes y espera a que terminen (para llamarse desde Flask)."""
+        return asyncio.run(self.send_async(from_id, token, messages))
+
+    async def send_async(
+        self,
+        from_id: str,
+        token: str,
+        messages: Iterable[WhatsAppMessage],
+    ) -> CampaignResult:
+        """
+        Envía los mensajes con un número fijo de tareas que los van tomando del
+        iterable, así que `messages` puede ser un generador.
+
+        Se guarda un resultado pequeño por mensaje, así que la memoria crece
+        con la cantidad enviada: quien llama envía por partes (las campañas,
+        de a CAMPAIGN_CHUNK_SIZE).
+        """
+        bucket = self._bucket(from_id)
+        concurrency = AdaptiveConcurrency(
+            self.initial_concurrency, self.min_concurrency, self.max_concurrency
+        )
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=GRAPH_API_CONNECT_TIMEOUT_SECONDS,
+            sock_read=GRAPH_API_READ_TIMEOUT_SECONDS,
+        )
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        headers = {
+            **graph_api_client.auth_headers(from_id, token),
+            "Content-Type": "application/json",
+        }
+        url = f"{graph_api_client.base_url}/{from_id}/messages"
+        pending = enumerate(messages)
+        results: Dict[int, Dict[str, Any]] = {}
+        totals = {"success": 0, "error": 0}
+
+        async def worker() -> None:
+            # Los workers comparten el iterador; next() no cede el event loop
+            for position, message in pending:
+                result = await self._send_with_retries(
+                    session, url, message, bucket, concurrency
+                )
+                totals[result["status"]] += 1
+                results[position] = result
+
+        started_at = time.monotonic()
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers=headers
+        ) as session:
+            await asyncio.gather(*(worker() for _ in range(self.max_concurrency)))
+
+        result = CampaignResult(
+            totals["success"],
+            totals["error"],
+            time.monotonic() - started_at,
+            int(concurrency.limit),
+            concurrency.throttled,
+            [results[position] for position in sorted(results)],
+        )
+        logging.info(
+            f"Campaña de {from_id}: {result.sent} enviados, {result.failed} errores, "
+            f"{result.messages_per_second:.1f} mensajes/s"
+        )
+        return result
+
+    def _bucket(self, from_id: str) -> TokenBucket:
+        with self._buckets_lock:
+            bucket = self._buckets.get(from_id)
+            if not bucket:
+                bucket = TokenBucket(self.rate_per_second, self.burst)
+                self._buckets[from_id] = bucket
+            return bucket
+
+    async def _send_with_retries(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        message: WhatsAppMessage,
+        bucket: TokenBucket,
+        concurrency: AdaptiveConcurrency,
+    ) -> Dict[str, Any]:
+        data = message.create_message()
+        body = None
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, 0.5 * 2**attempt))
+
+            await bucket.acquire()
+            try:
+                async with concurrency:
+                    async with session.post(url, data=data) as response:
+                        status_code = response.status
+                        body = await response.json(content_type=None)
+            except NOT_SENT_ERRORS as e:
+                error = str(e)
+                continue
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                # Pudo haber llegado a Meta: no se reintenta
+                error = str(e)
+                break
+
+            if status_code == 200:
+                concurrency.on_success()
+                return {
+                    "status": "success",
+                    "number": message.to_number,
+                    "wa_id": body["messages"][0]["id"],
+                }
+
+            error = f"Failed to send message. Status code: {status_code}. Repsonse:{body}"
+            if not _is_throttling(status_code, body):
+                break
+            concurrency.on_throttled()
+
+        return {"status": "error", "number": message.to_number, "message": error}
+
+
+def _is_throttling(status_code: int, body: Any) -> bool:
+    if status_code == 429:
+        return True
+    error = body.get("error") if isinstance(body, dict) else None
+    return bool(error) and error.get("code") in THROTTLING_ERROR_CODES
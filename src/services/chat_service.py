@@ -1,11 +1,19 @@
 import json
 import logging
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Optional
 from src.data.sources.firebase.config import db
 
 
-from src.common.utils.openai_utils import add_context_to_chatbot, generate_answer
+from src.common.config import (
+    HISTORY_TAIL_SIZE,
+    MAX_TOOL_ITERATIONS,
+    PROMPT_TOKEN_BUDGET,
+)
+from src.common.utils.openai_utils import generate_answer
+from src.common.utils.prompt_assembler import PromptAssembler
+from src.common.utils.token_counter import count_tokens
 from src.data.models.chatbot import ChatbotModel
+from src.data.models.message import ChatMessage
 from src.data.sources.firebase.contact_impl import ContactFirebaseRepository
 from src.data.sources.firebase.message_impl import MessageFirebaseRepository
 
@@ -13,26 +21,58 @@ from src.data.sources.firebase.message_impl import MessageFirebaseRepository
 class ChatbotService:
     def __init__(self, chatbot_model: ChatbotModel):
         self.chatbot_model = chatbot_model
+        self.prompt_assembler = PromptAssembler(PROMPT_TOKEN_BUDGET, count_tokens)
 
-    def answer_conversation(self, from_whatsapp_id, to_number):
-        messages = MessageFirebaseRepository().get_messages(
-            from_whatsapp_id, to_number
-        )[-10:]
+    def answer_conversation(
+        self,
+        from_whatsapp_id,
+        to_number,
+        tool_handler: Optional[Callable[[Any], List[Dict[str, Any]]]] = None,
+    ):
+        """
+        Genera la respuesta de un turno completo de la conversación.
+
+        Args:
+            from_whatsapp_id: El phone_number_id del negocio.
+            to_number: El número del contacto.
+            tool_handler: Ejecuta las herramientas pedidas por el modelo y
+                retorna los mensajes a agregar al prompt para continuar.
+        """
+        # Se traen más mensajes de los necesarios y el presupuesto de tokens
+        # decide cuántos entran al prompt
+        history = MessageFirebaseRepository().get_recent_messages(
+            from_whatsapp_id, to_number, limit=HISTORY_TAIL_SIZE
+        )
         user_data = ContactFirebaseRepository().get_contact(from_whatsapp_id, to_number)
 
         return self.generate_answer_from_text_with_vector_db(
-            user_data, messages, self.chatbot_model.tools
+            user_data, history, self.chatbot_model.tools, tool_handler=tool_handler
         )
 
     def generate_answer_from_text_with_vector_db(
-        self, user_data: Dict[str, Any], messages: list, tools, image=None
+        self,
+        user_data: Dict[str, Any],
+        history: List[ChatMessage],
+        tools,
+        image=None,
+        tool_handler: Optional[Callable[[Any], List[Dict[str, Any]]]] = None,
     ):
-        """Procesa mensajes de texto"""
+        """
+        Procesa mensajes de texto.
+
+        La historia y el contexto se consultan una sola vez. Si el modelo pide
+        herramientas y hay un tool_handler, se ejecutan, se agregan sus
+        resultados al prompt y se continúa, de modo que la respuesta final
+        sale de la misma pasada.
+        """
 
-        user_query = messages[-1]
+        user_query = history[-1]
 
-        relevant_sections = self.chatbot_model.vectorstore.retrieve_relevant_sections(
-            user_query["content"]
+        context = self.chatbot_model.vectorstore.retrieve_context(user_query.content)
+        relevant_sections = list(context.sections)
+        logging.info(
+            f"Contexto del turno: {context.tokens} tokens en {len(relevant_sections)} "
+            f"secciones (de {context.candidate_tokens} tokens en {context.candidates} candidatos)"
         )
 
         if image:
@@ -48,13 +88,24 @@ class ChatbotService:
             ]
 
         try:
-            context = " ".join(relevant_sections)
-            system_prompt = add_context_to_chatbot(
-                self.chatbot_model.system_prompt, context, user_data
+            prompt = self.prompt_assembler.assemble(
+                self.chatbot_model.system_prompt, relevant_sections, user_data, history
             )
 
-            messages = [{"role": "system", "content": system_prompt}, *messages]
+            messages = prompt.messages
             response = generate_answer(messages, tools)
+
+            iterations = 0
+            while response.tool_calls and tool_handler:
+                if iterations >= MAX_TOOL_ITERATIONS:
+                    # Se fuerza una respuesta de texto sin más herramientas
+                    response = generate_answer(messages, tools, tool_choice="none")
+                    break
+
+                messages.extend(tool_handler(response))
+                response = generate_answer(messages, tools)
+                iterations += 1
+
             logging.info(
                 f"Respuesta: {response}"
             )  # Cambiado de error a info para reflejar el éxito
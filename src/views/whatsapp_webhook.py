@@ -1,31 +1,58 @@
-from concurrent.futures import ThreadPoolExecutor
-import time
-from src.data.sources.firebase.config import db
-
-import firebase_admin
-import firebase_admin.firestore
-from src.common.config import CORS_HEADERS
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.common.config import (
+    CAMPAIGN_TASK_QUEUE,
+    CAMPAIGN_TASK_URL,
+    CORS_HEADERS,
+    DEDUPE_MAX_SIZE,
+    DEDUPE_PERSISTENT_STORE,
+    DEDUPE_TTL_SECONDS,
+    TENANT_INVALIDATION_SECRET,
+    WEBHOOK_ASYNC_MODE,
+    WEBHOOK_DRAIN_TIMEOUT_SECONDS,
+    WEBHOOK_QUEUE_MAX_SIZE,
+    WEBHOOK_WORKERS,
+)
 from src.common.whatsapp.models.models import (
     TemplateMessage,
     TextMessage,
-    WhatsAppMessage,
+)
+from src.common.whatsapp.models.webhook_models import (
+    IncomingMessage,
+    StatusUpdate,
+    WebhookPayload,
 )
 from flask import jsonify, request
+import hmac
+import json
 import os
 import logging
-from src.chatbot_router import get_chatbot_from_number
-from src.common.utils.whatsapp_utils import (
-    is_reaction_whatsapp_message,
-    is_valid_whatsapp_message,
-    send_whatsapp_message,
+from src.chatbot_router import chatbot_registry, get_chatbot_from_number
+from src.common.utils.whatsapp_utils import send_whatsapp_message
+from src.common.utils.graph_api import graph_api_client
+from src.services.campaign_jobs import (
+    CAMPAIGN_FINAL_STATUSES,
+    CAMPAIGN_PENDING,
+    CampaignJobService,
 )
-from src.data.sources.firebase.message_impl import MessageFirebaseRepository
-import pandas as pd
-
-from src.data.sources.firebase.utils import (
-    get_or_create_contact,
-    get_or_create_conversation,
+from src.services.campaign_sender import CampaignSender
+from src.common.utils.message_dedupe import MessageDeduplicator
+from src.common.utils.work_queue import InProcessWorkQueue, WorkQueue
+from src.data.sources.firebase.message_impl import (
+    MESSAGE_STATUS_RANK,
+    MessageFirebaseRepository,
+    conversation_tails,
+    token_accountant,
+)
+from src.data.sources.firebase.contact_resolver import contact_resolver
+from src.data.sources.firebase.counters import counters
+from src.data.sources.firebase.template_catalog import template_catalog
+from src.data.sources.firebase.tenant_metadata import tenant_metadata
+from src.data.sources.firebase.utils import create_task
+from src.data.sources.firebase.processed_message_impl import (
+    ProcessedMessageFirebaseStore,
 )
+from src.common.utils.recipients import RecipientStream
 
 
 def verify():
@@ -43,70 +70,194 @@ def verify():
 
 def process_message():
     body = request.get_json()
+    payload = WebhookPayload.from_dict(body)
 
-    statuses = (
-        body.get("entry", [{}])[0]
-        .get("changes", [{}])[0]
-        .get("value", {})
-        .get("statuses")
-    )
-    # Check if it's a WhatsApp status update
-    if statuses:
-        entry = body["entry"][0]
-        changes = entry["changes"][0]
-        value = changes["value"]
-        status = value["statuses"][0]
-
-        if status["status"] == "read":
-            message_id = status["id"]
+    if payload.is_empty():
+        return (
+            jsonify({"status": "error", "message": "Not a WhatsApp API event"}),
+            404,
+        )
 
-            ### Method ###
-            # mark_read_user_message()
-            message = MessageFirebaseRepository().get_message(message_id)
-            if not message:
-                logging.error(f"No se encontró el mensaje {message_id}")
+    if webhook_queue:
+        # Se responde de inmediato; el trabajo pesado lo hace el pool de hilos.
+        # Cada contacto es un trabajo aparte para procesarlos en paralelo.
+        jobs = [
+            (process_message_group, messages)
+            for messages in payload.group_messages().values()
+        ]
+        if payload.statuses:
+            jobs.append((process_statuses, payload.statuses))
+
+        accepted = [webhook_queue.submit(fn, events) for fn, events in jobs]
+        if not all(accepted):
+            return (
+                jsonify({"status": "error", "message": "Servidor ocupado"}),
+                503,
+            )
+        return jsonify({"status": "ok"}), 200
 
-            else:
-                message.update({"status": "seen"})
-                print(f"Message {message_id} was read.")
+    response, status_code = handle_webhook_body(payload)
+    return jsonify(response), status_code
+
+
+def handle_webhook_body(payload: WebhookPayload) -> Tuple[Dict[str, Any], int]:
+    """
+    Procesa todos los estados y mensajes de un webhook de WhatsApp.
+
+    No depende del contexto de Flask, así que puede ejecutarse en los hilos de
+    la cola de trabajo.
+
+    Returns:
+        Tuple[Dict[str, Any], int]: El cuerpo y el código de la respuesta.
+    """
+    failed = False
+
+    if payload.statuses:
+        try:
+            process_statuses(payload.statuses)
+        except Exception as e:
+            logging.error(f"Error al procesar los estados: {e}")
+            failed = True
+
+    for messages in payload.group_messages().values():
+        try:
+            process_message_group(messages)
+        except Exception as e:
+            logging.error(f"Error al recibir el mensaje: {e}")
+            logging.error(f"Mensajes recibidos: {[message.raw for message in messages]}")
+            failed = True
+
+    if failed:
+        # Meta reintenta el webhook; los mensajes ya procesados se descartan
+        # como duplicados.
+        return {"status": "error", "message": "Error interno del servidor"}, 500
+    return {"status": "ok"}, 200
+
+
+def process_statuses(statuses: List[StatusUpdate]) -> None:
+    """Registra en lote los estados (enviado, entregado, leído, fallido)."""
+    message_statuses = {}
+    for status in statuses:
+        message_status = WHATSAPP_STATUSES.get(status.status)
+        if not message_status:
+            continue
 
-            return jsonify({"status": "ok"}), 200
+        # Si un mensaje tiene varios estados en el mismo webhook queda el más avanzado
+        current = message_statuses.get(status.id)
+        if MESSAGE_STATUS_RANK[message_status] > MESSAGE_STATUS_RANK.get(current, 0):
+            message_statuses[status.id] = message_status
 
+    if not message_statuses:
         print("Received a WhatsApp status update.")
-        return jsonify({"status": "ok"}), 200
+        return
 
-    entry = body["entry"][0]
-    changes = entry["changes"][0]
-    value = changes["value"]
-    message = value["messages"][0]
-    from_id = value["metadata"]["phone_number_id"]
+    updated = MessageFirebaseRepository().update_statuses(message_statuses)
+    print(f"{updated} message statuses were updated.")
 
-    try:
-        if is_valid_whatsapp_message(body):
-            print("Starting message processing...")
 
-            if is_reaction_whatsapp_message(message):
-                return jsonify({"status": "ok"}), 200
+# Estados de los webhooks de WhatsApp y cómo se guardan en los mensajes
+WHATSAPP_STATUSES = {
+    "sent": "sent",
+    "delivered": "delivered",
+    "read": "seen",
+    "failed": "failed",
+}
 
-            print("Starting bot creation...")
-            chatbot = get_chatbot_from_number(from_id)
-            print("Bot created successfully.")
-            chatbot.manage_incoming_message(message)
 
-            return jsonify({"status": "ok"}), 200
-        else:
-            return (
-                jsonify({"status": "error", "message": "Not a WhatsApp API event"}),
-                404,
-            )
-    except Exception as e:
-        logging.error(f"Error al recibir el mensaje: {e}")
-        logging.error(f"Body recibido: {body}")
+def process_message_group(messages: List[IncomingMessage]) -> None:
+    """Procesa los mensajes de un mismo contacto hacia un mismo número."""
+    messages = [
+        message
+        for message in messages
+        if not message.is_reaction
+        # Los reintentos de Meta se descartan antes de cualquier trabajo
+        and not message_deduplicator.is_duplicate(message.id)
+    ]
+    if not messages:
+        return
+
+    try:
+        print("Starting bot creation...")
+        chatbot = get_chatbot_from_number(messages[0].phone_number_id)
+        print("Bot created successfully.")
+        chatbot.manage_incoming_messages([message.raw for message in messages])
+    except Exception:
+        for message in messages:
+            message_deduplicator.release(message.id)
+        raise
+
+
+def get_metrics():
+    """Expone los contadores internos del servicio."""
+    metrics = {
+        "dedupe": message_deduplicator.stats(),
+        "contact_cache": contact_resolver.stats(),
+        "tenant_cache": tenant_metadata.stats(),
+        "template_cache": template_catalog.stats(),
+        "history_tail": conversation_tails.stats(),
+        "chatbots": chatbot_registry.stats(),
+        "token_counter": token_accountant.stats(),
+        "graph_api": graph_api_client.stats(),
+    }
+    if webhook_queue:
+        metrics["webhook_queue"] = webhook_queue.stats()
+    metrics["counters"] = counters.stats()
+
+    return jsonify(metrics), 200
+
+
+def invalidate_tenant_metadata():
+    """
+    Descarta los datos en caché de un negocio, por ejemplo al rotar su token.
+
+    Requiere el encabezado X-Invalidation-Secret con TENANT_INVALIDATION_SECRET.
+    Solo limpia la caché de la instancia que recibe la solicitud: en las demás
+    el dato viejo dura hasta TENANT_CACHE_TTL_SECONDS.
+    """
+    secret = request.headers.get("X-Invalidation-Secret", "")
+    if not TENANT_INVALIDATION_SECRET or not hmac.compare_digest(
+        secret.encode("utf-8"), TENANT_INVALIDATION_SECRET.encode("utf-8")
+    ):
+        return jsonify({"status": "error", "message": "No autorizado"}), 403
+
+    body = request.get_json(silent=True) or {}
+    ws_id = body.get("ws_id")
+    if not ws_id:
         return (
-            jsonify({"status": "error", "message": "Error interno del servidor"}),
-            500,
+            jsonify({"status": "error", "message": "El parámetro ws_id es requerido"}),
+            400,
         )
 
+    tenant_metadata.invalidate(ws_id)
+    template_catalog.invalidate(ws_id)
+    return jsonify({"status": "ok"}), 200, CORS_HEADERS
+
+
+def set_webhook_queue(queue: Optional[WorkQueue]) -> None:
+    """Reemplaza la cola del modo asíncrono (None vuelve al modo síncrono)."""
+    global webhook_queue
+    webhook_queue = queue
+
+
+message_deduplicator = MessageDeduplicator(
+    max_size=DEDUPE_MAX_SIZE,
+    ttl_seconds=DEDUPE_TTL_SECONDS,
+    store=(
+        ProcessedMessageFirebaseStore(DEDUPE_TTL_SECONDS)
+        if DEDUPE_PERSISTENT_STORE
+        else None
+    ),
+)
+
+webhook_queue: Optional[WorkQueue] = None
+if WEBHOOK_ASYNC_MODE:
+    webhook_queue = InProcessWorkQueue(
+        workers=WEBHOOK_WORKERS,
+        max_size=WEBHOOK_QUEUE_MAX_SIZE,
+        name="webhook",
+    )
+    webhook_queue.install_shutdown_hooks(WEBHOOK_DRAIN_TIMEOUT_SECONDS)
+
 
 def send_template_message():
     try:
@@ -137,7 +288,7 @@ def send_template_message():
             from_whatsapp_id=from_id, token=token, message=message
         )
 
-        db_content = get_template_message_content(message.template)
+        db_content = get_template_message_content(message.template, from_id)
         MessageFirebaseRepository().create_chat_message(
             from_id,
             message.to_number,
@@ -163,10 +314,29 @@ def send_template_message():
         )
 
 
-def batchify(iterable, batch_size):
-    """Divide un iterable en sublistas de tamaño batch_size."""
-    for i in range(0, len(iterable), batch_size):
-        yield iterable[i : i + batch_size]
+campaign_jobs = CampaignJobService(CampaignSender())
+
+def schedule_campaign(ws_id: str, campaign_id: str) -> bool:
+    """
+    Encola en Cloud Tasks la siguiente parte de la campaña.
+
+    La tarea llama al endpoint de reanudación, que procesa una parte y encola
+    la siguiente. Si la instancia se cae a mitad de una parte, Cloud Tasks
+    reintenta la tarea y esta vuelve a tomar la campaña cuando vence su lease.
+    El token de WhatsApp no va en la tarea: cada parte usa el del negocio.
+    """
+    payload = {"from_id": ws_id, "campaign_id": campaign_id}
+    try:
+        create_task(
+            CAMPAIGN_TASK_URL,
+            json.dumps(payload),
+            delay_seconds=0,
+            queue=CAMPAIGN_TASK_QUEUE,
+        )
+        return True
+    except Exception as e:
+        logging.error(f"No se pudo encolar la campaña {campaign_id}: {e}")
+        return False
 
 
 def send_massive_message():
@@ -176,11 +346,9 @@ def send_massive_message():
     file = request.files["file"]
     if file.filename == "":
         return {"error": "El archivo está vacío"}, 400
-    file_data = pd.read_excel(file, header=None, converters={0: str})
-    users = file_data[0].tolist()
 
     form = request.form
-    required_params = ["from_id", "token"]
+    required_params = ["from_id"]
     for param in required_params:
         if param not in form:
             return (
@@ -191,94 +359,141 @@ def send_massive_message():
             )
 
     from_id = form.get("from_id")
-    token = form.get("token")
+    # El token no se guarda con la campaña ni en sus tareas: se envía con el
+    # del negocio (tenant_metadata)
     message = form.get("message")
     template = form.get("template")
     language_code = form.get("language_code") or "es"
 
-    business_snapshots = db.collection("business").where("ws_id", "==", from_id).get()
-    if not business_snapshots:
-        raise Exception(f"No hay business registrado para {from_id}")
-
-    campaign_ref = business_snapshots[0].reference.collection("campaigns").document()
-    campaign_ref.set(
-        {
-            "users_count": len(users),
-            "created_at": firebase_admin.firestore.firestore.SERVER_TIMESTAMP,
-            "platform": "whatsapp",
-        }
-    )
-
-    messages = []
-    for user in users:
-        user = str(user)
-        
-        if not user.isdigit():
-            continue
-        msg = TemplateMessage(template=template, to_number=user, code=language_code)
-        if not template:
-            msg = TextMessage(number=user, text=message)
-        messages.append(msg)
-
-    def send_msg(msg: WhatsAppMessage):
-        call = send_whatsapp_message(from_id, token, msg)
-        db_content = get_template_message_content(msg.template)
+    # La lista se lee, limpia y guarda por partes antes de cualquier envío
+    try:
+        recipients = RecipientStream(file, file.filename)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
 
-        if not template:
-            db_content = msg.text
+    db_content = (
+        get_template_message_content(template, from_id) if template else message
+    )
 
-        contact_ref = get_or_create_contact(msg.to_number, from_id)
-        conversation_ref = get_or_create_conversation(contact_ref)
+    try:
+        campaign_id = campaign_jobs.create(
+            from_id,
+            recipients,
+            content=db_content,
+            template=template,
+            message=message,
+            language_code=language_code,
+            recipient_stats=recipients.to_dict,
+        )
+    except Exception as e:
+        # La campaña queda como "failed" con el error (ver CampaignJobService.create)
+        logging.error(f"Error al cargar los destinatarios de la campaña: {e}")
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "No se pudieron cargar los destinatarios",
+                    "recipients": recipients.to_dict(),
+                }
+            ),
+            500,
+        )
+    if not campaign_id:
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "El archivo no tiene números válidos",
+                    "recipients": recipients.to_dict(),
+                }
+            ),
+            400,
+        )
 
-        MessageFirebaseRepository().create_chat_message(
-            conversation_ref=conversation_ref,
-            contact_ref=contact_ref,
-            ws_id=from_id,
-            phone_number=msg.to_number,
-            message=db_content,
-            wa_id=call["body"]["messages"][0]["id"],
+    if not schedule_campaign(from_id, campaign_id):
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "No se pudo encolar la campaña, reanúdela más tarde",
+                    "campaign_id": campaign_id,
+                }
+            ),
+            503,
+            CORS_HEADERS,
         )
 
-        contact_ref.update(
+    return (
+        jsonify(
             {
-                "last_message": {
-                    "content": db_content,
-                    "created_at": firebase_admin.firestore.firestore.SERVER_TIMESTAMP,
-                }
+                "status": "accepted",
+                "message": f"Campaña creada para {recipients.accepted} usuarios",
+                "campaign_id": campaign_id,
+                "recipients": recipients.to_dict(),
             }
-        )
+        ),
+        202,
+        CORS_HEADERS,
+    )
 
-        campaign_ref.update(
-            {"sent_messages": firebase_admin.firestore.firestore.Increment(1)}
+
+def get_campaign_status():
+    from_id = request.args.get("from_id")
+    campaign_id = request.args.get("campaign_id")
+    if not from_id or not campaign_id:
+        return (
+            jsonify({"status": "error", "message": "Faltan parámetros requeridos"}),
+            400,
         )
 
-        return call
+    status = campaign_jobs.get_status(from_id, campaign_id)
+    if not status:
+        return jsonify({"status": "error", "message": "Campaña no encontrada"}), 404
+
+    return jsonify(status), 200, CORS_HEADERS
 
-    batch_size = 20
 
-    def send_message_batch(batch):
-        results = []
-        with ThreadPoolExecutor(max_workers=batch_size) as executor:
-            results = list(executor.map(lambda msg: send_msg(msg), batch))
-        return results
+def resume_campaign():
+    """
+    Procesa la siguiente parte de una campaña y encola la que sigue.
 
-    all_results = []
-    for batch in batchify(messages, batch_size):
-        batch_results = send_message_batch(batch)
-        all_results.extend(batch_results)
-        time.sleep(0.02)
+    Es el destino de las tareas de Cloud Tasks de cada campaña y también se
+    puede llamar a mano para reanudar una interrumpida. Una respuesta que no
+    es 2xx hace que Cloud Tasks reintente la tarea más tarde.
+    """
+    body = request.get_json(silent=True) or {}
+    from_id = body.get("from_id")
+    campaign_id = body.get("campaign_id")
+    if not from_id or not campaign_id:
+        return (
+            jsonify({"status": "error", "message": "Faltan parámetros requeridos"}),
+            400,
+        )
 
-    success_requests = sum(1 for result in all_results if result["status"] == "success")
-    error_requests = len(users) - success_requests
+    try:
+        status = campaign_jobs.run(from_id, campaign_id, max_chunks=1)
+    except Exception as e:
+        logging.error(f"Error al procesar la campaña {campaign_id}: {e}")
+        return jsonify({"status": "error", "message": "Error interno del servidor"}), 500
+
+    if status is None:
+        campaign = campaign_jobs.get_status(from_id, campaign_id)
+        if not campaign:
+            return jsonify({"status": "error", "message": "Campaña no encontrada"}), 404
+        if campaign["status"] in CAMPAIGN_FINAL_STATUSES:
+            return jsonify({"status": campaign["status"], "campaign_id": campaign_id}), 200
+        # Otra instancia tiene el lease; la tarea se reintenta cuando venza
+        return (
+            jsonify({"status": "error", "message": "La campaña se está procesando"}),
+            409,
+        )
+
+    if status == CAMPAIGN_PENDING and not schedule_campaign(from_id, campaign_id):
+        # La parte ya quedó guardada; al reintentar se procesa la siguiente
+        return jsonify({"status": "error", "message": "No se pudo encolar la campaña"}), 500
 
     return (
-        jsonify(
-            {
-                "status": "ok",
-                "message": f"Mensajes enviados con éxito a {success_requests} usuarios, {error_requests} errores",
-                "details": all_results,
-            }
-        ),
+        jsonify({"status": status, "campaign_id": campaign_id}),
         200,
         CORS_HEADERS,
     )
@@ -304,13 +519,12 @@ def send_message():
         )
 
         logging.info(call)
-        contact_ref = get_or_create_contact(to_number, from_id)
-        conversation_ref = get_or_create_conversation(contact_ref)
+        resolution = contact_resolver.resolve(from_id, to_number)
 
         if call["status"] == "success":
             MessageFirebaseRepository().create_chat_message(
-                conversation_ref=conversation_ref,
-                contact_ref=contact_ref,
+                conversation_ref=resolution.conversation_ref,
+                contact_ref=resolution.contact_ref,
                 ws_id=from_id,
                 phone_number=to_number,
                 message=message.text,
@@ -328,28 +542,6 @@ def send_message():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-## -------- TODO: ##
-def get_template_message_content(template):
-    template_messages = {
-        "gano_excel_1": """🌟 ¡Gran Lanzamiento de la Línea Fit JM! 🌟
-¡Hola! 😊 Hoy queremos compartir contigo una excelente noticia: estrenamos una nueva línea diseñada especialmente para facilitar tu proceso de compra y ofrecerte los mejores productos saludables.
-
-🎉 Además, ¡tenemos promociones exclusivas por lanzamiento!
-Escríbele a Jorge, nuestro asesor, y descubre cómo puedes aprovechar estas ofertas hoy mismo.
-
-📲 ¡Estamos aquí para ayudarte a dar el siguiente paso hacia un estilo de vida más saludable!""",
-        "gano_excel_2": """¡Este año sí vas a cumplir las promesas de año nuevo! ¿Cierto? 🧐
-
-Si pediste por salud y vida, aquí llegó la señal divina 🙏 Que no te falte el café en cada mañana para iniciar con energía, fusionado con Ganoderma para una vida larga y prospera. ☕ Si diciembre te dejó apretado, relájate. 😌 Porque si llevas 2 o más cajas de nuestro café 3 en 1 o clásico, vas a tener tremendo descuento en tú compra. 😱 ¡Estamos botados! 
-La promo es hasta el 15 de enero. 🛒""",
-        "ano_nuevo": """☕✨ ¡Feliz Año Nuevo! ✨☕
-
-        Si llevas 2 o más cajas de nuestro café 3 en 1 o clásico, te damos un precio especial. 
-        La promo es hasta el 15 de enero. 🏃‍♀""",
-        "hola": """Hola""",
-    }
-
-    if template in template_messages:
-        return template_messages[template]
-    else:
-        raise Exception("No se encontró el contenido del template solicitado.")
+def get_template_message_content(template, ws_id: Optional[str] = None) -> str:
+    """Contenido de la plantilla para guardar en la conversación."""
+    return template_catalog.get_content(ws_id, template)
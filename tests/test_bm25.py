@@ -0,0 +1,55 @@
+from src.common.utils.bm25 import BM25Index, jaccard, tokenize
+
+
+def test_tokenize_drops_accents_case_and_stopwords():
+    assert tokenize("¿Cuál es el HORARIO de atención?") == ["cual", "horario", "atencion"]
+
+
+def test_search_ranks_matching_documents_first():
+    index = BM25Index(
+        [
+            "Horario de atención de lunes a viernes",
+            "Precios del plan mensual",
+            "El plan anual incluye soporte",
+        ]
+    )
+
+    results = index.search("¿cuál es el horario?", k=3)
+
+    assert [position for position, _ in results] == [0]
+    assert results[0][1] > 0
+
+
+def test_search_prefers_rare_terms():
+    index = BM25Index(
+        [
+            "plan mensual",
+            "plan anual",
+            "plan empresarial con soporte",
+        ]
+    )
+
+    results = index.search("plan soporte", k=3)
+
+    assert results[0][0] == 2
+    assert len(results) == 3
+
+
+def test_search_limits_results_and_ignores_unknown_terms():
+    index = BM25Index(["uno dos", "dos tres", "tres cuatro"])
+
+    assert len(index.search("dos tres", k=1)) == 1
+    assert index.search("inexistente", k=5) == []
+    assert len(index) == 3
+
+
+def test_empty_index():
+    index = BM25Index([])
+
+    assert len(index) == 0
+    assert index.search("horario", k=5) == []
+
+
+def test_jaccard():
+    assert jaccard({"a", "b"}, {"b", "c"}) == 1 / 3
+    assert jaccard(set(), {"a"}) == 0.0
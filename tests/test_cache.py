@@ -0,0 +1,57 @@
+import pytest
+
+from src.common.utils import cache
+from src.common.utils.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_get_expires_entries(clock):
+    ttl_cache = TTLCache(max_size=10, ttl_seconds=5)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2, ttl_seconds=20)
+
+    clock[0] += 10
+
+    assert ttl_cache.get("a") is None
+    assert ttl_cache.get("b") == 2
+    assert ttl_cache.stats()["size"] == 1
+
+
+def test_set_evicts_least_recently_used():
+    ttl_cache = TTLCache(max_size=2, ttl_seconds=60)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    ttl_cache.get("a")
+
+    ttl_cache.set("c", 3)
+
+    assert ttl_cache.get("b") is None
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("c") == 3
+    assert ttl_cache.evictions == 1
+
+
+def test_add_only_stores_missing_or_expired_keys(clock):
+    ttl_cache = TTLCache(max_size=10, ttl_seconds=5)
+
+    assert ttl_cache.add("a")
+    assert not ttl_cache.add("a")
+    clock[0] += 10
+    assert ttl_cache.add("a")
+
+
+def test_stats_count_hits_and_misses():
+    ttl_cache = TTLCache(max_size=10, ttl_seconds=60)
+    ttl_cache.set("a", 1)
+
+    ttl_cache.get("a")
+    ttl_cache.get("b")
+
+    stats = ttl_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
@@ -0,0 +1,173 @@
+import datetime
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+pytest.importorskip("aiohttp")
+pytest.importorskip("tiktoken")
+
+from src.services import campaign_jobs
+from src.services.campaign_jobs import CampaignJobService, _recipient_update
+from src.services.campaign_sender import CampaignResult
+
+
+class FakeReference:
+    def __init__(self, path):
+        self.path = path
+
+    def collection(self, name):
+        return FakeRecipients(self.path, RECIPIENTS)
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self.reference = FakeReference(f"recipients/{data['phone_number']}")
+        self._data = data
+
+    def get(self, field):
+        return self._data.get(field)
+
+
+class FakeRecipients:
+    def __init__(self, path, recipients, start=0, limit=None):
+        self.path = path
+        self.recipients = recipients
+        self.start = start
+        self.size = limit
+
+    def where(self, field, op, value):
+        return FakeRecipients(self.path, self.recipients, value, self.size)
+
+    def document(self, doc_id):
+        return FakeReference(f"{self.path}/{doc_id}")
+
+    def order_by(self, field):
+        return self
+
+    def limit(self, size):
+        return FakeRecipients(self.path, self.recipients, self.start, size)
+
+    def get(self):
+        return [
+            FakeSnapshot(data) for data in self.recipients if data["index"] >= self.start
+        ][: self.size]
+
+
+class FakeBatch:
+    def __init__(self):
+        self.updates = {}
+        self.sets = []
+        self.committed = False
+
+    def update(self, reference, data):
+        self.updates[reference.path] = data
+
+    def set(self, reference, data, merge=False):
+        self.sets.append(data)
+
+    def commit(self):
+        self.committed = True
+
+
+class FakeDb:
+    def __init__(self):
+        self.batches = []
+
+    def batch(self):
+        batch = FakeBatch()
+        self.batches.append(batch)
+        return batch
+
+
+class FakeSender:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, ws_id, token, messages):
+        self.sent.append([message.to_number for message in messages])
+        results = [
+            {"status": "success", "number": message.to_number, "wa_id": f"wamid.{i}"}
+            for i, message in enumerate(messages)
+        ]
+        return CampaignResult(len(messages), 0, 1.0, 1, 0, results=results)
+
+
+RECIPIENTS = [
+    {"phone_number": "573000000000", "index": 0, "status": "sent"},
+    {"phone_number": "573000000001", "index": 1, "status": "pending"},
+    {"phone_number": "573000000002", "index": 2, "status": "pending"},
+]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDb()
+    monkeypatch.setattr(campaign_jobs, "db", db)
+    return db
+
+
+def _service(chunk_size):
+    service = CampaignJobService(FakeSender(), chunk_size=chunk_size)
+    service._persist_messages = lambda campaign, messages, calls: {}
+    return service
+
+
+def test_chunk_size_fits_in_one_batch():
+    service = CampaignJobService(FakeSender(), chunk_size=10_000)
+
+    assert service.chunk_size == campaign_jobs.FIRESTORE_BATCH_LIMIT - 2
+
+
+def test_process_chunk_skips_sent_recipients_and_saves_checkpoint(db):
+    service = _service(chunk_size=2)
+    campaign_ref = FakeReference("campaigns/campana")
+    campaign = {"ws_id": "ws", "next_index": 0, "message": "Hola", "content": "Hola"}
+
+    assert service._process_chunk(campaign_ref, campaign, "token")
+
+    assert service.sender.sent == [["573000000001"]]
+    updates = db.batches[0].updates
+    assert db.batches[0].committed
+    assert updates["recipients/573000000001"] == {"status": "sent", "wa_id": "wamid.0"}
+    assert "recipients/573000000000" not in updates
+    assert updates["campaigns/campana"]["next_index"] == 2
+    assert campaign["next_index"] == 2
+    # El shard de los contadores va en el mismo lote que el punto de control
+    [counter_increments] = db.batches[0].sets
+    assert counter_increments["sent_messages"].value == 1
+
+    # La última parte no está llena: la campaña termina ahí
+    assert not service._process_chunk(campaign_ref, campaign, "token")
+    assert service.sender.sent[-1] == ["573000000002"]
+    assert campaign["next_index"] == 3
+    assert not service._process_chunk(campaign_ref, campaign, "token")
+
+
+@pytest.mark.parametrize(
+    "campaign, claimable",
+    [
+        ({"status": "preparing"}, False),
+        ({"status": "completed"}, False),
+        ({"status": "failed"}, False),
+        ({"status": "pending", "lease_expires_at": None}, True),
+        ({"status": "running", "lease_expires_at": datetime.timedelta(minutes=5)}, False),
+        ({"status": "running", "lease_expires_at": -datetime.timedelta(minutes=5)}, True),
+    ],
+)
+def test_is_claimable(campaign, claimable):
+    lease = campaign.get("lease_expires_at")
+    if lease is not None:
+        campaign = {**campaign, "lease_expires_at": campaign_jobs._now() + lease}
+
+    assert CampaignJobService(FakeSender())._is_claimable(campaign) is claimable
+
+
+def test_recipient_update():
+    assert _recipient_update({"status": "success", "wa_id": "wamid.1"}) == {
+        "status": "sent",
+        "wa_id": "wamid.1",
+    }
+    assert _recipient_update({"status": "error", "message": "sin saldo"}) == {
+        "status": "failed",
+        "error": "sin saldo",
+    }
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("requests")
+
+from src.services.campaign_sender import AdaptiveConcurrency, TokenBucket
+
+
+def test_token_bucket_allows_a_burst_then_spaces_sends():
+    bucket = TokenBucket(rate=10, burst=3)
+
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("src.services.campaign_sender.time.monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=10, burst=2)
+    bucket.reserve()
+    bucket.reserve()
+
+    now[0] += 0.5
+
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() > 0
+
+
+def test_adaptive_concurrency_grows_and_halves_within_bounds():
+    concurrency = AdaptiveConcurrency(initial=4, minimum=2, maximum=5)
+
+    for _ in range(100):
+        concurrency.on_success()
+    assert concurrency.limit == 5
+
+    concurrency.on_throttled()
+    assert concurrency.limit == 2.5
+    concurrency.on_throttled()
+    concurrency.on_throttled()
+    assert concurrency.limit == 2
+    assert concurrency.throttled == 3
+
+
+def test_adaptive_concurrency_limits_sends_in_flight():
+    concurrency = AdaptiveConcurrency(initial=2, minimum=1, maximum=2)
+    peak = 0
+
+    async def send():
+        nonlocal peak
+        async with concurrency:
+            peak = max(peak, concurrency.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(send() for _ in range(6)))
+
+    asyncio.run(main())
+
+    assert peak == 2
+    assert concurrency.in_flight == 0
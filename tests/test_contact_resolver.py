@@ -0,0 +1,163 @@
+import itertools
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+from src.data.sources.firebase import contact_resolver as resolver_module
+from src.data.sources.firebase.contact_resolver import ContactResolution, ContactResolver
+
+_ids = itertools.count()
+
+
+class FakeReference:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def collection(self, name):
+        return FakeCollection(self.db, f"{self.path}/{name}")
+
+    def __eq__(self, other):
+        return isinstance(other, FakeReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self._data = data
+
+    def get(self, field):
+        return self._data.get(field)
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    def __init__(self, db, matches, filters=()):
+        self.db = db
+        self.matches = matches
+        self.filters = filters
+
+    def where(self, field, op, value):
+        return FakeQuery(self.db, self.matches, self.filters + ((field, op, value),))
+
+    def get(self):
+        self.db.queries.append(self.filters)
+        return [
+            FakeSnapshot(FakeReference(self.db, path), data)
+            for path, data in self.db.documents.items()
+            if self.matches(path) and all(
+                data.get(field) == value if op == "==" else data.get(field) in value
+                for field, op, value in self.filters
+            )
+        ]
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, path):
+        super().__init__(db, lambda doc_path: doc_path.rsplit("/", 1)[0] == path)
+        self.path = path
+
+    def document(self, doc_id=None):
+        return FakeReference(self.db, f"{self.path}/{doc_id or next(_ids)}")
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, reference, data):
+        self.writes.append((reference.path, data))
+
+    def commit(self):
+        self.db.batches.append(len(self.writes))
+        self.db.documents.update(self.writes)
+
+
+class FakeDb:
+    def __init__(self):
+        self.documents = {}
+        self.queries = []
+        self.batches = []
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def collection_group(self, name):
+        return FakeQuery(
+            self, lambda doc_path: doc_path.rsplit("/", 2)[-2] == name
+        )
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+class FakeTenantMetadata:
+    def __init__(self, business_ref):
+        self.business_ref = business_ref
+
+    def get_business_ref(self, ws_id):
+        return self.business_ref
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDb()
+    business_ref = FakeReference(db, "business/negocio")
+    monkeypatch.setattr(resolver_module, "db", db)
+    monkeypatch.setattr(
+        resolver_module, "tenant_metadata", FakeTenantMetadata(business_ref)
+    )
+    return db
+
+
+def test_resolve_many_uses_cached_resolutions(db):
+    resolver = ContactResolver(max_size=10, ttl_seconds=60)
+    cached = ContactResolution("contacto", "conversacion", {})
+    resolver._cache.set(("ws", "573001234567"), cached)
+
+    resolutions = resolver.resolve_many("ws", ["573001234567", "573001234567"])
+
+    assert resolutions == {"573001234567": cached}
+    assert db.queries == []
+
+
+def test_resolve_many_finds_and_creates_in_bulk(db):
+    contact_path = "business/negocio/contacts/existente"
+    db.documents[contact_path] = {"phone_number": "573000000000", "ws_id": "ws"}
+    db.documents["conversations/en_curso"] = {
+        "contact_ref": FakeReference(db, contact_path),
+        "status": "ongoing",
+    }
+    new_numbers = [f"57301{i:07d}" for i in range(40)]
+    resolver = ContactResolver(max_size=100, ttl_seconds=60)
+
+    resolutions = resolver.resolve_many("ws", ["573000000000"] + new_numbers)
+
+    existing = resolutions["573000000000"]
+    assert existing.contact_ref.path == contact_path
+    assert existing.conversation_ref.path == "conversations/en_curso"
+    # 41 números: dos consultas `in` de contactos y una de conversaciones
+    assert len(db.queries) == 3
+    # 40 contactos y 40 conversaciones nuevos en un solo lote
+    assert db.batches == [80]
+    created = resolutions[new_numbers[0]]
+    assert db.documents[created.contact_ref.path] == {
+        "phone_number": new_numbers[0],
+        "ws_id": "ws",
+    }
+    assert (
+        db.documents[created.conversation_ref.path]["contact_ref"]
+        == created.contact_ref
+    )
+
+    assert resolver.resolve_many("ws", new_numbers) == {
+        number: resolutions[number] for number in new_numbers
+    }
+    assert len(db.queries) == 3
@@ -0,0 +1,61 @@
+import pytest
+
+from src.common.utils.docstore_file import DocstoreFile, write_docstore
+
+RECORDS = [
+    {"id": "a", "page_content": "Horario de atención", "metadata": {"source": "faq.pdf"}},
+    {"id": "b", "page_content": "Precios en €", "metadata": {}},
+    {"id": "c", "page_content": "", "metadata": {"page": 3}},
+]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "docstore.bin")
+
+    assert write_docstore(path, RECORDS) == len(RECORDS)
+
+    docstore = DocstoreFile(path)
+    try:
+        assert len(docstore) == len(RECORDS)
+        assert docstore.get(1) == RECORDS[1]
+        assert list(docstore) == RECORDS
+    finally:
+        docstore.close()
+
+
+def test_get_out_of_range(tmp_path):
+    path = str(tmp_path / "docstore.bin")
+    write_docstore(path, RECORDS)
+
+    docstore = DocstoreFile(path)
+    try:
+        with pytest.raises(IndexError):
+            docstore.get(len(RECORDS))
+        with pytest.raises(IndexError):
+            docstore.get(-1)
+    finally:
+        docstore.close()
+
+
+def test_empty_docstore(tmp_path):
+    path = str(tmp_path / "docstore.bin")
+    write_docstore(path, [])
+
+    docstore = DocstoreFile(path)
+    try:
+        assert len(docstore) == 0
+        assert list(docstore) == []
+    finally:
+        docstore.close()
+
+
+def test_rejects_unknown_files(tmp_path):
+    path = tmp_path / "docstore.bin"
+    path.write_bytes(b"not a docstore")
+    with pytest.raises(ValueError):
+        DocstoreFile(str(path))
+
+    empty = tmp_path / "empty.bin"
+    empty.write_bytes(b"")
+    with pytest.raises(ValueError):
+        DocstoreFile(str(empty))
@@ -0,0 +1,51 @@
+import math
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from src.common.utils.embeddings import (
+    HashingEmbeddings,
+    get_embeddings,
+    index_path_for_backend,
+)
+
+
+def test_hashing_embeddings_are_deterministic():
+    first = HashingEmbeddings(dimension=64)
+    second = HashingEmbeddings(dimension=64)
+
+    assert first.embed_query("Horario de atención") == second.embed_query(
+        "Horario de atención"
+    )
+    assert first.embed_documents(["uno", "dos"]) == [
+        first.embed_query("uno"),
+        first.embed_query("dos"),
+    ]
+
+
+def test_hashing_embeddings_are_normalized():
+    vector = HashingEmbeddings(dimension=64).embed_query("Precios del plan mensual")
+
+    assert len(vector) == 64
+    assert math.isclose(math.sqrt(sum(v * v for v in vector)), 1.0)
+
+
+def test_hashing_embeddings_ignore_accents_and_case():
+    embeddings = HashingEmbeddings(dimension=64)
+
+    assert embeddings.embed_query("ATENCIÓN") == embeddings.embed_query("atencion")
+    assert embeddings.embed_query("atención") != embeddings.embed_query("precios")
+
+
+def test_get_embeddings():
+    assert get_embeddings("hashing") is get_embeddings("hashing")
+    with pytest.raises(ValueError):
+        get_embeddings("unknown")
+
+
+def test_index_path_for_backend():
+    assert index_path_for_backend("vectorstores/bot", "openai") == "vectorstores/bot"
+    assert index_path_for_backend("vectorstores/bot", "hashing").endswith(
+        "backends/hashing"
+    )
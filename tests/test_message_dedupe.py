@@ -0,0 +1,62 @@
+from src.common.utils.message_dedupe import MessageDeduplicator, ProcessedMessageStore
+
+
+class MemoryStore(ProcessedMessageStore):
+    def __init__(self, processed=()):
+        self.processed = set(processed)
+
+    def claim(self, message_id):
+        if message_id in self.processed:
+            return False
+        self.processed.add(message_id)
+        return True
+
+    def release(self, message_id):
+        self.processed.discard(message_id)
+
+
+class FailingStore(ProcessedMessageStore):
+    def claim(self, message_id):
+        raise RuntimeError("sin conexión")
+
+    def release(self, message_id):
+        raise RuntimeError("sin conexión")
+
+
+def test_drops_redelivered_messages():
+    deduplicator = MessageDeduplicator(max_size=10, ttl_seconds=60)
+
+    assert not deduplicator.is_duplicate("wamid.1")
+    assert deduplicator.is_duplicate("wamid.1")
+    assert not deduplicator.is_duplicate(None)
+    assert deduplicator.stats()["duplicates_dropped"] == 1
+
+
+def test_store_catches_messages_processed_elsewhere():
+    deduplicator = MessageDeduplicator(
+        max_size=10, ttl_seconds=60, store=MemoryStore(["wamid.1"])
+    )
+
+    assert deduplicator.is_duplicate("wamid.1")
+    assert not deduplicator.is_duplicate("wamid.2")
+
+
+def test_release_accepts_the_retry():
+    store = MemoryStore()
+    deduplicator = MessageDeduplicator(max_size=10, ttl_seconds=60, store=store)
+    deduplicator.is_duplicate("wamid.1")
+
+    deduplicator.release("wamid.1")
+
+    assert "wamid.1" not in store.processed
+    assert not deduplicator.is_duplicate("wamid.1")
+
+
+def test_store_errors_let_the_message_through():
+    deduplicator = MessageDeduplicator(
+        max_size=10, ttl_seconds=60, store=FailingStore()
+    )
+
+    assert not deduplicator.is_duplicate("wamid.1")
+    deduplicator.release("wamid.1")
+    assert not deduplicator.is_duplicate("wamid.1")
@@ -0,0 +1,80 @@
+import pytest
+
+pytest.importorskip("firebase_admin")
+pytest.importorskip("tiktoken")
+
+from src.data.sources.firebase import message_impl
+from src.data.sources.firebase.message_impl import (
+    MESSAGE_STATUS_RANK,
+    MessageFirebaseRepository,
+    _campaign_counter_fields,
+    _status_advances,
+)
+
+
+def test_status_rank_order():
+    assert sorted(MESSAGE_STATUS_RANK, key=MESSAGE_STATUS_RANK.get) == [
+        "sent",
+        "delivered",
+        "seen",
+        "failed",
+    ]
+
+
+@pytest.mark.parametrize(
+    "current, status, advances",
+    [
+        (None, "sent", True),
+        ("sent", "delivered", True),
+        ("delivered", "seen", True),
+        ("seen", "delivered", False),
+        ("seen", "seen", False),
+        ("delivered", "failed", True),
+        ("failed", "seen", False),
+    ],
+)
+def test_status_never_goes_back(current, status, advances):
+    assert _status_advances(current, status) is advances
+
+
+@pytest.mark.parametrize(
+    "previous, status, fields",
+    [
+        ("sent", "delivered", ["delivered_messages"]),
+        ("sent", "seen", ["delivered_messages", "read_messages"]),
+        ("delivered", "seen", ["read_messages"]),
+        ("sent", "failed", ["undelivered_messages"]),
+        (None, "sent", []),
+    ],
+)
+def test_campaign_counter_fields(previous, status, fields):
+    assert _campaign_counter_fields(previous, status) == fields
+
+
+def test_token_counts_count_each_content_once(monkeypatch):
+    counted = []
+
+    def count_tokens_batch(texts):
+        counted.append(list(texts))
+        return [len(text.split()) for text in texts]
+
+    monkeypatch.setattr(message_impl, "count_tokens_batch", count_tokens_batch)
+    messages = [
+        {"content": "Hola, tenemos una promoción"},
+        {"content": "Hola, tenemos una promoción"},
+        {"content": "Gracias"},
+    ]
+
+    MessageFirebaseRepository._set_token_counts(messages, deferred=False)
+
+    assert counted == [["Hola, tenemos una promoción", "Gracias"]]
+    assert [data["tokens"] for data in messages] == [4, 4, 1]
+
+
+def test_deferred_token_counts_are_left_for_later(monkeypatch):
+    monkeypatch.setattr(message_impl, "count_tokens_batch", pytest.fail)
+    messages = [{"content": "Hola"}]
+
+    MessageFirebaseRepository._set_token_counts(messages, deferred=True)
+
+    assert "tokens" not in messages[0]
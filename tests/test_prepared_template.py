@@ -0,0 +1,56 @@
+import json
+
+from src.common.whatsapp.models.models import PreparedTemplate, TemplateMessage
+
+
+def test_render_matches_template_message():
+    prepared = PreparedTemplate("hola", "es")
+
+    rendered = prepared.render("573001234567")
+
+    assert rendered == TemplateMessage("573001234567", "hola", "es").create_message()
+
+
+def test_render_fills_body_parameters():
+    prepared = PreparedTemplate("promo", "en", body_parameters=True)
+
+    parameters = ["Ana", {"type": "text", "text": "10%"}]
+
+    payload = json.loads(prepared.render("573001234567", parameters))
+
+    assert payload["to"] == "573001234567"
+    assert payload["template"]["language"] == {"code": "en"}
+    assert payload["template"]["components"] == [
+        {
+            "type": "body",
+            "parameters": [
+                {"type": "text", "text": "Ana"},
+                {"type": "text", "text": "10%"},
+            ],
+        }
+    ]
+
+
+def test_render_replaces_body_of_catalog_components():
+    header = {"type": "header", "parameters": []}
+    prepared = PreparedTemplate(
+        "promo",
+        components=[header, {"type": "body", "parameters": ["viejo"]}],
+        body_parameters=True,
+    )
+
+    payload = json.loads(prepared.render("573001234567", [5]))
+
+    assert payload["template"]["components"] == [
+        header,
+        {"type": "body", "parameters": [{"type": "text", "text": "5"}]},
+    ]
+
+
+def test_render_escapes_values():
+    prepared = PreparedTemplate("promo", body_parameters=True)
+
+    payload = json.loads(prepared.render('57"300', ['dice "hola"']))
+
+    assert payload["to"] == '57"300'
+    assert payload["template"]["components"][0]["parameters"][0]["text"] == 'dice "hola"'
@@ -0,0 +1,55 @@
+import io
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+openpyxl = pytest.importorskip("openpyxl")
+
+from src.common.utils.recipients import RecipientStream, clean_phone_numbers
+
+
+def test_clean_phone_numbers_normalizes_validates_and_dedupes():
+    numbers = pd.Series(
+        ["+57 300 123 4567", "3001234567", "300-765-4321", "3001234567.0", "123", None]
+    )
+
+    phone_numbers, rejected, duplicates = clean_phone_numbers(numbers)
+
+    assert phone_numbers == ["573001234567", "573007654321"]
+    assert rejected == 2
+    assert duplicates == 2
+
+
+def test_empty_csv_has_no_recipients():
+    recipients = RecipientStream(io.BytesIO(b""), "numeros.csv")
+
+    assert list(recipients) == []
+    assert recipients.to_dict() == {"accepted": 0, "rejected": 0, "duplicates": 0}
+
+
+def test_stream_dedupes_across_chunks():
+    file = io.BytesIO(b"3001234567\n3007654321\n12\n+57 300 123 4567\n3001112222\n")
+
+    recipients = RecipientStream(file, "numeros.csv", chunk_size=2)
+
+    assert list(recipients) == ["573001234567", "573007654321", "573001112222"]
+    assert recipients.to_dict() == {"accepted": 3, "rejected": 1, "duplicates": 1}
+
+
+def test_stream_reads_xlsx_by_chunks():
+    workbook = openpyxl.Workbook()
+    for number in [3001234567, "3007654321", 3001234567]:
+        workbook.active.append([number])
+    file = io.BytesIO()
+    workbook.save(file)
+    file.seek(0)
+
+    recipients = RecipientStream(file, "numeros.xlsx", chunk_size=2)
+
+    assert list(recipients) == ["573001234567", "573007654321"]
+    assert recipients.duplicates == 1
+
+
+def test_stream_rejects_unsupported_files():
+    with pytest.raises(ValueError):
+        RecipientStream(io.BytesIO(b""), "numeros.txt")
@@ -0,0 +1,95 @@
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+pytest.importorskip("tiktoken")
+
+from src.managers import vector_store_manager
+from src.managers.vector_store_manager import VectorStoreManager
+
+
+@pytest.fixture(autouse=True)
+def word_token_counts(monkeypatch):
+    # Una palabra por token, para no depender del codificador de tiktoken
+    monkeypatch.setattr(
+        vector_store_manager,
+        "count_tokens_batch",
+        lambda texts: [len(text.split()) for text in texts],
+    )
+
+
+def test_irrelevant_chunk_is_filtered():
+    # Cosenos típicos de ada-002: lo que no tiene relación sigue cerca de 0.7
+    vector_scores = {
+        "Horarios de atención: lunes a viernes de 8 a 18": 0.86,
+        "Precios del plan mensual y anual": 0.81,
+        "Receta tradicional de arepas con queso": 0.70,
+    }
+    lexical_scores = {"Horarios de atención: lunes a viernes de 8 a 18": 7.2}
+
+    candidates = VectorStoreManager._fuse(vector_scores, lexical_scores)
+    context = VectorStoreManager._select(candidates, token_budget=1500)
+
+    assert context.sections == (
+        "Horarios de atención: lunes a viernes de 8 a 18",
+        "Precios del plan mensual y anual",
+    )
+
+
+def test_fuse_scores_are_relative_to_the_candidates():
+    candidates = dict(VectorStoreManager._fuse({"a": 0.9, "b": 0.8}, {"b": 3.0, "c": 1.0}))
+
+    assert candidates["a"] == pytest.approx(0.6)
+    assert candidates["b"] == pytest.approx(0.4)
+    assert candidates["c"] == pytest.approx(0.0)
+
+
+def test_select_stops_at_the_token_budget():
+    candidates = [
+        ("horario lunes viernes", 0.9),
+        ("precios plan mensual", 0.8),
+        ("soporte técnico correo", 0.7),
+    ]
+
+    context = VectorStoreManager._select(candidates, token_budget=6)
+
+    assert context.sections == ("horario lunes viernes", "precios plan mensual")
+    assert context.tokens == 6
+    assert context.candidates == 3
+    assert context.candidate_tokens == 9
+
+
+def test_select_drops_candidates_below_the_threshold():
+    threshold = vector_store_manager.RETRIEVAL_SCORE_THRESHOLD
+    candidates = [("horario lunes viernes", threshold), ("precios plan", threshold - 0.01)]
+
+    context = VectorStoreManager._select(candidates, token_budget=100)
+
+    assert context.sections == ("horario lunes viernes",)
+
+
+def test_select_dedupes_overlapping_sections():
+    candidates = [
+        ("horario atención lunes viernes", 0.9),
+        ("horario atención lunes viernes sábados", 0.85),
+        ("precios plan mensual", 0.6),
+    ]
+
+    context = VectorStoreManager._select(candidates, token_budget=100)
+
+    assert context.sections == ("horario atención lunes viernes", "precios plan mensual")
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["¿Cuál es el precio?", "cuál es el precio", "  CUÁL   es el precio?? ", "Cuál es el precio."],
+)
+def test_normalize_query(query):
+    assert vector_store_manager.normalize_query(query) == "cuál es el precio"
+
+
+def test_normalize_query_keeps_distinct_queries_apart():
+    assert vector_store_manager.normalize_query("precio plan") != (
+        vector_store_manager.normalize_query("precio plan anual")
+    )
+    assert vector_store_manager.normalize_query(None) == ""
@@ -0,0 +1,68 @@
+from src.common.whatsapp.models.webhook_models import WebhookPayload
+
+
+def _change(phone_number_id, messages=(), statuses=()):
+    return {
+        "value": {
+            "metadata": {"phone_number_id": phone_number_id},
+            "messages": list(messages),
+            "statuses": list(statuses),
+        }
+    }
+
+
+def test_from_dict_reads_every_entry_and_change():
+    body = {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {
+                "changes": [
+                    _change("negocio_1", messages=[{"id": "a", "from": "57300"}]),
+                    _change("negocio_2", statuses=[{"id": "b", "status": "read"}]),
+                ]
+            },
+            {"changes": [_change("negocio_1", messages=[{"id": "c", "from": "57301"}])]},
+        ],
+    }
+
+    payload = WebhookPayload.from_dict(body)
+
+    assert [message.id for message in payload.messages] == ["a", "c"]
+    assert [status.phone_number_id for status in payload.statuses] == ["negocio_2"]
+
+
+def test_from_dict_ignores_invalid_bodies():
+    assert WebhookPayload.from_dict(None).is_empty()
+    assert WebhookPayload.from_dict({"entry": []}).is_empty()
+
+
+def test_group_messages_by_business_and_contact_in_timestamp_order():
+    body = {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {
+                "changes": [
+                    _change(
+                        "negocio_1",
+                        messages=[
+                            {"id": "2", "from": "57300", "timestamp": "20"},
+                            {"id": "3", "from": "57301", "timestamp": "15"},
+                            {"id": "1", "from": "57300", "timestamp": "10"},
+                        ],
+                    ),
+                    _change(
+                        "negocio_2",
+                        messages=[{"id": "4", "from": "57300", "timestamp": "5"}],
+                    ),
+                ]
+            }
+        ],
+    }
+
+    groups = WebhookPayload.from_dict(body).group_messages()
+
+    assert {key: [m.id for m in messages] for key, messages in groups.items()} == {
+        ("negocio_1", "57300"): ["1", "2"],
+        ("negocio_1", "57301"): ["3"],
+        ("negocio_2", "57300"): ["4"],
+    }